@@ -1,13 +1,8 @@
 #file-dosing.py
-import time
-import eventlet
-from datetime import datetime
 from flask import Blueprint, request, jsonify
-from api.settings import load_settings
 from services.auto_dose_state import auto_dose_state
-from services.pump_relay_service import turn_on_relay, turn_off_relay
-from services.dosage_service import manual_dispense, get_dosage_info
-from services.dosing_state import state  # CHANGED: Import the singleton instance instead of individual globals
+from services.dosage_service import get_dosage_info
+from services.dosing_actuator import dosing_actuator
 
 dosing_blueprint = Blueprint('dosing', __name__)
 
@@ -39,158 +34,51 @@ def manual_dosage():
     POST /api/dosage/manual
     {
       "type": "down",   # or "up"
-      "amount": 5.0     # ml to dispense
+      "amount": 5.0,    # ml to dispense
+      "priority": 10    # optional; higher runs first (manual default 10, auto 0)
     }
+    The dose is queued on the dosing actuator and runs after any dose
+    already in progress.
     """
-    data = request.get_json()
+    data = request.get_json() or {}
     dispense_type = data.get("type")  # 'up' or 'down'
     amount_ml = data.get("amount", 0.0)
 
-    if dispense_type not in ["up", "down"]:
-        return jsonify({"status": "failure", "message": "Invalid dispense type"}), 400
-
-    settings = load_settings()
-    max_dosing = settings.get("max_dosing_amount", 0)
-    if max_dosing > 0 and amount_ml > max_dosing:
-        amount_ml = max_dosing
-
-    pump_calibration = settings.get("pump_calibration", {})
-    relay_ports = settings.get("relay_ports", {"ph_up": 1, "ph_down": 2})
-
-    if dispense_type == "up":
-        calibration_value = pump_calibration.get("pump1", 1.0)
-        relay_port = relay_ports["ph_up"]
-    else:
-        calibration_value = pump_calibration.get("pump2", 1.0)
-        relay_port = relay_ports["ph_down"]
-
-    duration_sec = amount_ml * calibration_value
-    if duration_sec <= 0:
-        return jsonify({"status": "failure", "message": "Calculated run time is 0 or negative."}), 400
-
-    def dispense_task():
-        from app import socketio  # Import here to avoid circular import
-        # CHANGED: No 'global' keyword needed anymore; attributes are on the object
-        try:
-            print(f"[DEBUG ManualDispense] Setting active state: type={dispense_type}, amount={amount_ml}, duration={duration_sec}")
-            # Emit start event
-            socketio.emit('dose_start', {'type': dispense_type, 'amount': amount_ml, 'duration': duration_sec})
-            print(f"[Manual Dispense] Turning ON Relay {relay_port} for {duration_sec:.2f} seconds...")
-            turn_on_relay(relay_port)
-            eventlet.sleep(duration_sec)
-            turn_off_relay(relay_port)
-            print(f"[Manual Dispense] Turning OFF Relay {relay_port} after {duration_sec:.2f} seconds.")
-            manual_dispense(dispense_type, amount_ml)
-            socketio.emit('dose_complete', {'type': dispense_type, 'amount': amount_ml})
-        except Exception as e:
-            print(f"[Manual Dispense] Error during dispense: {str(e)}")
-            socketio.emit('dose_error', {'type': dispense_type, 'error': str(e)})
-        finally:
-            # Clear active task only if this is the current task
-            # CHANGED: Use state. prefix
-            if state.active_dosing_task and state.active_dosing_task == eventlet.getcurrent():
-                print(f"[DEBUG ManualDispense] Clearing state for {dispense_type}")
-                state.active_dosing_task = None
-                state.active_relay_port = None
-                state.active_dosing_type = None
-                state.active_dosing_amount = None
-                state.active_start_time = None
-                state.active_duration = None
-            turn_off_relay(relay_port)  # Ensure relay is off
-
-    # Cancel any existing task
-    # CHANGED: Use state. prefix for all variables; no 'global' keyword
-    if state.active_dosing_task:
-        try:
-            state.active_dosing_task.kill()
-            if state.active_relay_port is not None:
-                turn_off_relay(state.active_relay_port)
-            print(f"[Manual Dispense] Cancelled previous dosing task: {state.active_dosing_type or 'unknown'}")
-        except Exception as e:
-            print(f"[Manual Dispense] Error cancelling previous task: {str(e)}")
-        finally:
-            print("[DEBUG ManualDispense] Cleared previous state after cancel")
-            state.active_dosing_task = None
-            state.active_relay_port = None
-            state.active_dosing_type = None
-            state.active_dosing_amount = None
-            state.active_start_time = None
-            state.active_duration = None
-
-    # Start new task
-    state.active_dosing_task = eventlet.spawn(dispense_task)
-    state.active_relay_port = relay_port
-    state.active_dosing_type = dispense_type
-    state.active_dosing_amount = amount_ml
-    state.active_start_time = time.time()
-    state.active_duration = duration_sec
-    print(f"[DEBUG ManualDispense] Started new task, state set: start_time={state.active_start_time}, duration={state.active_duration}")
+    try:
+        job = dosing_actuator.submit("manual", dispense_type, amount_ml,
+                                     priority=data.get("priority"))
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
 
     return jsonify({
         "status": "success",
-        "message": f"Dosing of {amount_ml:.2f} ml of pH {dispense_type} started.",
-        "duration": duration_sec
+        "message": f"Dosing of {job.amount_ml:.2f} ml of pH {dispense_type} queued.",
+        "duration": job.duration_sec,
+        "job": job.to_dict()
     })
 
 @dosing_blueprint.route('/stop', methods=['POST'])
 def stop_dosage():
     """
-    Stop the current dosing operation.
+    Stop the current dosing operation and drop any queued doses. Every
+    relay is switched off on each call, even with no dose running.
     POST /api/dosage/stop
     {}
     """
-    from app import socketio  # Import here to avoid circular import
-    # CHANGED: Use state. prefix for all variables; no 'global' keyword
-
-    if not state.active_dosing_task:
-        print("[Stop Dosing] No active dosing task to stop")
-        return jsonify({"status": "success", "message": "No active dosing to stop."}), 200
-
-    try:
-        type_str = state.active_dosing_type or 'unknown'
-        amount_str = f"{state.active_dosing_amount:.2f}" if state.active_dosing_amount is not None else 'unknown'
-        print(f"[Stop Dosing] Attempting to stop dosing: {type_str}, {amount_str} ml")
-        
-        # Kill the active dosing task
-        state.active_dosing_task.kill()
-        
-        # Fallback: turn off both possible relays to ensure no relay stays on
-        settings = load_settings()
-        relay_ports = settings.get("relay_ports", {"ph_up": 1, "ph_down": 2})
-        for port in [relay_ports["ph_up"], relay_ports["ph_down"]]:
-            try:
-                turn_off_relay(port)
-                print(f"[Stop Dosing] Turned off relay {port} as fallback")
-            except Exception as e:
-                print(f"[Stop Dosing] Error turning off relay {port}: {str(e)}")
-        
-        # Emit stopped event
-        socketio.emit('dose_stopped', {
-            'type': type_str,
-            'amount': state.active_dosing_amount or 0
-        })
-
-        print(f"[Stop Dosing] Stopped dosing: {type_str}, {amount_str} ml")
-        return jsonify({"status": "success", "message": "Dosing stopped successfully."}), 200
-    except Exception as e:
-        error_msg = str(e) or 'Unknown error during stopping'
-        print(f"[Stop Dosing] Error stopping dosing: {error_msg}")
-        # Fallback: turn off both relays
-        settings = load_settings()
-        relay_ports = settings.get("relay_ports", {"ph_up": 1, "ph_down": 2})
-        for port in [relay_ports["ph_up"], relay_ports["ph_down"]]:
-            try:
-                turn_off_relay(port)
-                print(f"[Stop Dosing] Turned off relay {port} as fallback on error")
-            except Exception as e:
-                print(f"[Stop Dosing] Error turning off relay {port} on error: {str(e)}")
-        return jsonify({"status": "failure", "message": f"Failed to stop dosing: {error_msg}"}), 500
-    finally:
-        # Clear state to prevent stuck relays
-        print("[DEBUG StopDosing] Clearing state in finally block")
-        state.active_dosing_task = None
-        state.active_relay_port = None
-        state.active_dosing_type = None
-        state.active_dosing_amount = None
-        state.active_start_time = None
-        state.active_duration = None
\ No newline at end of file
+    job = dosing_actuator.stop()
+    if job is None:
+        print("[Stop Dosing] No active dosing task; all relays switched off")
+        return jsonify({"status": "success",
+                        "message": "No active dosing to stop; all relays switched off."}), 200
+    print(f"[Stop Dosing] Stopping dosing job {job.id}: {job.dispense_type}, {job.amount_ml:.2f} ml")
+    return jsonify({"status": "success", "message": "Dosing stopped successfully.",
+                    "job": job.to_dict()}), 200
+
+@dosing_blueprint.route('/jobs', methods=['GET'])
+def dosing_jobs():
+    """
+    Running / queued / recent dispense jobs and commanded vs. actual
+    on-time metrics from the dosing actuator.
+    GET /api/dosage/jobs
+    """
+    return jsonify({"status": "success", **dosing_actuator.get_status()})
@@ -0,0 +1,201 @@
+# File: api/export.py
+"""
+Streaming export
+----------------
+GET /api/export?from=<ISO>&to=<ISO>&series=ph,dosing,salt&format=csv|ndjson&gzip=1
+
+• Rows are pulled from the event store with private connections and
+  fetchmany(), formatted into ~64 KB chunks and (optionally) run through a
+  single gzip stream, so the result set is never held in memory.
+• Every row carries a `cursor`; pass the last one received back as
+  ?cursor=<token> to resume an interrupted download. `limit` caps the rows
+  per request for paged pulls.
+
+Series names:
+    ph                    -> pH rollups (resolution=1m|1h|1d, default 1m)
+    salt / water_temp /
+    air_temp              -> ScreenLogic historian points
+    <flattened.key>       -> any other historian key (contains a '.')
+    anything else         -> events of that event_type (e.g. dosing)
+"""
+
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from services import event_store
+from services.historian_service import historian
+from services.rollup_service import RESOLUTIONS, from_local_epoch, rollups
+
+export_blueprint = Blueprint('export', __name__)
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+ROLLUP_SERIES = {"ph"}
+SERIES_ALIASES = {
+    "salt": "controller.sensor.salt_ppm.value",
+    "water_temp": "body.0.last_temperature.value",
+    "air_temp": "controller.sensor.air_temperature.value",
+}
+CSV_COLUMNS = ["series", "timestamp", "value", "min", "max", "count",
+               "dose_type", "ph", "cursor"]
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _encode_cursor(series, position):
+    raw = json.dumps([series, position], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    series, position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return series, position
+
+
+def _rollup_rows(series, since, until, resolution, after):
+    lo = datetime.fromisoformat(since) if since else None
+    hi = datetime.fromisoformat(until) if until else None
+    for bucket, lo_v, hi_v, mean, count, _ in rollups.iter_rows(
+            series, resolution, lo, hi, after):
+        yield {
+            "series": series,
+            "timestamp": from_local_epoch(bucket).isoformat(),
+            "value": mean,
+            "min": lo_v,
+            "max": hi_v,
+            "count": count,
+            "cursor": _encode_cursor(series, bucket),
+        }
+
+
+def _telemetry_rows(series, key, since, until, after):
+    for timestamp, value in historian.iter_points(key, since, until, after):
+        yield {
+            "series": series,
+            "timestamp": timestamp,
+            "value": value,
+            "cursor": _encode_cursor(series, timestamp),
+        }
+
+
+def _event_rows(series, since, until, after):
+    for row_id, timestamp, event in event_store.iter_event_rows(
+            series, since, until, tuple(after) if after else None):
+        row = {
+            "series": series,
+            "timestamp": timestamp,
+            "value": event.get("dose_amount_ml", event.get("value")),
+            "cursor": _encode_cursor(series, [timestamp, row_id]),
+        }
+        for field in ("dose_type", "ph"):
+            if field in event:
+                row[field] = event[field]
+        yield row
+
+
+def _series_rows(series, since, until, resolution, after):
+    if series in ROLLUP_SERIES:
+        return _rollup_rows(series, since, until, resolution, after)
+    key = SERIES_ALIASES.get(series, series)
+    if key != series or "." in series:
+        return _telemetry_rows(series, key, since, until, after)
+    return _event_rows(series, since, until, after)
+
+
+def _iter_rows(series_list, since, until, resolution, cursor, limit):
+    """Chain each series in request order, resuming after `cursor`."""
+    start, after = 0, None
+    if cursor:
+        cursor_series, after = cursor
+        start = series_list.index(cursor_series)
+    emitted = 0
+    for i, series in enumerate(series_list[start:]):
+        for row in _series_rows(series, since, until, resolution,
+                                after if i == 0 else None):
+            yield row
+            emitted += 1
+            if limit and emitted >= limit:
+                return
+
+
+def _format_rows(rows, fmt):
+    """Yield text chunks of roughly EXPORT_CHUNK_SIZE."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buf.write(json.dumps(row, separators=(",", ":")))
+            buf.write("\n")
+    for row in rows:
+        write(row)
+        if buf.tell() >= EXPORT_CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _encode(chunks, use_gzip):
+    if not use_gzip:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+        return
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = gz.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield gz.flush()
+
+
+@export_blueprint.route('/', methods=['GET'])
+def export_series():
+    """
+    Stream the requested series as CSV or NDJSON.
+    Query params: from, to, series (comma list, default ph),
+    format (csv|ndjson), gzip (1 = .gz attachment), resolution (ph only),
+    cursor (resume token from a previous row), limit (max rows).
+    """
+    fmt = request.args.get("format", "csv").lower()
+    resolution = request.args.get("resolution", "1m")
+    use_gzip = request.args.get("gzip", "0").lower() in ("1", "true", "yes")
+    series_list = [s.strip() for s in request.args.get("series", "ph").split(",") if s.strip()]
+
+    if fmt not in FORMATS:
+        return jsonify({"status": "failure", "message": f"format must be one of {list(FORMATS)}"}), 400
+    if resolution not in RESOLUTIONS:
+        return jsonify({"status": "failure", "message": f"resolution must be one of {list(RESOLUTIONS)}"}), 400
+    if not series_list:
+        return jsonify({"status": "failure", "message": "series is required"}), 400
+    try:
+        since = event_store.normalize_timestamp(request.args.get("from"))
+        until = event_store.normalize_timestamp(request.args.get("to"), end_of_day=True)
+        limit = request.args.get("limit", 0, type=int)
+        cursor = request.args.get("cursor")
+        cursor = _decode_cursor(cursor) if cursor else None
+        if cursor and cursor[0] not in series_list:
+            raise ValueError("cursor does not belong to the requested series")
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+
+    rows = _iter_rows(series_list, since, until, resolution, cursor, limit)
+    body = _encode(_format_rows(rows, fmt), use_gzip)
+
+    filename = f"export.{fmt}" + (".gz" if use_gzip else "")
+    return Response(
+        stream_with_context(body),
+        mimetype="application/gzip" if use_gzip else FORMATS[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Cache-Control": "no-store",
+        },
+    )
@@ -0,0 +1,106 @@
+# File: api/history.py
+
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, request
+
+from services.rollup_service import rollups, RESOLUTIONS
+from services.historian_service import historian
+from services.event_store import normalize_timestamp
+from services.aggregation_service import aggregate
+
+history_blueprint = Blueprint('history', __name__)
+
+DEFAULT_RANGE = timedelta(hours=24)
+MAX_POINTS = 10000
+
+
+def _parse_range():
+    """Read from/to query params (ISO strings); default to the last 24 hours."""
+    to_raw = request.args.get("to")
+    from_raw = request.args.get("from")
+    until = datetime.fromisoformat(to_raw) if to_raw else datetime.now()
+    since = datetime.fromisoformat(from_raw) if from_raw else until - DEFAULT_RANGE
+    if since > until:
+        raise ValueError("'from' is after 'to'")
+    return since, until
+
+
+@history_blueprint.route('/', methods=['GET'])
+def get_history():
+    """
+    GET /api/history/?series=ph&from=<ISO>&to=<ISO>&points=500[&resolution=1h]
+    Returns columnar min/max/mean/count/last arrays for one series, read
+    from the coarsest rollup that still gives `points` buckets.
+    """
+    series = request.args.get("series", "ph")
+    resolution = request.args.get("resolution")
+    try:
+        since, until = _parse_range()
+        points = min(max(request.args.get("points", 500, type=int), 1), MAX_POINTS)
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({
+            "status": "failure",
+            "message": f"resolution must be one of {list(RESOLUTIONS)}"
+        }), 400
+
+    data = rollups.query(series, since, until, points, resolution)
+    return jsonify({"status": "success", **data})
+
+
+@history_blueprint.route('/series', methods=['GET'])
+def list_series():
+    """List every series that has rollup data."""
+    return jsonify({"status": "success", "series": rollups.series()})
+
+
+@history_blueprint.route('/telemetry', methods=['GET'])
+def get_telemetry():
+    """
+    GET /api/history/telemetry?key=<flattened.key>&from=<ISO>&to=<ISO>
+    Deadband-compressed ScreenLogic points for one key (step series).
+    """
+    key = request.args.get("key")
+    if not key:
+        return jsonify({"status": "failure", "message": "key is required"}), 400
+    try:
+        since = normalize_timestamp(request.args.get("from"))
+        until = normalize_timestamp(request.args.get("to"), end_of_day=True)
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+    return jsonify({"status": "success", **historian.query(key, since, until)})
+
+
+@history_blueprint.route('/telemetry/keys', methods=['GET'])
+def list_telemetry_keys():
+    """List every ScreenLogic key the historian has recorded."""
+    return jsonify({"status": "success", "keys": historian.keys()})
+
+
+@history_blueprint.route('/aggregate', methods=['GET'])
+def get_aggregate():
+    """
+    GET /api/history/aggregate?group_by=day&agg=sum,count,p95&from=<ISO>&to=<ISO>
+        [&event_type=dosing&field=dose_amount_ml&dose_type=down]
+        [&series=ph]
+    Grouped aggregates computed in SQLite, returned as columnar arrays.
+    With `series`, rollup readings are aggregated instead of events.
+    """
+    agg = [a.strip() for a in request.args.get("agg", "sum,count").split(",") if a.strip()]
+    try:
+        data = aggregate(
+            group_by=request.args.get("group_by", "day"),
+            aggregates=agg,
+            series=request.args.get("series"),
+            event_type=request.args.get("event_type", "dosing"),
+            field=request.args.get("field", "dose_amount_ml"),
+            dose_type=request.args.get("dose_type"),
+            since=normalize_timestamp(request.args.get("from")),
+            until=normalize_timestamp(request.args.get("to"), end_of_day=True),
+        )
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+    return jsonify({"status": "success", **data})
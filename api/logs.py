@@ -1,10 +1,17 @@
 # File: api/logs.py
 
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, Response, stream_with_context
+from werkzeug.security import safe_join
 import os
 import json
 from datetime import datetime
 
+from services.event_store import query_events, delete_events, normalize_timestamp
+from services.log_service import (
+    MANIFEST_FILE, get_segments, iter_journal_lines, open_segment,
+    reset_journal, forget_segment, log_writer,
+)
+
 # Create the Blueprint for logs
 log_blueprint = Blueprint('logs', __name__)
 
@@ -21,39 +28,53 @@ if not os.path.exists(LOGS_FILE):
     open(LOGS_FILE, "w").close()
 
 
-# Helper function: Load logs from JSONL file, filtering for dosing events (kept for / endpoint)
-def load_logs():
-    logs = []
-    if os.path.exists(LOGS_FILE):
-        with open(LOGS_FILE, "r") as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        entry = json.loads(line)
-                        if entry.get("event_type") == "dosing":  # Filter to dosing only for this API
-                            logs.append(entry)
-                    except json.JSONDecodeError:
-                        pass  # Skip malformed lines
-    return logs
+# Helper function: Load logs from the event store, filtered by type and time range.
+# Backed by the (event_type, timestamp) index, so cost depends on the rows
+# returned rather than on how many years of events have accumulated.
+def load_logs(event_type="dosing", since=None, until=None, limit=None):
+    return query_events(
+        event_type=event_type,
+        since=since,
+        until=until,
+        limit=limit,
+        newest_first=limit is not None,
+    )
 
 
-# API Endpoint: Get all dosing logs (from the primary JSONL file – kept for compatibility)
+# API Endpoint: Get dosing logs (or any event_type) from the event store
 @log_blueprint.route('/', methods=['GET'])
 def get_logs():
     """
-    Retrieve all dosage logs (filtered from the primary JSONL file).
+    Retrieve logged events, oldest first. Defaults to dosing events.
+    Optional query params:
+      event_type=dosing   (use event_type= with an empty value for all types)
+      from=<ISO time>     inclusive lower bound
+      to=<ISO time>       inclusive upper bound
+      limit=<N>           only the newest N matches
     """
-    logs = load_logs()
+    try:
+        event_type = request.args.get("event_type", "dosing") or None
+        since = normalize_timestamp(request.args.get("from"))
+        until = normalize_timestamp(request.args.get("to"), end_of_day=True)
+        limit = request.args.get("limit", type=int)
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+
+    logs = load_logs(event_type, since, until, limit)
+    if limit is not None:
+        logs.reverse()
     return jsonify(logs)
 
 
-# API Endpoint: Clear all logs (truncate the primary file – kept for compatibility; consider updating to clear all files if needed)
+# API Endpoint: Clear all logs (event store plus the primary journal file)
 @log_blueprint.route('/clear', methods=['POST'])
 def clear_logs():
     """
-    Clear all logs by truncating the primary file.
+    Clear all logs: delete every stored event, truncate the live journal
+    segment and remove the closed (compressed) segments.
     """
-    open(LOGS_FILE, "w").close()
+    delete_events()
+    reset_journal()
     return jsonify({"status": "success", "message": "Logs cleared."})
 
 
@@ -61,39 +82,226 @@ def clear_logs():
 @log_blueprint.route('/list', methods=['GET'])
 def list_logs():
     """
-    List all files in the logs directory.
+    List all log files in the directory (live journal, closed .jsonl.gz
+    segments and any other logs), skipping the segment manifest.
     """
     try:
-        files = [f for f in os.listdir(LOG_DIR) if os.path.isfile(os.path.join(LOG_DIR, f))]
+        hidden = {os.path.basename(MANIFEST_FILE)}
+        files = sorted(
+            f for f in os.listdir(LOG_DIR)
+            if os.path.isfile(os.path.join(LOG_DIR, f))
+            and f not in hidden and not f.endswith(".tmp")
+        )
         return jsonify(files)
     except Exception as e:
         return jsonify({"status": "failure", "message": str(e)}), 500
 
 
+# Streaming helpers for /view: every mode resolves to a [start, end) byte
+# window that is streamed in fixed-size chunks, so memory use is the same for
+# a 1 KB file and a 1 GB file.
+VIEW_CHUNK_SIZE = 64 * 1024
+
+
+def _safe_log_path(file):
+    """Resolve `file` inside LOG_DIR, or None if it escapes the directory."""
+    return safe_join(LOG_DIR, file)
+
+
+def _offset_after_lines(f, start, count):
+    """Byte offset just past the `count`-th newline at or after `start` (or EOF)."""
+    f.seek(start)
+    offset = start
+    while count > 0:
+        chunk = f.read(VIEW_CHUNK_SIZE)
+        if not chunk:
+            break
+        pos = 0
+        while count > 0:
+            nl = chunk.find(b"\n", pos)
+            if nl < 0:
+                break
+            pos = nl + 1
+            count -= 1
+        offset += pos if count == 0 else len(chunk)
+    return offset
+
+
+def _tail_offset(f, size, count):
+    """Byte offset where the last `count` lines of the file begin."""
+    end = size
+    f.seek(max(size - 1, 0))
+    if size and f.read(1) == b"\n":
+        end -= 1  # ignore the terminator of the final line
+    pos = end
+    while pos > 0:
+        read_size = min(VIEW_CHUNK_SIZE, pos)
+        pos -= read_size
+        f.seek(pos)
+        chunk = f.read(read_size)
+        idx = len(chunk)
+        while True:
+            idx = chunk.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            count -= 1
+            if count == 0:
+                return pos + idx + 1
+    return 0
+
+
+def _tail_offset_forward(f, count):
+    """Tail for non-seekable streams (.gz): count lines, then skip to the last `count`."""
+    total, last = 0, b"\n"
+    f.seek(0)
+    while True:
+        chunk = f.read(VIEW_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += chunk.count(b"\n")
+        last = chunk[-1:]
+    if last != b"\n":
+        total += 1
+    return _offset_after_lines(f, 0, max(total - count, 0))
+
+
+def _content_size(path):
+    """Uncompressed size; gzip stores it (mod 4 GiB) in its last four bytes."""
+    if path.endswith(".gz"):
+        with open(path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), "little")
+    return os.path.getsize(path)
+
+
+def _stream_bytes(path, start, end):
+    with open_segment(path) as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(VIEW_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _journal_range_response(limit, as_attachment):
+    try:
+        since = normalize_timestamp(request.args.get("from"))
+        until = normalize_timestamp(request.args.get("to"), end_of_day=True)
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": f"Invalid parameter: {e}"}), 400
+
+    def generate():
+        for count, line in enumerate(iter_journal_lines(since, until)):
+            if limit is not None and count >= limit:
+                break
+            yield line
+
+    headers = {"Content-Type": "text/plain; charset=utf-8"}
+    if as_attachment:
+        headers["Content-Disposition"] = "attachment; filename=sensor_log-range.jsonl"
+    return Response(stream_with_context(generate()), 200, headers)
+
+
+# API Endpoint: Background log writer counters (queue depth, flush latency)
+@log_blueprint.route('/writer_stats', methods=['GET'])
+def writer_stats():
+    return jsonify({"status": "success", "writer": log_writer.get_stats()})
+
+
+# API Endpoint: Segment manifest (time range covered by each journal segment)
+@log_blueprint.route('/segments', methods=['GET'])
+def list_segments():
+    return jsonify(get_segments())
+
+
 # NEW: API Endpoint: View the content of a specific log file (as plain text)
 @log_blueprint.route('/view/<path:file>', methods=['GET'])
 def view_log(file):
     """
-    View the content of a specific log file.
+    Stream (part of) a log file as plain text; .gz segments are
+    decompressed on the fly. With from=/to= (ISO times) the whole journal
+    is read across live and compressed segments instead, touching only the
+    segments whose time range overlaps (limit= still applies).
+    Otherwise, query params in order of precedence:
+      tail=N                  last N lines
+      offset=B / cursor=B     start at byte B (cursor from a previous page)
+      line=N                  start after skipping N lines
+    and to bound the page:
+      length=B                at most B bytes
+      limit=N                 at most N lines
+    Response headers carry X-File-Size and, when more data follows,
+    X-Next-Cursor (pass it back as cursor= for the next page).
     """
-    log_path = os.path.join(LOG_DIR, file)
-    if not os.path.exists(log_path):
+    log_path = _safe_log_path(file)
+    if log_path is None or not os.path.isfile(log_path):
         return jsonify({"status": "failure", "message": "File not found"}), 404
-    with open(log_path, 'r') as f:
-        content = f.read()
-    return content, 200, {'Content-Type': 'text/plain'}
+
+    args = {}
+    for name in ("tail", "offset", "cursor", "line", "length", "limit"):
+        raw = request.args.get(name)
+        if raw in (None, ""):
+            continue
+        try:
+            args[name] = int(raw)
+        except ValueError:
+            args[name] = -1
+        if args[name] < 0:
+            return jsonify({"status": "failure", "message": f"Invalid {name}: {raw}"}), 400
+
+    if request.args.get("from") or request.args.get("to"):
+        return _journal_range_response(args.get("limit"), as_attachment=False)
+
+    size = _content_size(log_path)
+    with open_segment(log_path) as f:
+        if "tail" in args:
+            if not args["tail"]:
+                start = size
+            elif log_path.endswith(".gz"):
+                start = _tail_offset_forward(f, args["tail"])
+            else:
+                start = _tail_offset(f, size, args["tail"])
+        elif "cursor" in args or "offset" in args:
+            start = min(args.get("cursor", args.get("offset")), size)
+        elif "line" in args:
+            start = _offset_after_lines(f, 0, args["line"])
+        else:
+            start = 0
+
+        if "length" in args:
+            end = min(start + args["length"], size)
+        elif "limit" in args:
+            end = _offset_after_lines(f, start, args["limit"])
+        else:
+            end = size
+
+    headers = {
+        "Content-Type": "text/plain; charset=utf-8",
+        "X-File-Size": str(size),
+        "X-Range-Start": str(start),
+    }
+    if end < size:
+        headers["X-Next-Cursor"] = str(end)
+    return Response(stream_with_context(_stream_bytes(log_path, start, end)), 200, headers)
 
 
 # NEW: API Endpoint: Download a specific log file
 @log_blueprint.route('/download/<path:file>', methods=['GET'])
 def download_log(file):
     """
-    Download a specific log file.
+    Download a specific log file. Honours HTTP Range requests (206 Partial
+    Content), so interrupted downloads can be resumed. With from=/to= the
+    matching journal lines from every overlapping segment are streamed as
+    one JSONL attachment.
     """
-    log_path = os.path.join(LOG_DIR, file)
-    if not os.path.exists(log_path):
+    log_path = _safe_log_path(file)
+    if log_path is None or not os.path.isfile(log_path):
         return jsonify({"status": "failure", "message": "File not found"}), 404
-    return send_file(log_path, as_attachment=True)
+    if request.args.get("from") or request.args.get("to"):
+        return _journal_range_response(request.args.get("limit", type=int), as_attachment=True)
+    return send_file(log_path, as_attachment=True, conditional=True)
 
 
 # NEW: API Endpoint: Delete a specific log file
@@ -102,11 +310,12 @@ def delete_log(file):
     """
     Delete a specific log file.
     """
-    log_path = os.path.join(LOG_DIR, file)
-    if not os.path.exists(log_path):
+    log_path = _safe_log_path(file)
+    if log_path is None or not os.path.exists(log_path):
         return jsonify({"status": "failure", "message": "File not found"}), 404
     try:
         os.remove(log_path)
+        forget_segment(os.path.basename(log_path))
         return jsonify({"status": "success", "message": "File deleted"})
     except Exception as e:
         return jsonify({"status": "failure", "message": str(e)}), 500
@@ -6,6 +6,9 @@ from services.notification_service import (
     set_status,
     clear_status
 )
+from services.notification_digest import notification_digest
+from services.notification_outbox import notification_outbox
+from utils.http_client import http_client
 
 notifications_blueprint = Blueprint("notifications", __name__)
 
@@ -59,5 +62,23 @@ def api_clear_status():
     clear_status(device, key)
     return jsonify({"status": "success"})
 
+@notifications_blueprint.route('/outbox', methods=['GET'])
+def get_outbox():
+    """
+    Pending (undelivered) Telegram/Discord messages and recent outcomes.
+    """
+    return jsonify({"status": "success", **notification_outbox.get_status()})
 
+@notifications_blueprint.route('/http', methods=['GET'])
+def get_http_stats():
+    """
+    Per-host latency and error counts of the pooled webhook session.
+    """
+    return jsonify({"status": "success", **http_client.get_stats()})
 
+@notifications_blueprint.route('/digest', methods=['GET'])
+def get_digest():
+    """
+    Alerts held for the next digest and counts since the last daily summary.
+    """
+    return jsonify({"status": "success", **notification_digest.get_state()})
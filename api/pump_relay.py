@@ -1,7 +1,7 @@
 # File: api/pump_relay.py
 
 from flask import Blueprint, request, jsonify
-from services.pump_relay_service import turn_on_relay, turn_off_relay, get_relay_status
+from services.pump_relay_service import turn_on_relay, turn_off_relay, get_relay_status, get_driver_stats
 
 # Create Blueprint
 relay_blueprint = Blueprint('relay', __name__)
@@ -32,3 +32,8 @@ def relay_status(relay_id):
         return jsonify({"status": "success", "relay_id": relay_id, "relay_status": status})
     except Exception as e:
         return jsonify({"status": "failure", "error": str(e)}), 500
+
+# API Endpoint: Relay driver stats (port, command latency)
+@relay_blueprint.route('/driver', methods=['GET'])
+def relay_driver_stats():
+    return jsonify({"status": "success", **get_driver_stats()})
@@ -0,0 +1,22 @@
+# File: api/scheduler.py
+
+from flask import Blueprint, jsonify
+from services.scheduler import scheduler
+
+scheduler_blueprint = Blueprint("scheduler", __name__)
+
+@scheduler_blueprint.route('/', methods=['GET'])
+def get_scheduler_stats():
+    """
+    Every registered background job with its lag/runtime statistics.
+    """
+    return jsonify({"status": "success", **scheduler.get_stats()})
+
+@scheduler_blueprint.route('/<name>/run', methods=['POST'])
+def run_job_now(name):
+    """
+    Run a job at once instead of waiting for its next slot.
+    """
+    if not scheduler.run_now(name):
+        return jsonify({"status": "failure", "error": f"No idle job named {name}"}), 404
+    return jsonify({"status": "success", "job": name})
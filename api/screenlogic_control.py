@@ -5,13 +5,20 @@ Payloads accepted (see index.html JS):
 --------------------------------------
 • {"target":"circuit", "id":505, "action":"toggle"}
 • {"target":"heat", "body":0, "mode":2, "setpoint":82}
+
+Scenes (POST /api/screenlogic/scene):
+• {"operations": [<payload>, <payload>, ...]}   – applied in order, one
+  gateway session, independent operations sent concurrently.
+
+Commands go through services.screenlogic_commands on the poller's
+persistent connection; the response carries the refreshed state.
 """
 
 from __future__ import annotations
-import asyncio
 from flask import Blueprint, request, jsonify
 
-from screenlogicpy import ScreenLogicGateway
+from services.screenlogic_client import screenlogic_client
+from services.screenlogic_commands import command_channel, parse_command
 from utils.settings_utils import load_settings
 
 import logging
@@ -24,8 +31,8 @@ bp = Blueprint("screenlogic_control", __name__, url_prefix="/api/screenlogic")
 
 # ───────────────────────── helpers ─────────────────────────
 def _gw_host() -> str:
-    cfg = load_settings().get("screenlogic", {})
-    host = str(cfg.get("host", "")).strip()
+    from services.screenlogic_service import configure_gateway
+    host = configure_gateway(load_settings().get("screenlogic", {}))
     if not host:
         raise RuntimeError("ScreenLogic host/IP not configured")
     return host
@@ -34,53 +41,83 @@ def _gw_host() -> str:
 @bp.route("/control", methods=["POST"])
 def control():
     data = request.get_json(force=True) or {}
-    print(f"Raw content type: {request.content_type}")
-    print(f"Raw request body: {request.data}")
-    print(f"Received payload: {data}")
-    target = data.get("target")
+    _log.debug("control payload: %s", data)
+
+    try:
+        command = parse_command(data)
+        _gw_host()
+        result = command_channel.execute(command)
+        return jsonify(status="success", **result)
+
+    except KeyError as ke:
+        return jsonify(status="failure",
+                       error=f"missing/invalid field {ke}"), 400
+    except Exception as exc:
+        return jsonify(status="failure", error=str(exc)), 400
+
+
+@bp.route("/scene", methods=["POST"])
+def scene():
+    data = request.get_json(force=True) or {}
+    operations = data.get("operations")
 
     try:
-        host = _gw_host()
-        gw   = ScreenLogicGateway()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(gw.async_connect(host))
-
-        # ───────── CIRCUIT ON / OFF / TOGGLE ─────────
-        if target == "circuit":
-            cid   = int(data.get("id", -1))
-            if cid < 0:
-                raise KeyError("id")
-
-            action = data.get("action", "toggle")
-            current = gw.get_value("circuit", cid, "value") or 0
-            new_state = {"on": 1, "off": 0}.get(action, 1 - current)
-            loop.run_until_complete(gw.async_set_circuit(cid, new_state))
-
-        # ───────── HEAT MODE / SET-POINT ─────────
-        elif target == "heat":
-            body  = int(data.get("body", -1))
-            mode  = int(data.get("mode", 0))
-            setpt = int(data.get("setpoint", 0))
-
-            if body not in (0, 1):
-                raise KeyError("body")
-            if mode  not in (0, 1, 2, 3):
-                raise KeyError("mode")
-            if not (50 <= setpt <= 104):
-                raise KeyError("setpoint")
-
-            loop.run_until_complete(gw.async_set_heat_mode(body, mode))
-            loop.run_until_complete(gw.async_set_heat_temp(body, setpt))
-
-        else:
-            raise ValueError(f"unsupported target {target!r}")
-
-        loop.run_until_complete(gw.async_disconnect())
-        return jsonify(status="success")
+        if not isinstance(operations, list):
+            raise KeyError("operations")
+        commands = []
+        for i, op in enumerate(operations):
+            try:
+                commands.append(parse_command(op if isinstance(op, dict) else {}))
+            except KeyError as ke:
+                raise KeyError(f"operations[{i}].{ke.args[0]}")
+        _gw_host()
+        result = command_channel.execute_scene(commands)
+        ok = all(r["ok"] for r in result["results"])
+        return jsonify(status="success" if ok else "failure", **result)
 
     except KeyError as ke:
         return jsonify(status="failure",
                        error=f"missing/invalid field {ke}"), 400
     except Exception as exc:
-        return jsonify(status="failure", error=str(exc)), 400
\ No newline at end of file
+        return jsonify(status="failure", error=str(exc)), 400
+
+
+@bp.route("/snapshot", methods=["GET"])
+def snapshot():
+    """Full flattened snapshot plus its diff version (client resync)."""
+    from services.screenlogic_service import get_screenlogic_snapshot
+    snap = get_screenlogic_snapshot()
+    return jsonify(status="success", version=snap.version, data=dict(snap.data))
+
+
+@bp.route("/client", methods=["GET"])
+def client_stats():
+    """Connection state, request counters and the current poll schedule."""
+    from services.screenlogic_service import get_poll_schedule
+    return jsonify(status="success", poll=get_poll_schedule(),
+                   **screenlogic_client.get_stats())
+
+
+@bp.route("/fake", methods=["GET"])
+def fake_state():
+    """Local gateway stand-in: counters, recorded commands and flat data."""
+    from services.screenlogic_fake import fake_pool
+    from services.screenlogic_service import flatten_screenlogic
+    return jsonify(status="success",
+                   enabled=bool(load_settings().get("screenlogic", {}).get("fake", {}).get("enabled")),
+                   data=flatten_screenlogic(fake_pool.tree),
+                   **fake_pool.get_state())
+
+
+@bp.route("/fake/set", methods=["POST"])
+def fake_set():
+    """
+    Inject changes into the stand-in, e.g. {"pump.0.state.value": 1}.
+    Subscribers (push mode) are notified as if the gateway reported it.
+    """
+    from services.screenlogic_fake import fake_pool
+    changes = request.get_json(force=True) or {}
+    if not isinstance(changes, dict) or not changes:
+        return jsonify(status="failure", error="expected a {key: value} object"), 400
+    screenlogic_client.call_soon(fake_pool.apply, changes)
+    return jsonify(status="success", applied=changes)
@@ -4,9 +4,11 @@ from flask import Blueprint, request, jsonify, send_file
 
 from status_namespace import emit_status_update
 from services.auto_dose_utils import reset_auto_dose_timer
+from services.device_health import device_health
+from services.historian_service import DEFAULT_HEARTBEAT_SEC, DEFAULT_KEYS
 from utils.settings_utils import load_settings, save_settings
 
-import requests  # Added: For sending the Discord/Telegram test POST
+from utils.http_client import http_client  # pooled session for the Discord/Telegram test POST
 
 settings_blueprint = Blueprint("settings", __name__)
 SETTINGS_FILE = os.path.join(os.getcwd(), "data", "settings.json")
@@ -29,6 +31,24 @@ _DEFAULTS = {
     "usb_roles": {"ph_probe": None, "relay": None},
     "pump_calibration": {"pump1": 0.5, "pump2": 0.5},
     "relay_ports": {"ph_up": 1, "ph_down": 2},
+    "notification_outbox": {   # async Telegram/Discord delivery
+        "workers": 2,
+        "max_attempts": 10,
+        "retry_base_sec": 5,       # doubles per failed attempt...
+        "retry_max_sec": 900,      # ...up to this
+        "max_age_hours": 24
+    },
+    "notification_digest": {   # merge alert storms into one message
+        "enabled": True,
+        "window_sec": 60,          # first critical goes out at once
+        "max_chars": 1900,
+        "daily_summary_time": None # "HH:MM" or null
+    },
+    "http_client": {           # shared keep-alive session for webhooks
+        "connect_timeout_sec": 5,
+        "read_timeout_sec": 10,
+        "per_host_connections": 2
+    },
     "discord_enabled": False,
     "discord_webhook_url": "",
     "telegram_enabled": False,
@@ -38,10 +58,49 @@ _DEFAULTS = {
     "ph_median_window": 3,
     "ph_stability_threshold": 0.2,
     "no_dose_after": None,  # ADDED: New setting for time cutoff (string "HH:MM" or null)
+    "device_health": {         # relay/pH probe health from real I/O
+        "idle_probe_sec": 300,     # probe the relay only after this much quiet
+        "offline_probe_sec": 30    # ...or this often while it is offline
+    },
+    "log_retention": {         # journal segments under data/logs
+        "days": 365,
+        "max_mb": 200,
+        "segment_max_mb": 8
+    },
+    "log_writer": {            # group-commit writer behind log_event()
+        "flush_interval_sec": 1.0,
+        "batch_size": 200,
+        "queue_max": 5000,
+        "fsync": "interval",   # always | interval | never
+        "fsync_interval_sec": 30
+    },
     "screenlogic": {           # NEW – Pentair gateway config
         "enabled": True,
         "host": "172.16.1.197",
-        "poll_interval": 5    # seconds
+        "poll_interval": 5,   # seconds
+        "mode": "poll",       # poll | push (gateway change notifications)
+        "full_refresh_sec": 300,  # push mode: periodic full refresh
+        "adaptive": {         # poll fast near transitions, back off when idle
+            "enabled": True,
+            "min_interval_sec": 2,
+            "max_interval_sec": 120,
+            "backoff_factor": 2.0,
+            "fast_window_sec": 120,
+            "pump_start_times": [],   # "HH:MM"; learned from history too
+            "learn_pump_starts_days": 7
+        },
+        "fake": {             # local gateway stand-in (no pool equipment)
+            "enabled": False,
+            "latency_ms": 20,
+            "failure_rate": 0.0,
+            "scenario": [],
+            "loop_sec": None
+        },
+        "historian": {        # deadband-compressed telemetry history
+            "enabled": True,
+            "heartbeat_sec": DEFAULT_HEARTBEAT_SEC,
+            "keys": dict(DEFAULT_KEYS)
+        }
     }
 }
 
@@ -79,6 +138,10 @@ def update_settings():
         current.setdefault("relay_ports", {}).update(new_settings.pop("relay_ports"))
     if "pump_trigger" in new_settings:
         current.setdefault("pump_trigger", {}).update(new_settings.pop("pump_trigger"))
+    # merge screenlogic so the settings form (enabled/host only) doesn't wipe
+    # poll_interval, mode, historian or fake
+    if isinstance(new_settings.get("screenlogic"), dict):
+        current.setdefault("screenlogic", {}).update(new_settings.pop("screenlogic"))
 
     current.update(new_settings)
     save_settings(current)
@@ -116,6 +179,7 @@ def list_usb_devices():
     for role, assigned in list(usb_roles.items()):
         if assigned and assigned not in connected:
             usb_roles[role] = None
+            device_health.reset(role)
             changed = True
     if changed:
         save_settings(settings)
@@ -124,6 +188,12 @@ def list_usb_devices():
     return jsonify(devices)
 
 
+@settings_blueprint.route("/usb_health", methods=["GET"])
+def usb_health():
+    """Online/offline state of the relay and pH probe (services.device_health)."""
+    return jsonify({"status": "success", "devices": device_health.get_state()})
+
+
 @settings_blueprint.route("/assign_usb", methods=["POST"])
 def assign_usb():
     data = request.get_json() or {}
@@ -191,7 +261,7 @@ def test_discord():
     if not settings.get("discord_enabled") or not settings.get("discord_webhook_url"):
         return jsonify({"status": "failure", "error": "Discord not enabled or webhook URL missing"}), 400
     try:
-        response = requests.post(
+        response = http_client.post(
             settings["discord_webhook_url"],
             json={"content": test_message},
             headers={"Content-Type": "application/json"}
@@ -214,7 +284,7 @@ def test_telegram():
     try:
         url = f"https://api.telegram.org/bot{settings['telegram_bot_token']}/sendMessage"
         params = {"chat_id": settings["telegram_chat_id"], "text": test_message}
-        response = requests.post(url, params=params)
+        response = http_client.post(url, params=params)
         if response.ok:
             return jsonify({"status": "success", "info": "Message sent to Telegram"})
         else:
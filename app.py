@@ -23,6 +23,9 @@ from api.update_code import update_code_blueprint
 from api.debug import debug_blueprint
 from api.notifications import notifications_blueprint
 from api.screenlogic_control import bp as screenlogic_bp
+from api.history import history_blueprint
+from api.export import export_blueprint
+from api.scheduler import scheduler_blueprint
 
 # Import the aggregator's set_socketio_instance + our /status namespace
 from status_namespace import StatusNamespace, set_socketio_instance
@@ -70,62 +73,78 @@ set_socketio_instance(socketio)
 # Now register the /status namespace
 socketio.on_namespace(StatusNamespace('/status'))
 
-# 3) Background tasks
+# 3) Background tasks (run periodically by services.scheduler)
 def broadcast_ph_readings():
-    log_with_timestamp("Inside function for broadcasting pH readings")
-    while True:
-        try:
-            ph_value = get_latest_ph_reading()
-            if ph_value is not None:
-                socketio.emit('ph_update', {'ph': round(ph_value, 3)})
-            eventlet.sleep(1)
-        except Exception as e:
-            log_with_timestamp(f"[Broadcast] Error broadcasting pH value: {e}")
+    ph_value = get_latest_ph_reading()
+    if ph_value is not None:
+        socketio.emit('ph_update', {'ph': round(ph_value, 3)})
 
 def broadcast_status():
     """
-    Periodically call emit_status_update() from status_namespace.
+    Call emit_status_update() from status_namespace.
     """
     from status_namespace import emit_status_update
-    log_with_timestamp("Inside function for broadcasting status updates")
-    while True:
-        try:
-            emit_status_update()
-            eventlet.sleep(5)
-        except Exception as e:
-            log_with_timestamp(f"[broadcast_status] Error: {e}")
-            eventlet.sleep(5)
+    emit_status_update()
 
 def start_threads():
     settings = load_settings()
 
+    # One-time migration of legacy JSONL logs into the event store
+    from services.event_store import import_legacy_logs
+    try:
+        import_legacy_logs()
+    except Exception as e:
+        log_with_timestamp(f"[EventStore] Legacy log import failed: {e}")
+
+    # Periodic jobs share one dispatcher (lag/runtime at /api/scheduler)
+    from services.scheduler import scheduler
+    from services.rollup_service import FLUSH_INTERVAL_SEC, rollups
+    from services.log_service import (
+        MAINTENANCE_INTERVAL_SEC, compress_pending_segments, log_maintenance,
+    )
+    from services.salt_monitor_service import check_salt_level
+    log_with_timestamp("Scheduling background jobs…")
     # Broadcast latest pH to websockets
-    log_with_timestamp("Spawning broadcast_ph_readings…")
-    eventlet.spawn(broadcast_ph_readings)
-
-    # ▶ NEW pump-trigger auto-dosing loop
+    scheduler.add_periodic("broadcast_ph", broadcast_ph_readings, 1, timeout_sec=5)
+    # Status broadcaster
+    scheduler.add_periodic("broadcast_status", broadcast_status, 5, timeout_sec=10)
+    # Hardware error checker
+    scheduler.add_periodic("hardware_check", check_for_hardware_errors, 10,
+                           jitter_sec=1, timeout_sec=10)
+    # Salt-level monitor
+    scheduler.add_periodic("salt_monitor", check_salt_level, 60,
+                           jitter_sec=5, timeout_sec=30)
+    # Flush open rollup buckets to the event store
+    scheduler.add_periodic("rollup_flush", rollups.flush, FLUSH_INTERVAL_SEC, timeout_sec=30)
+    # Journal segment roll / compression / retention
+    scheduler.add_once("log_compress_pending", compress_pending_segments, 0, timeout_sec=600)
+    scheduler.add_periodic("log_maintenance", log_maintenance, MAINTENANCE_INTERVAL_SEC,
+                           timeout_sec=600)
+
+    # Dosing actuator (relay owner; forces off a dose interrupted by a restart)
+    from services.dosing_actuator import dosing_actuator
+    log_with_timestamp("Starting dosing actuator…")
+    dosing_actuator.start()
+
+    # Telegram/Discord outbox (resumes messages left pending by a restart)
+    # and the digest's optional daily summary
+    from services.notification_outbox import notification_outbox
+    from services.notification_digest import notification_digest
+    log_with_timestamp("Starting notification outbox…")
+    notification_outbox.start()
+    notification_digest.start()
+
+    # ▶ NEW pump-trigger auto-dosing loop (event-driven; its dose timer is a
+    # one-shot scheduler job)
     log_with_timestamp("Spawning pump-trigger auto dosing…")
     eventlet.spawn(pump_trigger_dose_loop)
 
-    # Salt-level monitor
-    from services.salt_monitor_service import salt_monitor_loop
-    log_with_timestamp("Spawning salt-level monitor…")
-    eventlet.spawn(salt_monitor_loop)
-
-    # Serial reader
+    # Serial reader (blocking reads, keeps its own green-thread)
     from services.ph_service import serial_reader
     log_with_timestamp("Spawning pH serial reader…")
     eventlet.spawn(serial_reader)
 
-    # Status broadcaster
-    log_with_timestamp("Spawning status broadcaster…")
-    eventlet.spawn(broadcast_status)
-
-    # Hardware error checker
-    log_with_timestamp("Spawning hardware error checker…")
-    eventlet.spawn(check_for_hardware_errors)
-
-    # ScreenLogic poller
+    # ScreenLogic poller (adaptive interval, keeps its own green-thread)
     from services.screenlogic_service import screenlogic_service
     log_with_timestamp("Starting ScreenLogic poller…")
     screenlogic_service.start()
@@ -140,6 +159,9 @@ app.register_blueprint(update_code_blueprint, url_prefix='/api/system')
 app.register_blueprint(debug_blueprint, url_prefix='/debug')
 app.register_blueprint(notifications_blueprint, url_prefix='/api/notifications')
 app.register_blueprint(screenlogic_bp)
+app.register_blueprint(history_blueprint, url_prefix='/api/history')
+app.register_blueprint(export_blueprint, url_prefix='/api/export')
+app.register_blueprint(scheduler_blueprint, url_prefix='/api/scheduler')
 
 # Routes
 @app.route('/')
@@ -0,0 +1,156 @@
+# File: services/aggregation_service.py
+"""
+Aggregation queries
+-------------------
+• Group-by (hour / day / week / month / hour_of_day / all) with sum, mean,
+  min, max, count and nearest-rank percentiles (p50, p95, ...).
+• Everything is evaluated inside SQLite in one statement: grouping via
+  strftime(), percentiles via ROW_NUMBER() window functions. Python only
+  reshapes the grouped rows into columnar arrays.
+• Sources:
+    events   - a numeric payload field (default dose_amount_ml) of one
+               event_type (default dosing), optionally filtered by dose_type.
+    readings - a rollup series (e.g. ph). Totals come from the 1-minute
+               buckets, so sum/mean/count are exact; percentiles are taken
+               over the 1-minute means.
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services import event_store
+from services.rollup_service import RESOLUTIONS, rollups, to_local_epoch
+
+# group name -> SQL expression over a time string column `t`
+GROUP_BY = {
+    "hour": "strftime('%Y-%m-%dT%H:00:00', t)",
+    "day": "strftime('%Y-%m-%d', t)",
+    "week": "date(t, 'weekday 0', '-6 days')",      # Monday of the week
+    "month": "strftime('%Y-%m', t)",
+    "hour_of_day": "CAST(strftime('%H', t) AS INTEGER)",
+    "all": "'all'",
+}
+
+AGGREGATES = {
+    "sum": "SUM(s)",
+    "mean": "CAST(SUM(s) AS REAL) / SUM(c)",   # integer sums would divide as integers
+    "min": "MIN(lo)",
+    "max": "MAX(hi)",
+    "count": "SUM(c)",
+}
+
+_PERCENTILE_RE = re.compile(r"^p(\d{1,2}(?:\.\d+)?|100)$")
+_FIELD_RE = re.compile(r"^\w+$")
+
+
+def parse_aggregates(names: List[str]) -> List[str]:
+    """Validate aggregate names; raises ValueError on anything unknown."""
+    for name in names:
+        if name not in AGGREGATES and not _PERCENTILE_RE.match(name):
+            raise ValueError(f"unknown aggregate '{name}'")
+    if not names:
+        raise ValueError("at least one aggregate is required")
+    return names
+
+
+def _percentile_sql(name: str) -> str:
+    pos = f"({float(name[1:])} * n / 100.0)"
+    # nearest rank: ceil(p/100 * n), at least 1
+    rank = (f"MAX(1, CAST({pos} AS INTEGER) "
+            f"+ (CAST({pos} AS INTEGER) < {pos}))")
+    return f"MAX(CASE WHEN rn = {rank} THEN x END)"
+
+
+def _events_source(event_type: str, field: str, dose_type: Optional[str],
+                   since: Optional[str], until: Optional[str]):
+    if not _FIELD_RE.match(field):
+        raise ValueError(f"invalid field '{field}'")
+    clauses, params = ["event_type = ?"], [f"$.{field}", event_type]
+    if dose_type:
+        clauses.append("json_extract(payload, '$.dose_type') = ?")
+        params.append(dose_type)
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        clauses.append("timestamp <= ?")
+        params.append(until)
+    sql = (
+        "SELECT t, x, x AS s, 1 AS c, x AS lo, x AS hi FROM ("
+        "SELECT timestamp AS t, json_extract(payload, ?) AS x FROM events "
+        f"WHERE {' AND '.join(clauses)})"
+    )
+    return sql, params
+
+
+def _readings_source(series: str, since: Optional[datetime], until: Optional[datetime]):
+    rollups.flush()
+    clauses, params = ["series = ?", "resolution = ?"], [series, RESOLUTIONS["1m"]]
+    if since is not None:
+        clauses.append("bucket >= ?")
+        params.append(to_local_epoch(since))
+    if until is not None:
+        clauses.append("bucket <= ?")
+        params.append(to_local_epoch(until))
+    sql = (
+        "SELECT datetime(bucket, 'unixepoch') AS t, sum / count AS x, sum AS s, "
+        "count AS c, min AS lo, max AS hi "
+        f"FROM rollups WHERE {' AND '.join(clauses)} AND count > 0"
+    )
+    return sql, params
+
+
+def aggregate(
+    group_by: str = "day",
+    aggregates: Optional[List[str]] = None,
+    series: Optional[str] = None,
+    event_type: str = "dosing",
+    field: str = "dose_amount_ml",
+    dose_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Return {"group": [...], "<aggregate>": [...], ...} ordered by group.
+    With `series` the rollup readings are aggregated, otherwise events.
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {list(GROUP_BY)}")
+    aggregates = parse_aggregates(aggregates or ["sum", "count"])
+
+    if series:
+        source, params = _readings_source(
+            series,
+            datetime.fromisoformat(since) if since else None,
+            datetime.fromisoformat(until) if until else None,
+        )
+    else:
+        source, params = _events_source(event_type, field, dose_type, since, until)
+
+    columns = [
+        AGGREGATES[name] if name in AGGREGATES else _percentile_sql(name)
+        for name in aggregates
+    ]
+    if any(name not in AGGREGATES for name in aggregates):
+        ranked = (
+            "SELECT *, ROW_NUMBER() OVER (PARTITION BY g ORDER BY x) AS rn, "
+            "COUNT(x) OVER (PARTITION BY g) AS n FROM v"
+        )
+    else:
+        ranked = "SELECT * FROM v"
+    sql = (
+        f"WITH src AS ({source}), "
+        f"v AS (SELECT {GROUP_BY[group_by]} AS g, x, s, c, lo, hi FROM src WHERE x IS NOT NULL), "
+        f"r AS ({ranked}) "
+        f"SELECT g, {', '.join(columns)} FROM r GROUP BY g ORDER BY g"
+    )
+    rows = event_store.fetch_all(sql, params)
+
+    result: Dict[str, Any] = {
+        "group_by": group_by,
+        "group": [r[0] for r in rows],
+    }
+    for i, name in enumerate(aggregates, start=1):
+        result[name] = [r[i] for r in rows]
+    return result
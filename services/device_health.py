@@ -0,0 +1,166 @@
+# File: services/device_health.py
+"""
+USB device health (dosing relay, pH probe)
+------------------------------------------
+• Passive: real operations report their outcome — relay writes/opens from
+  RelayDriver, port opens and reads from the pH serial reader — through
+  record_ok()/record_failure().
+• A device whose usb_roles path has disappeared from /dev counts as a
+  failure at once; reassigning or unassigning a role resets its state.
+• Active: check() (run by the hardware-check scheduler job) probes the
+  relay only when nothing has talked to it for idle_probe_sec, or every
+  offline_probe_sec while it is offline, and never during a dispense.
+  The pH reader keeps its port open and reads continuously, so the pH
+  probe gets no active probe.
+• Online/offline transitions set or clear RELAY_USB_OFFLINE /
+  PH_USB_OFFLINE in error_service immediately and push a status update.
+
+Settings (all optional):
+    "device_health": {
+        "idle_probe_sec": 300,
+        "offline_probe_sec": 30
+    }
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from eventlet import patcher
+
+from services.error_service import set_error, clear_error
+from utils.settings_utils import load_settings
+
+_threading = patcher.original("threading")
+
+ERROR_CODES = {"relay": "RELAY_USB_OFFLINE", "ph_probe": "PH_USB_OFFLINE"}
+DEFAULT_IDLE_PROBE_SEC = 300
+DEFAULT_OFFLINE_PROBE_SEC = 30
+
+
+class _Device:
+    def __init__(self) -> None:
+        self.online: Optional[bool] = None      # None = not known yet
+        self.last_ok: Optional[float] = None     # time.monotonic()
+        self.last_failure: Optional[float] = None
+        self.last_activity: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.changed_at: Optional[str] = None
+        self.failures = 0
+        self.probes = 0
+
+
+class DeviceHealth:
+    def __init__(self) -> None:
+        # real lock: relay outcomes are also reported from the watchdog thread
+        self._lock = _threading.Lock()
+        self._main_thread = _threading.main_thread()
+        self._devices: Dict[str, _Device] = {role: _Device() for role in ERROR_CODES}
+
+    # outcomes of real operations (any greenlet or thread) -----------------------
+    def record_ok(self, role: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            dev = self._devices[role]
+            dev.last_ok = dev.last_activity = now
+            changed = dev.online is not True
+            dev.online = True
+        if changed:
+            self._publish(role, True)
+
+    def record_failure(self, role: str, error: Any = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            dev = self._devices[role]
+            dev.last_failure = dev.last_activity = now
+            dev.last_error = str(error) if error is not None else None
+            dev.failures += 1
+            changed = dev.online is not False
+            dev.online = False
+        if changed:
+            self._publish(role, False, dev.last_error)
+
+    def reset(self, role: str) -> None:
+        """Device (re)assigned or unassigned: forget what we knew about it."""
+        if role not in self._devices:
+            return
+        with self._lock:
+            self._devices[role] = _Device()
+        if clear_error(ERROR_CODES[role]):
+            self._notify()
+
+    def _publish(self, role: str, online: bool, error: Optional[str] = None) -> None:
+        self._devices[role].changed_at = datetime.now().isoformat()
+        code = ERROR_CODES[role]
+        if online:
+            clear_error(code)
+            print(f"[DeviceHealth] {role} online", flush=True)
+        else:
+            set_error(code)
+            print(f"[DeviceHealth] {role} OFFLINE: {error}", flush=True)
+        self._notify()
+
+    def _notify(self) -> None:
+        # Socket.IO lives on the hub; from a real thread the next periodic
+        # status broadcast carries the change instead.
+        if _threading.current_thread() is not self._main_thread:
+            return
+        from status_namespace import emit_status_update
+        emit_status_update()
+
+    # active check (scheduler job) -----------------------------------------------
+    def check(self) -> None:
+        settings = load_settings()
+        roles = settings.get("usb_roles", {})
+        cfg = settings.get("device_health", {})
+        idle_sec = float(cfg.get("idle_probe_sec", DEFAULT_IDLE_PROBE_SEC))
+        offline_sec = float(cfg.get("offline_probe_sec", DEFAULT_OFFLINE_PROBE_SEC))
+
+        for role in ERROR_CODES:
+            path = roles.get(role)
+            if not path:
+                if self._devices[role].online is not None:
+                    self.reset(role)
+                continue
+            if not os.path.exists(path):
+                if self._devices[role].online is not False:
+                    self.record_failure(role, f"{path} not present")
+                continue
+            if role == "relay":
+                self._maybe_probe_relay(idle_sec, offline_sec)
+
+    def _maybe_probe_relay(self, idle_sec: float, offline_sec: float) -> None:
+        from services.dosing_state import state as dosing_state
+        from services.pump_relay_service import relay_driver
+
+        if dosing_state.active_dosing_task is not None:
+            return   # a dispense is reporting for us
+        dev = self._devices["relay"]
+        threshold = offline_sec if dev.online is False else idle_sec
+        if dev.last_activity is not None and time.monotonic() - dev.last_activity < threshold:
+            return
+        dev.probes += 1
+        relay_driver.probe()   # outcome is recorded by the driver
+
+    # introspection ----------------------------------------------------------------
+    def get_state(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        ago = lambda t: round(now - t, 1) if t is not None else None
+        return {
+            role: {
+                "online": dev.online,
+                "error_code": ERROR_CODES[role],
+                "last_ok_sec_ago": ago(dev.last_ok),
+                "last_failure_sec_ago": ago(dev.last_failure),
+                "last_error": dev.last_error,
+                "changed_at": dev.changed_at,
+                "failures": dev.failures,
+                "probes": dev.probes,
+            }
+            for role, dev in self._devices.items()
+        }
+
+
+# singleton used by the relay driver, the pH reader and error_service
+device_health = DeviceHealth()
@@ -3,7 +3,7 @@ import eventlet
 from services.ph_service import get_latest_ph_reading, get_last_read_time
 
 MAX_PH_AGE_SEC = 60
-from services.pump_relay_service import turn_on_relay, turn_off_relay
+from services.dosing_actuator import dosing_actuator
 from api.settings import load_settings
 from services.log_service import log_dosing_event
 from services.dosing_state import state  # CHANGED: Import the singleton instance instead of individual globals
@@ -165,80 +165,8 @@ def perform_auto_dose(settings):
         return ("none", 0.0)
 
 def do_relay_dispense(dispense_type, amount_ml, settings):
-    max_dosing = settings.get("max_dosing_amount", 0)
-    if max_dosing > 0 and amount_ml > max_dosing:
-        amount_ml = max_dosing
-
-    pump_calibration = settings.get("pump_calibration", {})
-    relay_ports = settings.get("relay_ports", {"ph_up": 1, "ph_down": 2})
-
-    if dispense_type == "up":
-        calibration_value = pump_calibration.get("pump1", 1.0)
-        relay_port = relay_ports["ph_up"]
-    else:
-        calibration_value = pump_calibration.get("pump2", 1.0)
-        relay_port = relay_ports["ph_down"]
-
-    duration_sec = amount_ml * calibration_value
-    if duration_sec <= 0:
-        print(f"[AutoDosing] Calculated run time is 0 for {dispense_type}, skipping.")
-        return
-
-    print(f"[AutoDosing] Starting dispense of {amount_ml:.2f} ml pH {dispense_type} -> Relay {relay_port}, ~{duration_sec:.2f}s")
-
-    def dispense_task():
-        from app import socketio  # Import here to avoid circular import
-        # CHANGED: No 'global' keyword needed anymore; attributes are on the object
-        try:
-            print(f"[DEBUG AutoDispense] Setting active state: type={dispense_type}, amount={amount_ml}, duration={duration_sec}")
-            socketio.emit('dose_start', {'type': dispense_type, 'amount': amount_ml, 'duration': duration_sec})
-            print(f"[AutoDosing] Turning ON Relay {relay_port} for {duration_sec:.2f} seconds...")
-            turn_on_relay(relay_port)
-            eventlet.sleep(duration_sec)
-            turn_off_relay(relay_port)
-            print(f"[AutoDosing] Turning OFF Relay {relay_port} after {duration_sec:.2f} seconds...")
-            manual_dispense(dispense_type, amount_ml)
-            socketio.emit('dose_complete', {'type': dispense_type, 'amount': amount_ml})
-        except Exception as e:
-            print(f"[AutoDosing] Error during dispense of {dispense_type}: {str(e)}")
-            socketio.emit('dose_error', {'type': dispense_type, 'error': str(e)})
-        finally:
-            # Clear active task only if this is the current task
-            # CHANGED: Use state. prefix
-            if state.active_dosing_task and state.active_dosing_task == eventlet.getcurrent():
-                print(f"[DEBUG AutoDispense] Clearing state for {dispense_type}")
-                state.active_dosing_task = None
-                state.active_relay_port = None
-                state.active_dosing_type = None
-                state.active_dosing_amount = None
-                state.active_start_time = None
-                state.active_duration = None
-            turn_off_relay(relay_port)  # Ensure relay is off
-
-    # Cancel any existing task
-    # CHANGED: Use state. prefix for all variables; no 'global' keyword
-    if state.active_dosing_task:
-        try:
-            state.active_dosing_task.kill()
-            if state.active_relay_port is not None:
-                turn_off_relay(state.active_relay_port)
-            print(f"[AutoDosing] Cancelled previous dosing task: {state.active_dosing_type or 'unknown'}")
-        except Exception as e:
-            print(f"[AutoDosing] Error cancelling previous task: {str(e)}")
-        finally:
-            print("[DEBUG AutoDispense] Cleared previous state after cancel")
-            state.active_dosing_task = None
-            state.active_relay_port = None
-            state.active_dosing_type = None
-            state.active_dosing_amount = None
-            state.active_start_time = None
-            state.active_duration = None
-
-    # Start new task
-    state.active_dosing_task = eventlet.spawn(dispense_task)
-    state.active_relay_port = relay_port
-    state.active_dosing_type = dispense_type
-    state.active_dosing_amount = amount_ml
-    state.active_start_time = time.time()
-    state.active_duration = duration_sec
-    print(f"[DEBUG AutoDispense] Started new task, state set: start_time={state.active_start_time}, duration={state.active_duration}")
\ No newline at end of file
+    """Queue an auto dose on the dosing actuator (it owns the relays)."""
+    try:
+        dosing_actuator.submit("auto", dispense_type, amount_ml, settings=settings)
+    except ValueError as e:
+        print(f"[AutoDosing] {e} ({dispense_type}), skipping.")
@@ -0,0 +1,364 @@
+# File: services/dosing_actuator.py
+"""
+Dosing actuator
+---------------
+• The only code that switches the dosing relays. Manual doses
+  (/api/dosage/manual) and auto doses (dosage_service.do_relay_dispense)
+  are submitted as jobs to one priority queue and run one at a time by a
+  single worker green-thread, so a new dose never kills a running one.
+• Each job: source (manual / auto), type (up / down), ml, priority.
+  Higher priority runs first; equal priorities run in submission order.
+• Progress goes out on socket.io: dose_start, dose_progress (about once a
+  second), dose_complete, dose_stopped and dose_error. Every event carries
+  the job id.
+• The running job is written to data/dosing_inflight.json before the relay
+  turns on and removed once it is off. If the file is still there at start
+  (crash / power loss mid-dose), the relay is forced off and the job is
+  reported as interrupted.
+• The relay is switched on with a hard deadline held by the relay watchdog
+  (a real OS thread), so it goes off at the commanded time even if the
+  hub is late to resume this green-thread. stop() marks the running job
+  stopped, trips the watchdog's fast path (every relay off, which also
+  drops an "on" still waiting in the driver queue) and only then signals
+  the worker, which never switches on a job that was already stopped.
+  stop() switches every relay off even when no job is running.
+• Commanded vs. actual relay on-time is measured for every job; a completed
+  job outside ON_TIME_TOLERANCE_SEC is flagged (get_status()["metrics"]).
+• DosingState (services.dosing_state) mirrors the running job for existing
+  readers such as get_dosage_info().
+"""
+
+import collections
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import eventlet
+from eventlet.event import Event
+from eventlet.queue import PriorityQueue
+
+from utils.settings_utils import load_settings
+from services.dosing_state import state
+from services.pump_relay_service import (
+    RelayCommandCancelled, emergency_stop, get_relay_status, relay_switched_at,
+    relay_watchdog, turn_off_relay, turn_on_relay,
+)
+
+_INFLIGHT_FILE = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "dosing_inflight.json")
+)
+
+DISPENSE_TYPES = ("up", "down")
+DEFAULT_PRIORITY = {"manual": 10, "auto": 0}
+PROGRESS_INTERVAL_SEC = 1.0
+ON_TIME_TOLERANCE_SEC = 0.25
+RECENT_JOBS = 50
+
+
+def _emit(event: str, payload: Dict[str, Any]) -> None:
+    try:
+        from app import socketio  # Import here to avoid circular import
+        socketio.emit(event, payload)
+    except Exception as e:
+        print(f"[Dosing] emit {event} failed: {e}", flush=True)
+
+
+def plan_dispense(dispense_type: str, amount_ml: float, settings: Dict[str, Any]):
+    """
+    Clamp `amount_ml` to max_dosing_amount and work out the relay port and
+    run time from the pump calibration. Returns (amount_ml, relay_port,
+    duration_sec); raises ValueError for a bad type or a zero run time.
+    """
+    if dispense_type not in DISPENSE_TYPES:
+        raise ValueError("Invalid dispense type")
+    amount_ml = float(amount_ml or 0)
+    max_dosing = settings.get("max_dosing_amount", 0)
+    if max_dosing > 0 and amount_ml > max_dosing:
+        amount_ml = max_dosing
+
+    pump_calibration = settings.get("pump_calibration", {})
+    relay_ports = settings.get("relay_ports", {"ph_up": 1, "ph_down": 2})
+    if dispense_type == "up":
+        calibration_value = pump_calibration.get("pump1", 1.0)
+        relay_port = relay_ports["ph_up"]
+    else:
+        calibration_value = pump_calibration.get("pump2", 1.0)
+        relay_port = relay_ports["ph_down"]
+
+    duration_sec = amount_ml * calibration_value
+    if duration_sec <= 0:
+        raise ValueError("Calculated run time is 0 or negative.")
+    return amount_ml, relay_port, duration_sec
+
+
+class DispenseJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, source: str, dispense_type: str, amount_ml: float,
+                 relay_port: int, duration_sec: float, priority: int) -> None:
+        self.id = f"{int(time.time())}-{next(self._ids)}"
+        self.source = source
+        self.dispense_type = dispense_type
+        self.amount_ml = amount_ml
+        self.relay_port = relay_port
+        self.duration_sec = duration_sec
+        self.priority = priority
+        self.state = "queued"   # queued | running | done | stopped | error | cancelled | interrupted
+        self.created = datetime.now().isoformat()
+        self.started: Optional[str] = None
+        self.finished: Optional[str] = None
+        self.actual_on_sec: Optional[float] = None
+        self.off_by: Optional[str] = None      # deadline (watchdog) | actuator | stop
+        self.on_time_ok: Optional[bool] = None
+        self.error: Optional[str] = None
+        self.cancel = Event()
+        self.stop_requested = False   # set by stop() before it yields
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "type": self.dispense_type,
+            "amount": self.amount_ml,
+            "relay_port": self.relay_port,
+            "duration": self.duration_sec,
+            "priority": self.priority,
+            "state": self.state,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "actual_on_sec": self.actual_on_sec,
+            "off_by": self.off_by,
+            "on_time_ok": self.on_time_ok,
+            "error": self.error,
+        }
+
+
+class DosingActuator:
+    def __init__(self) -> None:
+        self._queue: PriorityQueue = PriorityQueue()
+        self._seq = itertools.count()
+        self._worker = None
+        self._current: Optional[DispenseJob] = None
+        self._recent: collections.deque = collections.deque(maxlen=RECENT_JOBS)
+        self._metrics: Dict[str, Any] = {
+            "jobs": 0,
+            "completed": 0,
+            "stopped": 0,
+            "errors": 0,
+            "out_of_tolerance": 0,
+            "commanded_sec": 0.0,
+            "actual_sec": 0.0,
+            # on-time error (actual - commanded) of completed jobs
+            "last_error_ms": None,
+            "max_abs_error_ms": 0.0,
+        }
+
+    # start / recovery -------------------------------------------------------
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._recover()
+        self._worker = eventlet.spawn(self._run)
+        print("[Dosing] actuator started", flush=True)
+
+    def _recover(self) -> None:
+        try:
+            with open(_INFLIGHT_FILE) as f:
+                job = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        port = job.get("relay_port")
+        print(f"[Dosing] in-flight job {job.get('id')} found after restart - "
+              f"forcing relay {port} off", flush=True)
+        if port is not None:
+            turn_off_relay(port)
+        job.update({"state": "interrupted", "finished": datetime.now().isoformat(),
+                    "relay_off_confirmed": get_relay_status(port) == "off"})
+        self._recent.append(job)
+        self._clear_inflight()
+
+    def _save_inflight(self, job: DispenseJob) -> None:
+        os.makedirs(os.path.dirname(_INFLIGHT_FILE), exist_ok=True)
+        tmp = _INFLIGHT_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(job.to_dict(), f, indent=2)
+        os.replace(tmp, _INFLIGHT_FILE)
+
+    def _clear_inflight(self) -> None:
+        try:
+            os.remove(_INFLIGHT_FILE)
+        except FileNotFoundError:
+            pass
+
+    # public API ---------------------------------------------------------------
+    def submit(self, source: str, dispense_type: str, amount_ml: float,
+               priority: Optional[int] = None,
+               settings: Optional[Dict[str, Any]] = None) -> DispenseJob:
+        """Validate, size and queue a dispense. Raises ValueError when invalid."""
+        amount_ml, relay_port, duration_sec = plan_dispense(
+            dispense_type, amount_ml, settings if settings is not None else load_settings())
+        if priority is None:
+            priority = DEFAULT_PRIORITY.get(source, 0)
+        job = DispenseJob(source, dispense_type, amount_ml, relay_port, duration_sec, int(priority))
+        self.start()
+        self._queue.put((-job.priority, next(self._seq), job))
+        self._metrics["jobs"] += 1
+        print(f"[Dosing] queued {job.source} job {job.id}: {amount_ml:.2f} ml pH "
+              f"{dispense_type} -> Relay {relay_port}, ~{duration_sec:.2f}s", flush=True)
+        return job
+
+    def stop(self) -> Optional[DispenseJob]:
+        """
+        Stop the running job, drop everything queued and switch every relay
+        off (also when nothing is running); returns the stopped job or None.
+        """
+        while not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job.state = "cancelled"
+            self._recent.append(job.to_dict())
+        job = self._current
+        if job is not None:
+            job.stop_requested = True
+        emergency_stop()            # relays off first, no settings/file I/O
+        if job is not None:
+            job.cancel.send()
+        return job
+
+    def get_status(self) -> Dict[str, Any]:
+        running = None
+        if self._current is not None:
+            running = self._current.to_dict()
+            if state.active_start_time:
+                elapsed = time.time() - state.active_start_time
+                running["remaining"] = max(0.0, self._current.duration_sec - elapsed)
+        queued = sorted(self._queue.queue)
+        metrics = dict(self._metrics)
+        done = metrics["completed"]
+        metrics["mean_error_ms"] = (
+            round((metrics["actual_sec"] - metrics["commanded_sec"]) * 1000 / done, 1)
+            if done else None
+        )
+        return {
+            "running": running,
+            "queued": [job.to_dict() for _, _, job in queued],
+            "recent": list(self._recent),
+            "metrics": metrics,
+        }
+
+    # worker -------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job.state != "queued":
+                continue
+            try:
+                self._dispense(job)
+            except Exception as e:
+                print(f"[Dosing] worker error on job {job.id}: {e}", flush=True)
+
+    def _dispense(self, job: DispenseJob) -> None:
+        port = job.relay_port
+        payload = {"job_id": job.id, "source": job.source, "type": job.dispense_type,
+                   "amount": job.amount_ml}
+        self._current = job
+        job.state = "running"
+        job.started = datetime.now().isoformat()
+        state.active_dosing_task = self._worker
+        state.active_relay_port = port
+        state.active_dosing_type = job.dispense_type
+        state.active_dosing_amount = job.amount_ml
+        state.active_start_time = time.time()
+        state.active_duration = job.duration_sec
+
+        on_at = None
+        try:
+            self._save_inflight(job)
+            _emit("dose_start", {**payload, "duration": job.duration_sec})
+            if job.stop_requested or job.cancel.ready():
+                raise RelayCommandCancelled(f"job {job.id} stopped before relay {port} came on")
+            print(f"[Dosing] Turning ON Relay {port} for {job.duration_sec:.2f} seconds...", flush=True)
+            turn_on_relay(port, max_on_sec=job.duration_sec)
+            if get_relay_status(port) != "on":
+                raise RuntimeError(f"relay {port} did not switch on")
+            on_at = relay_switched_at[port]
+
+            deadline = on_at + job.duration_sec
+            while not job.cancel.ready():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with eventlet.Timeout(min(PROGRESS_INTERVAL_SEC, remaining), False):
+                    job.cancel.wait()
+                _emit("dose_progress", {**payload,
+                                        "elapsed": round(time.monotonic() - on_at, 2),
+                                        "remaining": round(max(0.0, deadline - time.monotonic()), 2)})
+        except RelayCommandCancelled:
+            job.state = "stopped"   # stop() switched the relay off before it came on
+        except Exception as e:
+            job.state, job.error = "error", str(e)
+        finally:
+            off_at = relay_watchdog.release(port)
+            if off_at is None:
+                turn_off_relay(port)
+                job.off_by = "actuator"
+                off_at = relay_switched_at.get(port, time.monotonic())
+            else:
+                # switched off by the watchdog thread (deadline or stop)
+                job.off_by = "stop" if job.cancel.ready() else "deadline"
+                from status_namespace import emit_status_update
+                emit_status_update()
+            if on_at is not None:
+                job.actual_on_sec = round(off_at - on_at, 3)
+            if get_relay_status(port) == "off":
+                self._clear_inflight()
+            else:
+                print(f"[Dosing] relay {port} not confirmed off; keeping in-flight record", flush=True)
+            job.finished = datetime.now().isoformat()
+            self._finish(job, payload)
+
+    def _finish(self, job: DispenseJob, payload: Dict[str, Any]) -> None:
+        if job.state == "running":
+            job.state = "stopped" if job.cancel.ready() else "done"
+        print(f"[Dosing] job {job.id} {job.state}: commanded {job.duration_sec:.2f}s, "
+              f"actual {job.actual_on_sec}s", flush=True)
+
+        m = self._metrics
+        if job.state == "error":
+            m["errors"] += 1
+            _emit("dose_error", {**payload, "error": job.error})
+        elif job.state == "stopped":
+            m["stopped"] += 1
+            _emit("dose_stopped", payload)
+        else:
+            m["completed"] += 1
+            from services.dosage_service import manual_dispense  # logs the dosing event
+            manual_dispense(job.dispense_type, job.amount_ml)
+            _emit("dose_complete", payload)
+        if job.state == "done" and job.actual_on_sec is not None:
+            error_ms = (job.actual_on_sec - job.duration_sec) * 1000
+            job.on_time_ok = abs(error_ms) <= ON_TIME_TOLERANCE_SEC * 1000
+            if not job.on_time_ok:
+                m["out_of_tolerance"] += 1
+                print(f"[Dosing] job {job.id} on-time off by {error_ms:.0f} ms "
+                      f"(commanded {job.duration_sec:.2f}s)", flush=True)
+            m["commanded_sec"] += job.duration_sec
+            m["actual_sec"] += job.actual_on_sec
+            m["last_error_ms"] = round(error_ms, 1)
+            m["max_abs_error_ms"] = round(max(m["max_abs_error_ms"], abs(error_ms)), 1)
+
+        self._recent.append(job.to_dict())
+        self._current = None
+        state.active_dosing_task = None
+        state.active_relay_port = None
+        state.active_dosing_type = None
+        state.active_dosing_amount = None
+        state.active_start_time = None
+        state.active_duration = None
+
+
+# singleton shared by api/dosing and the auto-dose path
+dosing_actuator = DosingActuator()
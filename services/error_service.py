@@ -1,5 +1,4 @@
 # File: services/error_service.py
-import serial
 import time
 
 # We'll also use set_error, clear_error, get_current_errors from this module
@@ -13,38 +12,29 @@ error_codes = {
 _error_state = set()
 
 def set_error(code):
-    if code in error_codes:
+    """Returns True if the error was not already set."""
+    if code in error_codes and code not in _error_state:
         _error_state.add(code)
+        return True
+    return False
 
 def clear_error(code):
+    """Returns True if the error was set."""
     if code in _error_state:
         _error_state.remove(code)
+        return True
+    return False
 
 def get_current_errors():
     return [error_codes[code] for code in _error_state]
 
-def check_relay_offline():
-    """
-    Attempt to open the relay device path. If it fails, mark `RELAY_USB_OFFLINE`.
-    If it succeeds, clear that error.
-    """
-    from services.pump_relay_service import get_relay_device_path
-    try:
-        device_path = get_relay_device_path()  # from relay_service
-        with serial.Serial(device_path, baudrate=9600, timeout=1) as ser:
-            # If open worked, we assume device is present
-            pass
-        clear_error("RELAY_USB_OFFLINE")
-    except Exception as e:
-        set_error("RELAY_USB_OFFLINE")
-
 def check_for_hardware_errors():
     """
-    Main loop that periodically checks hardware availability.
-    We can add more checks (like pH hardware) here as the code evolves.
+    One hardware availability pass (run every 10 s by services.scheduler).
+    Relay and pH probe health come from their real operations; this only
+    notices vanished device paths and probes the relay when it has been
+    idle (see services.device_health).
     """
-    import eventlet
-    while True:
-        check_relay_offline()
-        # If we want to add more checks, do them here.
-        eventlet.sleep(10)  # check every 10 seconds
+    from services.device_health import device_health
+    device_health.check()
+    # If we want to add more checks, do them here.
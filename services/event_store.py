@@ -0,0 +1,296 @@
+# File: services/event_store.py
+"""
+Event store
+-----------
+• Embedded SQLite database (WAL mode) at data/events.db.
+• One row per logged event, indexed on (event_type, timestamp) so dosing
+  history and time-range reads are index seeks instead of file scans.
+• insert_events() writes a whole batch in a single transaction.
+• iter_query() / iter_event_rows() stream rows from a private connection
+  for exports that must not materialise the result set.
+• import_legacy_logs() migrates pre-existing *.jsonl logs exactly once.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from eventlet import patcher
+
+# The store is shared between greenlets and (for background flushes) real
+# OS threads, so guard the shared connection with an un-patched lock.
+_threading = patcher.original("threading")
+
+DB_FILE = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "events.db")
+)
+LEGACY_LOG_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "logs")
+)
+IMPORT_BATCH_SIZE = 500
+ITER_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id          INTEGER PRIMARY KEY,
+    timestamp   TEXT NOT NULL,
+    event_type  TEXT NOT NULL DEFAULT '',
+    payload     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (event_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_lock = _threading.RLock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Open a new connection to the store with the schema in place.
+    Long-running readers (streaming exports) use their own connection so
+    they never hold the shared one across yields.
+    """
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _shared() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = connect()
+    return _conn
+
+
+def execute_script(sql: str) -> None:
+    """Run DDL on the shared connection (used by modules adding tables)."""
+    with _lock:
+        _shared().executescript(sql)
+
+
+def execute_many(sql: str, rows: Iterable[tuple]) -> None:
+    """Run one statement for many parameter rows in a single transaction."""
+    rows = list(rows)
+    if not rows:
+        return
+    with _lock:
+        conn = _shared()
+        with conn:
+            conn.executemany(sql, rows)
+
+
+def fetch_all(sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+    with _lock:
+        return _shared().execute(sql, list(params)).fetchall()
+
+
+def normalize_timestamp(value: Optional[str], end_of_day: bool = False) -> Optional[str]:
+    """
+    Parse an ISO-8601 string and return it in the canonical form used for
+    stored timestamps, or None if value is empty. Raises ValueError on junk.
+    With end_of_day (for inclusive upper bounds), a date-only value such as
+    "2024-05-01" means the last instant of that day, not its midnight.
+    """
+    if value in (None, ""):
+        return None
+    parsed = datetime.fromisoformat(str(value))
+    if end_of_day and _is_date_only(str(value)):
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed.isoformat()
+
+
+def _is_date_only(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _row(event: Dict[str, Any]):
+    timestamp = event.get("timestamp") or datetime.now().isoformat()
+    return (timestamp, event.get("event_type") or "", json.dumps(event))
+
+
+def insert_events(events: Iterable[Dict[str, Any]]) -> int:
+    """Insert a batch of event dicts in one transaction. Returns the count."""
+    rows = [_row(e) for e in events]
+    if not rows:
+        return 0
+    with _lock:
+        conn = _shared()
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (timestamp, event_type, payload) VALUES (?, ?, ?)",
+                rows,
+            )
+    return len(rows)
+
+
+def insert_event(event: Dict[str, Any]) -> None:
+    insert_events([event])
+
+
+def _where(event_type: Optional[str], since: Optional[str], until: Optional[str]):
+    clauses, params = [], []
+    if event_type is not None:
+        clauses.append("event_type = ?")
+        params.append(event_type)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp <= ?")
+        params.append(until)
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return sql, params
+
+
+def query_events(
+    event_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Return logged events as dicts (the same shape log_event() wrote),
+    filtered by type and [since, until] ISO timestamps. With newest_first
+    and a limit, this is a bounded index seek regardless of table size.
+    """
+    where, params = _where(event_type, since, until)
+    order = "DESC" if newest_first else "ASC"
+    sql = f"SELECT payload FROM events{where} ORDER BY timestamp {order}, id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    with _lock:
+        rows = _shared().execute(sql, params).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def iter_query(sql: str, params: Iterable[Any] = ()) -> Iterator[tuple]:
+    """
+    Yield result rows without materialising the result set. Uses a private
+    connection for the lifetime of the generator, so a slow consumer (a
+    streaming HTTP response) never holds the shared connection.
+    """
+    conn = connect()
+    try:
+        cur = conn.execute(sql, list(params))
+        while True:
+            batch = cur.fetchmany(ITER_BATCH_SIZE)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        conn.close()
+
+
+def iter_event_rows(
+    event_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[tuple] = None,
+) -> Iterator[tuple]:
+    """
+    Yield (id, timestamp, event dict) oldest-first. `after` is a
+    (timestamp, id) position to resume strictly after.
+    """
+    where, params = _where(event_type, since, until)
+    if after is not None:
+        where += (" AND " if where else " WHERE ") + "(timestamp > ? OR (timestamp = ? AND id > ?))"
+        params += [after[0], after[0], int(after[1])]
+    sql = f"SELECT id, timestamp, payload FROM events{where} ORDER BY timestamp, id"
+    for row_id, timestamp, payload in iter_query(sql, params):
+        yield row_id, timestamp, json.loads(payload)
+
+
+def iter_events(
+    event_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield events oldest-first without materialising the result set."""
+    for _, _, event in iter_event_rows(event_type, since, until):
+        yield event
+
+
+def delete_events(event_type: Optional[str] = None) -> int:
+    """Delete all events (or all of one type). Returns the number removed."""
+    where, params = _where(event_type, None, None)
+    with _lock:
+        conn = _shared()
+        with conn:
+            cur = conn.execute(f"DELETE FROM events{where}", params)
+    return cur.rowcount
+
+
+def _get_meta(key: str) -> Optional[str]:
+    with _lock:
+        row = _shared().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(key: str, value: str) -> None:
+    with _lock:
+        conn = _shared()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+
+def import_jsonl(path: str) -> int:
+    """
+    Stream a JSONL log file into the store in batches. Malformed lines are
+    skipped, matching the old load_logs() behaviour. Returns rows imported.
+    """
+    imported = 0
+    batch: List[Dict[str, Any]] = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            batch.append(entry)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += insert_events(batch)
+                batch = []
+    imported += insert_events(batch)
+    return imported
+
+
+def import_legacy_logs(log_dir: str = LEGACY_LOG_DIR) -> int:
+    """
+    One-time migration of every *.jsonl file that existed before the store.
+    Guarded by a meta flag, so later restarts (and files written after the
+    store took over) are never imported twice.
+    """
+    if _get_meta("legacy_import_done"):
+        return 0
+    total = 0
+    if os.path.isdir(log_dir):
+        for name in sorted(os.listdir(log_dir)):
+            path = os.path.join(log_dir, name)
+            if name.endswith(".jsonl") and os.path.isfile(path):
+                count = import_jsonl(path)
+                print(f"[EventStore] Imported {count} events from {name}", flush=True)
+                total += count
+    _set_meta("legacy_import_done", datetime.now().isoformat())
+    return total
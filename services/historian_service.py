@@ -0,0 +1,189 @@
+# File: services/historian_service.py
+"""
+ScreenLogic telemetry historian
+-------------------------------
+• Watches a configurable set of flattened ScreenLogic keys on every poll.
+• Writes a point only when a value moves more than its per-key deadband
+  (any change for non-numeric values) or when heartbeat_sec has passed
+  since the key was last written.
+• Points go into the append-only telemetry table of the event store and
+  can be queried by key and time range.
+
+Settings (all optional):
+    "screenlogic": {
+        "historian": {
+            "enabled": true,
+            "heartbeat_sec": 900,
+            "keys": {"<flattened.key>": <deadband>, ...}
+        }
+    }
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import event_store
+from utils.settings_utils import add_settings_listener, load_settings
+
+# also the api/settings.py defaults
+DEFAULT_HEARTBEAT_SEC = 900
+DEFAULT_KEYS = {
+    "body.0.last_temperature.value": 0.5,
+    "body.1.last_temperature.value": 0.5,
+    "controller.sensor.air_temperature.value": 1.0,
+    "controller.sensor.salt_ppm.value": 50,
+    "pump.0.state.value": 0,
+    "pump.0.rpm_now.value": 50,
+    "pump.0.watts_now.value": 25,
+    "circuit.500.value": 0,
+    "circuit.505.value": 0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry (
+    key        TEXT NOT NULL,
+    timestamp  TEXT NOT NULL,
+    value,
+    PRIMARY KEY (key, timestamp)
+) WITHOUT ROWID;
+"""
+
+
+_config_cache: Optional[Tuple[bool, float, Dict[str, float]]] = None
+
+
+def _refresh_config(settings: Optional[Dict[str, Any]] = None) -> None:
+    global _config_cache
+    settings = settings if settings is not None else load_settings()
+    cfg = (settings.get("screenlogic") or {}).get("historian") or {}
+    keys = cfg.get("keys")
+    if not isinstance(keys, dict):
+        keys = DEFAULT_KEYS
+    _config_cache = (
+        bool(cfg.get("enabled", True)),
+        float(cfg.get("heartbeat_sec", DEFAULT_HEARTBEAT_SEC)),
+        keys,
+    )
+
+
+def _config() -> Tuple[bool, float, Dict[str, float]]:
+    """Cached historian settings; refreshed on every save_settings()."""
+    if _config_cache is None:
+        _refresh_config()
+    return _config_cache
+
+
+add_settings_listener(_refresh_config)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Historian:
+    def __init__(self) -> None:
+        self._schema_ready = False
+        # key -> (last written value, when it was written)
+        self._last: Dict[str, Tuple[Any, datetime]] = {}
+
+    def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            event_store.execute_script(_SCHEMA)
+            self._schema_ready = True
+
+    def _should_write(self, key: str, value: Any, deadband: float,
+                      heartbeat: float, now: datetime) -> bool:
+        last = self._last.get(key)
+        if last is None:
+            return True
+        last_value, last_time = last
+        if (now - last_time).total_seconds() >= heartbeat:
+            return True
+        if _is_number(value) and _is_number(last_value):
+            return abs(value - last_value) > deadband
+        return value != last_value
+
+    def observe(self, snapshot: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """Record any configured key that crossed its deadband. Returns points written."""
+        enabled, heartbeat, keys = _config()
+        if not enabled:
+            return 0
+        now = now or datetime.now()
+        rows = []
+        for key, deadband in keys.items():
+            value = snapshot.get(key)
+            if value is None:
+                continue
+            if self._should_write(key, value, float(deadband or 0), heartbeat, now):
+                rows.append((key, now.isoformat(), value))
+                self._last[key] = (value, now)
+        if rows:
+            self._ensure_schema()
+            event_store.execute_many(
+                "INSERT OR REPLACE INTO telemetry (key, timestamp, value) VALUES (?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def keys(self) -> List[str]:
+        self._ensure_schema()
+        rows = event_store.fetch_all("SELECT DISTINCT key FROM telemetry")
+        return sorted(r[0] for r in rows)
+
+    def query(self, key: str, since: Optional[str] = None,
+              until: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Columnar points for `key` in [since, until]. The last point before
+        `since` is included so step charts start at the right level.
+        """
+        self._ensure_schema()
+        clauses, params = ["key = ?"], [key]
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        rows = event_store.fetch_all(
+            f"SELECT timestamp, value FROM telemetry WHERE {' AND '.join(clauses)} "
+            "ORDER BY timestamp",
+            params,
+        )
+        if since:
+            before = event_store.fetch_all(
+                "SELECT timestamp, value FROM telemetry WHERE key = ? AND timestamp < ? "
+                "ORDER BY timestamp DESC LIMIT 1",
+                (key, since),
+            )
+            rows = before + rows
+        return {
+            "key": key,
+            "t": [r[0] for r in rows],
+            "value": [r[1] for r in rows],
+        }
+
+    def iter_points(self, key: str, since: Optional[str] = None,
+                    until: Optional[str] = None, after: Optional[str] = None):
+        """Stream (timestamp, value) oldest-first; `after` resumes an export."""
+        self._ensure_schema()
+        clauses, params = ["key = ?"], [key]
+        for clause, value in (("timestamp >= ?", since), ("timestamp <= ?", until),
+                              ("timestamp > ?", after)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        yield from event_store.iter_query(
+            f"SELECT timestamp, value FROM telemetry WHERE {' AND '.join(clauses)} "
+            "ORDER BY timestamp",
+            params,
+        )
+
+
+historian = Historian()
+
+
+def record_telemetry(snapshot: Dict[str, Any]) -> None:
+    try:
+        historian.observe(snapshot)
+    except Exception as e:
+        print(f"[Historian] observe failed: {e}", flush=True)
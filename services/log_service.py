@@ -1,11 +1,52 @@
 # File: services/log_service.py
+"""
+Event logging
+-------------
+• log_event() inserts into the SQLite event store (which backs /api/logs
+  queries) and appends to the JSONL journal shown on the Logs page.
+• The journal is segmented: sensor_log.jsonl is the live segment, rolled
+  daily (or at log_retention.segment_max_mb) into
+  sensor_log-YYYYMMDD-HHMMSS.jsonl and gzip-compressed in the background.
+• manifest.json records each closed segment's first/last timestamp, so
+  time-range reads open only the segments that overlap the range.
+• Retention (log_retention.days / max_mb) removes the oldest segments.
+• Writes are group-committed by LogWriter (settings["log_writer"]):
+  producers enqueue and return, batches are flushed per interval/size.
+"""
+import atexit
+import gzip
 import json
 import os
-from datetime import datetime
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import eventlet
+import eventlet.queue
+from eventlet import patcher, semaphore, tpool
+
+from services.event_store import insert_events
+from utils.settings_utils import add_settings_listener, load_settings
+
+_threading = patcher.original("threading")
 
 # Define the log directory and file
 LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'logs')
 SENSOR_LOG_FILE = os.path.join(LOG_DIR, 'sensor_log.jsonl')
+MANIFEST_FILE = os.path.join(LOG_DIR, 'manifest.json')
+SEGMENT_PREFIX = 'sensor_log-'
+MAINTENANCE_INTERVAL_SEC = 3600
+
+DEFAULT_RETENTION = {
+    "days": 365,          # delete closed segments older than this
+    "max_mb": 200,        # ...and keep the journal under this total size
+    "segment_max_mb": 8,  # roll the live segment early past this size
+}
+
+_journal_lock = semaphore.Semaphore()
+_compress_lock = semaphore.Semaphore()
+_manifest = None  # loaded lazily; {"live": {...}, "segments": [...]}
+
 
 def ensure_log_dir_exists():
     """
@@ -13,16 +54,523 @@ def ensure_log_dir_exists():
     """
     os.makedirs(LOG_DIR, exist_ok=True)
 
+
+_retention_cfg = None  # cached log_retention; refreshed on settings save / maintenance
+
+
+def _refresh_retention(settings=None):
+    global _retention_cfg
+    cfg = dict(DEFAULT_RETENTION)
+    cfg.update((settings if settings is not None else load_settings()).get("log_retention", {}) or {})
+    _retention_cfg = cfg
+
+
+def _retention():
+    if _retention_cfg is None:
+        _refresh_retention()
+    return _retention_cfg
+
+
+add_settings_listener(_refresh_retention)
+
+
+# ───────────────────────── manifest ─────────────────────────
+def _first_timestamp(path):
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    return json.loads(line).get('timestamp')
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _last_timestamp(path):
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 4096, 0))
+            lines = [l for l in f.read().splitlines() if l.strip()]
+        return json.loads(lines[-1]).get('timestamp') if lines else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _load_manifest():
+    global _manifest
+    if _manifest is not None:
+        return _manifest
+    try:
+        with open(MANIFEST_FILE) as f:
+            _manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        _manifest = {"segments": []}
+    _manifest.setdefault("segments", [])
+    live = _manifest.setdefault("live", {})
+    if not live.get("start"):
+        live["start"] = _first_timestamp(SENSOR_LOG_FILE) or datetime.now().isoformat()
+    # "end" moves with every write but is only persisted on roll/compress,
+    # so the saved value is stale after a restart: re-read it from the file
+    live["end"] = _last_timestamp(SENSOR_LOG_FILE)
+    return _manifest
+
+
+def _save_manifest():
+    ensure_log_dir_exists()
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def get_segments():
+    """Closed segments (oldest first) plus the live one, as manifest dicts."""
+    manifest = _load_manifest()
+    live = {
+        "file": os.path.basename(SENSOR_LOG_FILE),
+        "start": manifest["live"].get("start"),
+        "end": manifest["live"].get("end"),
+        "live": True,
+    }
+    return list(manifest["segments"]) + [live]
+
+
+# ───────────────────────── rolling / compression ─────────────────────────
+def _should_roll(now, cfg):
+    if not os.path.exists(SENSOR_LOG_FILE) or os.path.getsize(SENSOR_LOG_FILE) == 0:
+        return False
+    start = _load_manifest()["live"].get("start")
+    if start and datetime.fromisoformat(start).date() != now.date():
+        return True
+    max_bytes = float(cfg.get("segment_max_mb", 0) or 0) * 1024 * 1024
+    return bool(max_bytes) and os.path.getsize(SENSOR_LOG_FILE) >= max_bytes
+
+
+def _roll_segment(now):
+    """Close the live segment and schedule its compression. Caller holds the lock."""
+    manifest = _load_manifest()
+    live = manifest["live"]
+    start = live.get("start") or now.isoformat()
+    stamp = datetime.fromisoformat(start).strftime("%Y%m%d-%H%M%S")
+    name = f"{SEGMENT_PREFIX}{stamp}.jsonl"
+    if os.path.exists(os.path.join(LOG_DIR, name)):
+        name = f"{SEGMENT_PREFIX}{stamp}-{now:%H%M%S%f}.jsonl"
+    os.replace(SENSOR_LOG_FILE, os.path.join(LOG_DIR, name))
+    manifest["segments"].append({
+        "file": name,
+        "start": start,
+        "end": live.get("end") or start,
+        "compressed": False,
+    })
+    manifest["live"] = {"start": now.isoformat()}
+    _save_manifest()
+    eventlet.spawn(compress_pending_segments)
+
+
+def _gzip_file(src, dst):
+    with open(src, 'rb') as fin, gzip.open(dst + ".tmp", 'wb') as fout:
+        shutil.copyfileobj(fin, fout)
+    os.replace(dst + ".tmp", dst)
+    os.remove(src)
+
+
+def compress_pending_segments():
+    """gzip every closed-but-uncompressed segment (in a real thread), then apply retention."""
+    if not _compress_lock.acquire(blocking=False):
+        return  # a pass is running; the hourly maintenance retries anything missed
+    try:
+        _compress_pending()
+    finally:
+        _compress_lock.release()
+    apply_retention()
+
+
+def _compress_pending():
+    for seg in list(_load_manifest()["segments"]):
+        if seg.get("compressed"):
+            continue
+        src = os.path.join(LOG_DIR, seg["file"])
+        dst = src + ".gz"
+        try:
+            if os.path.exists(src):
+                tpool.execute(_gzip_file, src, dst)
+        except Exception as e:
+            print(f"[LogService] Failed to compress {seg['file']}: {e}", flush=True)
+            continue
+        with _journal_lock:
+            seg["file"] = os.path.basename(dst)
+            seg["compressed"] = True
+            seg["bytes"] = os.path.getsize(dst) if os.path.exists(dst) else 0
+            _save_manifest()
+
+
+def apply_retention():
+    """Drop the oldest closed segments beyond the configured age or total size."""
+    cfg = _retention()
+    cutoff = (datetime.now() - timedelta(days=float(cfg.get("days", 0) or 0))).isoformat()
+    max_bytes = float(cfg.get("max_mb", 0) or 0) * 1024 * 1024
+    with _journal_lock:
+        manifest = _load_manifest()
+        segments = manifest["segments"]
+        total = sum(s.get("bytes", 0) for s in segments)
+        keep = []
+        for seg in segments:
+            too_old = cfg.get("days") and (seg.get("end") or "") < cutoff
+            too_big = max_bytes and total > max_bytes
+            if seg.get("compressed") and (too_old or too_big):
+                try:
+                    os.remove(os.path.join(LOG_DIR, seg["file"]))
+                except FileNotFoundError:
+                    pass
+                total -= seg.get("bytes", 0)
+                print(f"[LogService] Retention removed {seg['file']}", flush=True)
+                continue
+            keep.append(seg)
+        if len(keep) != len(segments):
+            manifest["segments"] = keep
+            _save_manifest()
+
+
+def forget_segment(file_name):
+    """Drop a deleted file from the manifest (called by the delete endpoint)."""
+    with _journal_lock:
+        manifest = _load_manifest()
+        kept = [s for s in manifest["segments"] if s["file"] != file_name]
+        if len(kept) != len(manifest["segments"]):
+            manifest["segments"] = kept
+            _save_manifest()
+
+
+def reset_journal():
+    """Truncate the live segment and delete every closed one."""
+    with _journal_lock:
+        manifest = _load_manifest()
+        for seg in manifest["segments"]:
+            try:
+                os.remove(os.path.join(LOG_DIR, seg["file"]))
+            except FileNotFoundError:
+                pass
+        ensure_log_dir_exists()
+        open(SENSOR_LOG_FILE, "w").close()
+        manifest["segments"] = []
+        manifest["live"] = {"start": datetime.now().isoformat()}
+        _save_manifest()
+
+
+def log_maintenance():
+    """
+    One maintenance pass (run every MAINTENANCE_INTERVAL_SEC by
+    services.scheduler): closes a quiet day's segment, retries any pending
+    compression and enforces retention.
+    """
+    _refresh_retention()   # picks up settings.json edits made outside save_settings()
+    _refresh_writer_config()
+    now = datetime.now()
+    with _journal_lock:
+        if _should_roll(now, _retention()):
+            _roll_segment(now)
+    compress_pending_segments()   # also applies retention
+
+
+# ───────────────────────── reading across segments ─────────────────────────
+def open_segment(path):
+    """Open a journal segment for binary reading, decompressing .gz transparently."""
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _line_timestamp(line):
+    try:
+        return json.loads(line).get('timestamp') or ''
+    except (ValueError, AttributeError):
+        return ''
+
+
+def iter_journal_lines(since=None, until=None):
+    """
+    Yield raw JSONL lines (bytes) from every segment overlapping
+    [since, until] (ISO strings), oldest first. Segments wholly inside the
+    range are streamed without parsing; boundary segments are filtered.
+    """
+    for seg in get_segments():
+        start, end = seg.get("start") or "", seg.get("end") or ""
+        if until and start and start > until:
+            continue
+        if since and not seg.get("live") and end and end < since:
+            continue
+        path = os.path.join(LOG_DIR, seg["file"])
+        if not os.path.exists(path):
+            continue
+        inside = (not since or (start and start >= since)) and \
+                 (not until or (not seg.get("live") and end and end <= until))
+        with open_segment(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if not inside:
+                    ts = _line_timestamp(line)
+                    if (since and ts < since) or (until and ts > until):
+                        continue
+                yield line
+
+
+# ───────────────────────── writing ─────────────────────────
+DEFAULT_WRITER = {
+    "flush_interval_sec": 1.0,   # max time an event waits before being written
+    "batch_size": 200,           # flush early once this many events are queued
+    "queue_max": 5000,           # bounded queue; overflow is dropped and counted
+    "fsync": "interval",         # "always" | "interval" | "never"
+    "fsync_interval_sec": 30,
+}
+
+
+_writer_cfg = None  # cached log_writer; refreshed on settings save / maintenance
+
+
+def _refresh_writer_config(settings=None):
+    global _writer_cfg
+    cfg = dict(DEFAULT_WRITER)
+    cfg.update((settings if settings is not None else load_settings()).get("log_writer", {}) or {})
+    _writer_cfg = cfg
+
+
+def _writer_config():
+    """A copy of the cached log_writer settings (callers may tweak it)."""
+    if _writer_cfg is None:
+        _refresh_writer_config()
+    return dict(_writer_cfg)
+
+
+add_settings_listener(_refresh_writer_config)
+
+
+def _append_lines(lines, do_fsync):
+    with open(SENSOR_LOG_FILE, 'a') as f:
+        f.write(''.join(lines))
+        if do_fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class _Batch:
+    """
+    Events taken off the queue, with the write stages ("store", "journal")
+    already claimed by a writer and those completed. A stage is claimed
+    before it is handed to a real thread, so flush() never repeats a stage
+    the writer greenlet is still in the middle of.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.claimed = set()
+        self.done = {"store": _threading.Event(), "journal": _threading.Event()}
+        self.sealed = False      # taken by flush(); collect new events elsewhere
+
+    @property
+    def journaled(self):
+        return self.done["journal"].is_set()
+
+
+class LogWriter:
+    """
+    Group-commit writer behind log_event(). Producers only enqueue; one
+    greenlet drains the queue and writes each batch with a single store
+    transaction and a single journal append, both run in a real thread so
+    a slow SD card never stalls the hub.
+    The batch being collected or written is kept on the writer, so flush()
+    writes it too; a failed write is retried (stages already done are not
+    repeated) instead of dropped.
+    """
+
+    RETRY_MAX_SEC = 30
+    STAGE_WAIT_SEC = 10   # how long flush() waits for a stage the writer is running
+
+    def __init__(self):
+        cfg = dict(DEFAULT_WRITER)
+        self._queue = eventlet.queue.LightQueue(maxsize=int(cfg["queue_max"]))
+        self._greenlet = None
+        self._batch = None   # in-flight _Batch
+        self._last_fsync = 0.0
+        self.stats = {
+            "queued": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "retries": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "total_flush_ms": 0.0,
+            "last_error": None,
+        }
+
+    def start(self):
+        if self._greenlet is None:
+            cfg = _writer_config()
+            self._queue.resize(int(cfg["queue_max"]))
+            self._greenlet = eventlet.spawn(self._run)
+
+    def submit(self, event):
+        """Queue an event for writing. Never blocks; returns False if dropped."""
+        self.start()
+        try:
+            self._queue.put_nowait(event)
+        except eventlet.queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["in_flight"] = len(self._batch.events) if self._batch is not None else 0
+        total_ms = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = round(total_ms / stats["batches"], 3) if stats["batches"] else None
+        return stats
+
+    def _drain(self, batch, limit):
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except eventlet.queue.Empty:
+                break
+        return batch
+
+    def _collect(self, cfg):
+        self._batch = batch = _Batch([self._queue.get()])
+        limit = int(cfg["batch_size"])
+        deadline = time.monotonic() + float(cfg["flush_interval_sec"])
+        while len(batch.events) < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self._queue.get(timeout=remaining)
+            except eventlet.queue.Empty:
+                break
+            if batch.sealed:
+                self._batch = batch = _Batch([])
+            batch.events.append(event)
+        return batch
+
+    def _run(self):
+        failures = 0
+        while True:
+            cfg = _writer_config()
+            batch = self._batch or self._collect(cfg)
+            try:
+                self._write(batch, cfg, use_tpool=True)
+                failures = 0
+                if self._batch is batch:
+                    self._batch = None
+            except Exception as e:
+                failures += 1
+                self.stats["retries"] += 1
+                self.stats["last_error"] = f"{datetime.now().isoformat()} {e}"
+                delay = min(self.RETRY_MAX_SEC, 2 ** failures)
+                print(f"[LogService] batch write failed ({len(batch.events)} events), "
+                      f"retrying in {delay}s: {e}", flush=True)
+                eventlet.sleep(delay)
+
+    def _write(self, batch, cfg, use_tpool):
+        run = tpool.execute if use_tpool else (lambda fn, *a: fn(*a))
+        policy = cfg.get("fsync", "interval")
+        now_mono = time.monotonic()
+        do_fsync = policy == "always" or (
+            policy == "interval"
+            and now_mono - self._last_fsync >= float(cfg["fsync_interval_sec"])
+        )
+        started = time.monotonic()
+
+        events = batch.events
+        if self._claim(batch, "store"):
+            self._run_stage(batch, "store", run, insert_events, events)
+        if not self._claim(batch, "journal"):
+            return   # the other writer (greenlet or flush) journaled it
+        ensure_log_dir_exists()
+        with _journal_lock:
+            now = datetime.now()
+            if _should_roll(now, _retention()):
+                _roll_segment(now)
+            self._run_stage(batch, "journal", run, _append_lines,
+                            [json.dumps(e) + '\n' for e in events], do_fsync)
+            _load_manifest()["live"]["end"] = events[-1]['timestamp']
+        if do_fsync:
+            self._last_fsync = now_mono
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.stats["written"] += len(events)
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(events)
+        self.stats["last_flush_ms"] = round(elapsed_ms, 3)
+        self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"] or 0, elapsed_ms), 3)
+        self.stats["total_flush_ms"] += elapsed_ms
+
+    def _claim(self, batch, stage):
+        """True if the caller must run `stage`; False once someone else has run it."""
+        if stage not in batch.claimed:
+            batch.claimed.add(stage)
+            return True
+        if not batch.done[stage].wait(self.STAGE_WAIT_SEC):
+            raise RuntimeError(f"batch {stage} still in progress after {self.STAGE_WAIT_SEC}s")
+        return False
+
+    @staticmethod
+    def _run_stage(batch, stage, run, fn, *args):
+        def job():
+            fn(*args)
+            batch.done[stage].set()   # in the worker thread, as soon as it is written
+        try:
+            run(job)
+        except BaseException:
+            batch.claimed.discard(stage)   # not written: the retry claims it again
+            raise
+
+    def flush(self):
+        """
+        Synchronously write the in-flight batch and everything still queued
+        (used on shutdown). A batch the writer greenlet is half-way through
+        is finished from the stage it reached.
+        """
+        cfg = _writer_config()
+        cfg["fsync"] = "always"
+        batch, self._batch = self._batch, None
+        if batch is not None:
+            batch.sealed = True
+        if batch is not None and not batch.journaled:
+            self._write(batch, cfg, use_tpool=False)
+        events = self._drain([], float("inf"))
+        if events:
+            self._write(_Batch(events), cfg, use_tpool=False)
+
+
+log_writer = LogWriter()
+
+
+def flush_log_writer():
+    try:
+        log_writer.flush()
+    except Exception as e:
+        print(f"[LogService] final flush failed: {e}", flush=True)
+
+
+atexit.register(flush_log_writer)
+
+
 def log_event(data_dict):
     """
-    Logs an event as a JSON object on a new line in the JSONL file.
+    Logs an event into the SQLite event store (which backs the /api/logs
+    queries) and the live JSONL journal segment, via the background
+    LogWriter. Returns immediately; the event is written within
+    log_writer.flush_interval_sec.
     Always includes 'timestamp'; add sensor keys/values as needed.
     Example: log_event({'ph': 7.2, 'dose_type': 'up', 'dose_amount_ml': 5.0})
     """
-    ensure_log_dir_exists()
     data_dict['timestamp'] = datetime.now().isoformat()
-    with open(SENSOR_LOG_FILE, 'a') as f:
-        f.write(json.dumps(data_dict) + '\n')
+    log_writer.submit(data_dict)
 
 def log_dosing_event(ph, dose_type, dose_amount_ml):
     """
@@ -40,4 +588,4 @@ def log_dosing_event(ph, dose_type, dose_amount_ml):
 #     data = {'event_type': 'sensor', 'sensor_name': sensor_name, 'value': value}
 #     if additional_data:
 #         data.update(additional_data)
-#     log_event(data)
\ No newline at end of file
+#     log_event(data)
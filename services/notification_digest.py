@@ -0,0 +1,222 @@
+# File: services/notification_digest.py
+"""
+Notification coalescing / digest
+--------------------------------
+• Every alert passes through submit(text, severity) on its way to the
+  outbox. Severities: "critical" (a device/key went into error),
+  "warning" (repeated pH/salt conditions) and "info" (cleared, auto-dose).
+• The first alert after a quiet window_sec is sent at once, whatever its
+  severity. Alerts that follow it are held; each held alert pushes the
+  flush back to window_sec after itself (but never past MAX_HOLD_WINDOWS
+  windows after the first held one), then they go out as one digest
+  message per channel, critical first, then warning, then info. A digest
+  holding only one alert sends it unchanged.
+• A critical alert is still sent at once if no critical went out in the
+  last window_sec, even in the middle of a storm.
+• Digests are capped at max_chars ("... and N more"), within Discord's
+  2000-character limit.
+• Optional daily summary at daily_summary_time ("HH:MM"): counts per
+  severity and the most frequent alerts since the last summary (kept in
+  memory, so a restart starts a new day's count).
+
+Settings (all optional):
+    "notification_digest": {
+        "enabled": true,
+        "window_sec": 60,
+        "max_chars": 1900,
+        "daily_summary_time": null
+    }
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from services.scheduler import scheduler
+from utils.settings_utils import add_settings_listener, load_settings
+
+SEVERITIES = ("critical", "warning", "info")
+FLUSH_JOB = "notification_digest"
+SUMMARY_JOB = "notification_daily_summary"
+SUMMARY_TOP = 5
+MAX_HOLD_WINDOWS = 5
+_DEFAULTS = {
+    "enabled": True,
+    "window_sec": 60,
+    "max_chars": 1900,
+    "daily_summary_time": None,
+}
+
+
+def _log(msg: str) -> None:
+    from services.notification_service import log_notify_debug
+    log_notify_debug(f"[Digest] {msg}")
+
+
+def _first_line(text: str) -> str:
+    return text.split("\n", 1)[0]
+
+
+class NotificationDigest:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._window_until: Optional[datetime] = None
+        self._last_critical: Optional[datetime] = None
+        self._summary_since = datetime.now()
+        self._summary_counts: Counter = Counter()
+        self._summary_items: Counter = Counter()
+        self._stats = {"submitted": 0, "sent_immediately": 0, "digests": 0, "coalesced": 0}
+        self._started = False
+
+    @staticmethod
+    def _config(settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        settings = settings if settings is not None else load_settings()
+        return {**_DEFAULTS, **(settings.get("notification_digest") or {})}
+
+    # producers ------------------------------------------------------------------
+    def submit(self, text: str, severity: str = "warning") -> None:
+        if severity not in SEVERITIES:
+            severity = "warning"
+        settings = load_settings()
+        cfg = self._config(settings)
+        now = datetime.now()
+        window = timedelta(seconds=float(cfg["window_sec"]))
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._summary_counts[severity] += 1
+            self._summary_items[(severity, _first_line(text))] += 1
+            if self._window_until is not None and now >= self._window_until and not self._buffer:
+                self._window_until = None   # the last storm is over
+
+            arm_at = None
+            if not cfg["enabled"] or window.total_seconds() <= 0:
+                send_now = True
+            elif self._window_until is None:
+                send_now = True   # quiet until now: no reason to wait
+                # follow-ups of the same storm go into the digest
+                self._window_until = now + window
+            elif severity == "critical" and (
+                    self._last_critical is None or now - self._last_critical >= window):
+                send_now = True
+            else:
+                send_now = False
+                self._buffer.append({"text": text, "severity": severity, "at": now})
+                self._window_until = min(now + window,
+                                         self._buffer[0]["at"] + window * MAX_HOLD_WINDOWS)
+                arm_at = self._window_until
+            if severity == "critical":
+                self._last_critical = now
+            if send_now:
+                self._stats["sent_immediately"] += 1
+
+        if send_now:
+            self._send(text, settings)
+        if arm_at is not None:   # replaces the pending flush: the window moved
+            scheduler.add_once(FLUSH_JOB, self.flush,
+                               max(0.0, (arm_at - datetime.now()).total_seconds()))
+
+    # digest --------------------------------------------------------------------
+    def flush(self) -> None:
+        with self._lock:
+            items, self._buffer = self._buffer, []
+            self._window_until = None
+            if len(items) > 1:
+                self._stats["digests"] += 1
+                self._stats["coalesced"] += len(items)
+        if not items:
+            return
+        settings = load_settings()
+        if len(items) == 1:
+            self._send(items[0]["text"], settings)
+            return
+        cfg = self._config(settings)
+        since = items[0]["at"]
+        order = {sev: i for i, sev in enumerate(SEVERITIES)}
+        items.sort(key=lambda it: (order[it["severity"]], it["at"]))
+        counts = Counter(it["severity"] for it in items)
+        header = f"{len(items)} alerts since {since:%H:%M:%S} (" + ", ".join(
+            f"{counts[sev]} {sev}" for sev in SEVERITIES if counts[sev]) + ")"
+        lines = [f"{it['severity'].upper()} {it['at']:%H:%M:%S} "
+                 f"{it['text'].replace(chr(10), ' | ')}" for it in items]
+        budget = int(cfg["max_chars"]) - len(self._prefix(settings))
+        self._send(self._fit(header, lines, budget), settings)
+        _log(f"sent digest of {len(items)} alerts")
+
+    @staticmethod
+    def _fit(header: str, lines: List[str], max_chars: int) -> str:
+        out = [header]
+        size = len(header)
+        for i, line in enumerate(lines):
+            more = f"... and {len(lines) - i} more"
+            if size + len(line) + 1 + len(more) + 1 > max_chars:
+                out.append(more)
+                break
+            out.append(line)
+            size += len(line) + 1
+        return "\n".join(out)
+
+    @staticmethod
+    def _prefix(settings: Dict[str, Any]) -> str:
+        return f"[{settings.get('system_name', 'Garden')}] "
+
+    def _send(self, text: str, settings: Dict[str, Any]) -> None:
+        from services.notification_outbox import notification_outbox
+
+        notification_outbox.enqueue(self._prefix(settings) + text)
+
+    # daily summary --------------------------------------------------------------
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        add_settings_listener(self._arm_summary)
+        self._arm_summary(load_settings())
+
+    def _arm_summary(self, settings: Dict[str, Any]) -> None:
+        when = self._config(settings).get("daily_summary_time")
+        try:
+            hh, mm = str(when).split(":", 1)
+            now = datetime.now()
+            due = now.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
+        except (ValueError, TypeError):
+            scheduler.cancel(SUMMARY_JOB)
+            return
+        if due <= now:
+            due += timedelta(days=1)
+        scheduler.add_once(SUMMARY_JOB, self._daily_summary, (due - now).total_seconds())
+
+    def _daily_summary(self) -> None:
+        with self._lock:
+            counts, self._summary_counts = self._summary_counts, Counter()
+            items, self._summary_items = self._summary_items, Counter()
+            since, self._summary_since = self._summary_since, datetime.now()
+        settings = load_settings()
+        total = sum(counts.values())
+        text = f"Daily summary since {since:%Y-%m-%d %H:%M}: "
+        if not total:
+            text += "no alerts."
+        else:
+            text += f"{total} alerts (" + ", ".join(
+                f"{counts[sev]} {sev}" for sev in SEVERITIES if counts[sev]) + ")"
+            for (sev, line), n in items.most_common(SUMMARY_TOP):
+                text += f"\n{n}x {sev.upper()} {line}"
+        self._send(text, settings)
+        self._arm_summary(settings)
+
+    # introspection ----------------------------------------------------------------
+    def get_state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "window_until": self._window_until.isoformat() if self._window_until else None,
+                "last_critical": self._last_critical.isoformat() if self._last_critical else None,
+                "since_last_summary": dict(self._summary_counts),
+                **self._stats,
+            }
+
+
+# singleton used by services.notification_service
+notification_digest = NotificationDigest()
@@ -0,0 +1,300 @@
+# File: services/notification_outbox.py
+"""
+Notification outbox
+-------------------
+• enqueue() only appends the alert (one entry per enabled channel) and
+  returns, so callers on the pH reader / dosing paths never wait on
+  Telegram or Discord.
+• A dispatcher green-thread hands due entries to a small GreenPool that
+  does the HTTP POSTs over the pooled utils.http_client session. A failed
+  delivery is retried with exponential backoff (plus jitter); HTTP 429
+  honours Retry-After; other 4xx answers are permanent and dropped.
+• Pending entries are kept in data/notification_outbox.json, so they
+  survive restarts and outages. Producers and delivery attempts only mark
+  the list dirty; the dispatcher rewrites the file (atomically) on its
+  next pass, so enqueue() never serializes the whole backlog.
+• Channel credentials are read from settings at delivery time, so fixing
+  a bad token also fixes the messages already queued.
+
+Settings (all optional):
+    "notification_outbox": {
+        "workers": 2,
+        "max_attempts": 10,
+        "retry_base_sec": 5,
+        "retry_max_sec": 900,
+        "max_age_hours": 24
+    }
+"""
+
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import eventlet
+import requests
+from eventlet import patcher
+from eventlet.event import Event
+from eventlet.greenpool import GreenPool
+
+from utils.http_client import http_client
+from utils.settings_utils import load_settings
+
+_threading = patcher.original("threading")
+
+_STATE_FILE = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "notification_outbox.json")
+)
+CHANNELS = ("telegram", "discord")
+IDLE_WAIT_SEC = 5
+RECENT_MAX = 20
+_DEFAULTS = {
+    "workers": 2,
+    "max_attempts": 10,
+    "retry_base_sec": 5,
+    "retry_max_sec": 900,
+    "max_age_hours": 24,
+}
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, permanent: bool = False,
+                 retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.permanent = permanent
+        self.retry_after = retry_after
+
+
+def _log(msg: str) -> None:
+    from services.notification_service import log_notify_debug
+    log_notify_debug(f"[Outbox] {msg}")
+
+
+# ───────────────────────── channel delivery ─────────────────────────
+def _check_response(resp) -> None:
+    if resp.ok:
+        return
+    if resp.status_code == 429:
+        retry_after = None
+        try:
+            retry_after = float(resp.headers.get("Retry-After", ""))
+        except ValueError:
+            try:
+                body = resp.json()
+                retry_after = float(body.get("retry_after")
+                                    or body.get("parameters", {}).get("retry_after"))
+            except Exception:
+                pass
+        raise DeliveryError("HTTP 429 (rate limited)", retry_after=retry_after)
+    permanent = 400 <= resp.status_code < 500
+    raise DeliveryError(f"HTTP {resp.status_code}: {resp.text[:200]}", permanent=permanent)
+
+
+def _deliver(channel: str, text: str, cfg: Dict[str, Any]) -> None:
+    """POST one message; raises DeliveryError on failure."""
+    try:
+        if channel == "telegram":
+            bot_token = cfg.get("telegram_bot_token", "").strip()
+            chat_id = cfg.get("telegram_chat_id", "").strip()
+            if not (bot_token and chat_id):
+                raise DeliveryError("Telegram bot_token/chat_id missing", permanent=True)
+            url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+            resp = http_client.post(url, json={"chat_id": chat_id, "text": text})
+        elif channel == "discord":
+            webhook_url = cfg.get("discord_webhook_url", "").strip()
+            if not webhook_url:
+                raise DeliveryError("Discord webhook_url missing", permanent=True)
+            resp = http_client.post(webhook_url, json={"content": text})
+        else:
+            raise DeliveryError(f"unknown channel {channel}", permanent=True)
+    except requests.RequestException as ex:
+        raise DeliveryError(str(ex)) from ex
+    _log(f"{channel} POST => {resp.status_code}")
+    _check_response(resp)
+
+
+def enabled_channels(cfg: Dict[str, Any]) -> List[str]:
+    return [ch for ch in CHANNELS if cfg.get(f"{ch}_enabled")]
+
+
+# ───────────────────────── outbox ─────────────────────────
+class NotificationOutbox:
+    def __init__(self) -> None:
+        self._lock = _threading.Lock()
+        self._main_thread = _threading.main_thread()
+        self._pending: List[Dict[str, Any]] = []
+        self._in_flight = set()
+        self._recent: List[Dict[str, Any]] = []
+        self._stats = {"enqueued": 0, "delivered": 0, "retries": 0, "dropped": 0}
+        self._pool: Optional[GreenPool] = None
+        self._wakeup = Event()
+        self._dispatcher = None
+        self._loaded = False
+        self._dirty = False
+
+    # persistence ---------------------------------------------------------------
+    def _load(self) -> None:
+        try:
+            with open(_STATE_FILE) as f:
+                raw = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raw = []
+        self._pending = [e for e in raw if isinstance(e, dict) and e.get("channel") in CHANNELS]
+        if self._pending:
+            print(f"[Outbox] {len(self._pending)} pending notification(s) restored", flush=True)
+
+    def _save(self) -> None:
+        """Rewrite the state file if anything changed (dispatcher only)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._pending, indent=2)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(_STATE_FILE), exist_ok=True)
+            tmp = _STATE_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, _STATE_FILE)
+        except OSError as e:
+            with self._lock:
+                self._dirty = True   # try again on the next pass
+            print(f"[Outbox] saving pending notifications failed: {e}", flush=True)
+
+    # producers -----------------------------------------------------------------
+    def enqueue(self, text: str, channels: Optional[List[str]] = None) -> int:
+        """Queue `text` for every enabled channel; returns the number queued."""
+        self.start()
+        if channels is None:
+            channels = enabled_channels(load_settings())
+        now = time.time()
+        entries = [{
+            "id": uuid.uuid4().hex,
+            "channel": ch,
+            "text": text,
+            "created": now,
+            "attempts": 0,
+            "next_attempt": now,
+            "last_error": None,
+        } for ch in channels]
+        if not entries:
+            return 0
+        with self._lock:
+            self._pending.extend(entries)
+            self._stats["enqueued"] += len(entries)
+            self._dirty = True
+        self._wake()
+        return len(entries)
+
+    def _wake(self) -> None:
+        # From a real thread the dispatcher picks it up within IDLE_WAIT_SEC.
+        if _threading.current_thread() is self._main_thread and not self._wakeup.ready():
+            self._wakeup.send()
+
+    # dispatcher ------------------------------------------------------------------
+    def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+        self._pool = GreenPool(int(self._config()["workers"]))
+        self._dispatcher = eventlet.spawn(self._dispatch)
+
+    @staticmethod
+    def _config() -> Dict[str, Any]:
+        return {**_DEFAULTS, **(load_settings().get("notification_outbox") or {})}
+
+    def _dispatch(self) -> None:
+        while True:
+            self._save()
+            now = time.time()
+            with self._lock:
+                due = [e for e in self._pending
+                       if e["id"] not in self._in_flight and e["next_attempt"] <= now]
+                waiting = [e["next_attempt"] for e in self._pending
+                           if e["id"] not in self._in_flight and e["next_attempt"] > now]
+                for entry in due:
+                    self._in_flight.add(entry["id"])
+            for entry in due:
+                self._pool.spawn_n(self._attempt, entry)
+            wait = min([IDLE_WAIT_SEC] + [t - now for t in waiting])
+            with eventlet.Timeout(max(wait, 0.05), False):
+                self._wakeup.wait()
+            self._wakeup = Event()
+
+    def _attempt(self, entry: Dict[str, Any]) -> None:
+        settings = load_settings()
+        cfg = self._config()
+        error = None
+        try:
+            _deliver(entry["channel"], entry["text"], settings)
+        except DeliveryError as ex:
+            error = ex
+        except Exception as ex:
+            error = DeliveryError(str(ex))
+
+        retry_in = None
+        with self._lock:
+            self._in_flight.discard(entry["id"])
+            if error is None:
+                self._finish(entry, "delivered")
+            else:
+                entry["attempts"] += 1
+                entry["last_error"] = str(error)
+                age_h = (time.time() - entry["created"]) / 3600
+                if (error.permanent or entry["attempts"] >= int(cfg["max_attempts"])
+                        or age_h >= float(cfg["max_age_hours"])):
+                    self._finish(entry, "dropped")
+                    print(f"[Outbox] {entry['channel']} message dropped after "
+                          f"{entry['attempts']} attempt(s): {error}", flush=True)
+                else:
+                    delay = min(float(cfg["retry_base_sec"]) * 2 ** (entry["attempts"] - 1),
+                                float(cfg["retry_max_sec"]))
+                    delay = max(delay * random.uniform(0.8, 1.2), error.retry_after or 0)
+                    entry["next_attempt"] = time.time() + delay
+                    self._stats["retries"] += 1
+                    retry_in = delay
+            self._dirty = True
+        self._wake()   # save, and re-plan the dispatcher's wait around the new next_attempt
+        if retry_in is not None:
+            _log(f"{entry['channel']} failed ({error}); retry in {retry_in:.0f}s")
+
+    def _finish(self, entry: Dict[str, Any], outcome: str) -> None:
+        self._pending = [e for e in self._pending if e["id"] != entry["id"]]
+        self._stats[outcome] += 1
+        self._recent.append({
+            "channel": entry["channel"],
+            "outcome": outcome,
+            "attempts": entry["attempts"] + (outcome == "delivered"),
+            "last_error": entry["last_error"],
+            "at": datetime.now().isoformat(),
+            "text": entry["text"][:120],
+        })
+        del self._recent[:-RECENT_MAX]
+
+    # introspection ----------------------------------------------------------------
+    def get_status(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            pending = [{
+                "id": e["id"],
+                "channel": e["channel"],
+                "attempts": e["attempts"],
+                "last_error": e["last_error"],
+                "next_attempt_in_sec": round(max(0.0, e["next_attempt"] - now), 1),
+                "text": e["text"][:120],
+            } for e in self._pending]
+            return {
+                "pending": pending,
+                "recent": list(reversed(self._recent)),
+                **self._stats,
+            }
+
+
+# singleton used by services.notification_service
+notification_outbox = NotificationOutbox()
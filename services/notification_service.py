@@ -1,8 +1,6 @@
 from datetime import datetime, timedelta
 import threading
-import requests
 
-from utils.settings_utils import load_settings  # Adjust if needed
 
 _notifications_lock = threading.Lock()
 _notifications = {}  # Current "snapshot" of device/key states
@@ -139,7 +137,7 @@ def handle_notification_transition(device: str, key: str, old_state: str, new_st
             log_notify_debug(f"[DEBUG] Currently muted until {track['muted_until']} - skipping 'cleared' notification.")
         else:
             log_notify_debug("[DEBUG] Transition: ERROR -> OK - sending 'cleared' notification.")
-            _send_telegram_and_discord(f"Device={device}, Key={key}\nIssue cleared; now OK.")
+            _send_telegram_and_discord(f"Device={device}, Key={key}\nIssue cleared; now OK.", "info")
         # Notice: we do NOT clear timestamps or unmute.
         # They stay until 24h passes or the user manually clears.
 
@@ -170,7 +168,7 @@ def handle_notification_transition(device: str, key: str, old_state: str, new_st
                 log_notify_debug(f"[DEBUG] Setting muted_until to {track['muted_until']}")
 
             log_notify_debug("[DEBUG] Sending notification to Telegram/Discord.")
-            _send_telegram_and_discord(f"Device={device}, Key={key}\n{message}")
+            _send_telegram_and_discord(f"Device={device}, Key={key}\n{message}", "critical")
 
     # Update last_state
     track["last_state"] = new_state
@@ -179,43 +177,18 @@ def handle_notification_transition(device: str, key: str, old_state: str, new_st
 
 
 
-def _send_telegram_and_discord(alert_text: str):
+def _send_telegram_and_discord(alert_text: str, severity: str = "warning"):
     """
-    Helper function to actually send the notification to Telegram and/or Discord if enabled.
-    Prepends the system name to the alert.
+    Queue the alert for Telegram and/or Discord (whichever are enabled) and
+    return at once. services.notification_digest sends the first critical
+    alert straight away and merges alerts raised close together into one
+    digest; services.notification_outbox delivers with retries.
+    `severity` is "critical", "warning" or "info".
     """
-    cfg = load_settings()
-    system_name = cfg.get("system_name", "Garden")
-    final_alert = f"[{system_name}] {alert_text}"
-
-    log_notify_debug(f"[DEBUG] _send_telegram_and_discord called with text:\n{final_alert}")
-
-    # --- Telegram ---
-    if cfg.get("telegram_enabled"):
-        bot_token = cfg.get("telegram_bot_token", "").strip()
-        chat_id = cfg.get("telegram_chat_id", "").strip()
-        if bot_token and chat_id:
-            try:
-                url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-                payload = {"chat_id": chat_id, "text": final_alert}
-                resp = requests.post(url, json=payload, timeout=10)
-                log_notify_debug(f"[DEBUG] Telegram POST => {resp.status_code}")
-            except Exception as ex:
-                log_notify_debug(f"[ERROR] Telegram send failed: {ex}")
-        else:
-            log_notify_debug("[DEBUG] Telegram enabled but missing bot_token/chat_id, skipping...")
-
-    # --- Discord ---
-    if cfg.get("discord_enabled"):
-        webhook_url = cfg.get("discord_webhook_url", "").strip()
-        if webhook_url:
-            try:
-                resp = requests.post(webhook_url, json={"content": final_alert}, timeout=10)
-                log_notify_debug(f"[DEBUG] Discord POST => {resp.status_code}")
-            except Exception as ex:
-                log_notify_debug(f"[ERROR] Discord send failed: {ex}")
-        else:
-            log_notify_debug("[DEBUG] Discord enabled but missing webhook_url, skipping...")
+    from services.notification_digest import notification_digest
+
+    log_notify_debug(f"[DEBUG] _send_telegram_and_discord ({severity}) called with text:\n{alert_text}")
+    notification_digest.submit(alert_text, severity)
 
 
 # -----------------------------------------------------------------------------
@@ -288,7 +261,7 @@ def report_condition_error(device: str, condition_key: str, message: str):
             log_notify_debug(f"[DEBUG] {device}/{condition_key} => set muted_until={info['muted_until']}")
 
         # Actually send it
-        _send_telegram_and_discord(f"{device}/{condition_key}\n{final_message}")
+        _send_telegram_and_discord(f"{device}/{condition_key}\n{final_message}", "warning")
 
         # Save updated data
         _condition_counters[(device, condition_key)] = info
@@ -14,7 +14,7 @@ from eventlet import tpool
 from eventlet import semaphore, event
 from collections import deque
 
-from services.error_service import set_error, clear_error
+from services.device_health import device_health
 from services.notification_service import set_status, clear_status, report_condition_error
 from utils.settings_utils import load_settings, save_settings  # Ensure import is present
 
@@ -286,6 +286,9 @@ def parse_buffer(ser):
             old_ph_value = filtered_ph
             last_read_time = datetime.now()
 
+            from services.rollup_service import record_reading
+            record_reading("ph", filtered_ph, last_read_time)
+
             # Only consider pH for out-of-range alerts when the pool pump has
             # been running long enough for fresh water to reach the probe.
             # Stale water in the pipe (pump off) gives misleading readings.
@@ -376,7 +379,7 @@ def serial_reader():
 
             set_status("ph_probe", "communication", "ok",
                        f"Opened {ph_probe_path} for pH reading.")
-            clear_error("PH_USB_OFFLINE")
+            device_health.record_ok("ph_probe")
 
             with ph_lock:
                 buffer = ""
@@ -423,6 +426,7 @@ def serial_reader():
                                 f"[DEBUG] reset consecutive_fatal_exceptions from {consecutive_fatal_exceptions} to 0"
                             )
                         consecutive_fatal_exceptions = 0
+                        device_health.record_ok("ph_probe")
 
                         decoded_data = raw_data.decode("utf-8", errors="replace")
                         with ph_lock:
@@ -461,7 +465,7 @@ def serial_reader():
                 set_status("ph_probe", "communication", "error",
                            f"Cannot open {ph_probe_path} after {consecutive_fails} attempts.")
 
-            set_error("PH_USB_OFFLINE")
+            device_health.record_failure("ph_probe", e)
             eventlet.sleep(5)
 
         finally:
@@ -530,6 +534,7 @@ def restart_serial_reader():
         log_with_timestamp("[DEBUG] Buffer and latest pH value cleared for restart.")
 
     stop_serial_reader()
+    device_health.reset("ph_probe")
     eventlet.sleep(1)
     stop_event = event.Event()
     start_serial_reader()
@@ -586,6 +591,13 @@ def graceful_exit(signum, frame):
         stop_serial_reader()
     except Exception as e:
         log_with_timestamp(f"[DEBUG] Error during cleanup: {e}")
+    try:
+        from services.log_service import flush_log_writer
+        from services.rollup_service import rollups
+        flush_log_writer()
+        rollups.flush()
+    except Exception as e:
+        log_with_timestamp(f"[DEBUG] Error flushing logs: {e}")
     log_with_timestamp("[DEBUG] Cleanup complete. Exiting.")
     raise SystemExit()
 
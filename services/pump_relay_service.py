@@ -1,9 +1,44 @@
 # services/pump_relay_service.py
+"""
+Dosing relay driver
+-------------------
+• One serial port to the USB relay board, opened once and kept open by a
+  dedicated writer thread (a real OS thread, so a relay command is never
+  stuck behind a busy green-thread).
+• Every command goes through the writer's queue, so writes never
+  interleave; "off" commands are queued ahead of everything else, and an
+  "off" cancels a not-yet-written "on" for the same relay (its caller gets
+  RelayCommandCancelled), so a stop can never be followed by a stale "on".
+• The device path (usb_roles.relay) is cached and only re-read when
+  settings.json changes; a new path closes the old port and opens the new
+  one on the next command. A failed write reopens the port and retries once.
+• Per-command latency (queue wait + write) is measured; see get_driver_stats().
+• Every write/open outcome is reported to services.device_health, which
+  raises or clears RELAY_USB_OFFLINE.
+• relay_switched_at and the watchdog deadline of an "on" are set by the
+  writer thread right after the write succeeds, not when the calling
+  green-thread resumes, so a stalled hub cannot leave a relay on without
+  a deadline.
+• RelayWatchdog: a second real thread that holds a hard off-deadline for
+  every relay switched on with max_on_sec. At the deadline it writes "off"
+  itself, whatever the eventlet hub is doing. emergency_stop() forces every
+  relay off through the cached port with no settings or file I/O.
+"""
 
-import serial
-import json
+import itertools
 import os
-from services.error_service import set_error, clear_error
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import serial
+from eventlet import patcher, tpool
+
+from utils.settings_utils import SETTINGS_FILE, load_settings
+from services.device_health import device_health
+
+_threading = patcher.original("threading")
+_queue = patcher.original("queue")
 
 # USB Relay Commands
 RELAY_ON_COMMANDS = {
@@ -21,68 +56,371 @@ relay_status = {
     2: "off"
 }
 
-SETTINGS_FILE = os.path.join(os.getcwd(), "data", "settings.json")
+# time.monotonic() of the last confirmed on/off write per relay
+relay_switched_at = {}
+
+# command bytes -> (relay_id, "on" | "off")
+_SWITCHES = {
+    **{cmd: (relay_id, "on") for relay_id, cmd in RELAY_ON_COMMANDS.items()},
+    **{cmd: (relay_id, "off") for relay_id, cmd in RELAY_OFF_COMMANDS.items()},
+}
+
+BAUDRATE = 9600
+COMMAND_TIMEOUT_SEC = 3
+LATENCY_SAMPLES = 200
+# queue priorities: lower runs first
+_URGENT, _NORMAL = 0, 1
+
+
+class RelayCommandCancelled(Exception):
+    """An "on" was dropped because an "off" for the same relay overtook it."""
+
+
+class _Request:
+    def __init__(self, op: str, payload: Optional[bytes], path: Optional[str],
+                 max_on_sec: Optional[float] = None) -> None:
+        self.op = op
+        self.payload = payload
+        self.path = path
+        self.max_on_sec = max_on_sec
+        self.switch = _SWITCHES.get(payload) if payload is not None else None
+        self.queued_at = time.monotonic()
+        self.started = False
+        self.cancelled = False
+        self.done = _threading.Event()
+        self.error: Optional[BaseException] = None
+        self.latency_ms: Optional[float] = None
+
+
+class RelayDriver:
+    def __init__(self) -> None:
+        self._queue = _queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._start_lock = _threading.Lock()
+        # relay_id -> queued "on" requests the writer has not started yet
+        self._pending_lock = _threading.Lock()
+        self._pending_on: Dict[int, List[_Request]] = {}
+        self._thread = None
+        self._main_thread = _threading.main_thread()
+        # cached usb_roles.relay, keyed by settings.json mtime
+        self._path: Optional[str] = None
+        self._path_mtime: Optional[float] = None
+        # owned by the writer thread
+        self._ser = None
+        self._ser_path: Optional[str] = None
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._stats: Dict[str, Any] = {
+            "commands": 0,
+            "errors": 0,
+            "opens": 0,
+            "last_ms": None,
+            "max_ms": 0.0,
+            "last_error": None,
+        }
+
+    # device path ----------------------------------------------------------------
+    def device_path(self) -> str:
+        """usb_roles.relay, re-read only when settings.json has changed."""
+        try:
+            mtime = os.stat(SETTINGS_FILE).st_mtime
+        except OSError:
+            mtime = None
+        if mtime is None or mtime != self._path_mtime:
+            self._path = load_settings().get("usb_roles", {}).get("relay")
+            self._path_mtime = mtime
+        if not self._path:
+            raise RuntimeError("No dosing relay device configured in settings.")
+        return self._path
+
+    def invalidate(self) -> None:
+        """Forget the cached path (e.g. after usb_roles.relay was reassigned)."""
+        self._path_mtime = None
+
+    # writer thread ------------------------------------------------------------
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = _threading.Thread(target=self._writer, name="relay-writer", daemon=True)
+            self._thread.start()
+
+    def _open(self, path: str):
+        if self._ser is not None and self._ser_path == path:
+            return self._ser
+        self._close()
+        self._ser = serial.Serial(path, baudrate=BAUDRATE, timeout=1, write_timeout=1)
+        self._ser_path = path
+        self._stats["opens"] += 1
+        return self._ser
+
+    def _close(self) -> None:
+        ser, self._ser, self._ser_path = self._ser, None, None
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
+
+    def _execute(self, req: _Request) -> None:
+        path = req.path or self._ser_path
+        if req.op == "close":
+            self._close()
+            return
+        if not path:
+            raise RuntimeError("No dosing relay device configured in settings.")
+        for attempt in (1, 2):
+            try:
+                ser = self._open(path)
+                if req.op == "write":
+                    ser.write(req.payload)
+                    ser.flush()
+                return
+            except Exception:
+                self._close()
+                if attempt == 2:
+                    raise
+
+    def _writer(self) -> None:
+        while True:
+            _, _, req = self._queue.get()
+            with self._pending_lock:
+                if req.cancelled:
+                    continue   # already answered by the "off" that overtook it
+                req.started = True
+                if req.switch and req in self._pending_on.get(req.switch[0], ()):
+                    self._pending_on[req.switch[0]].remove(req)
+            try:
+                self._execute(req)
+                if req.op == "write" and req.switch:
+                    self._switched(req)
+            except BaseException as e:
+                req.error = e
+                self._stats["errors"] += 1
+                self._stats["last_error"] = str(e)
+            req.latency_ms = (time.monotonic() - req.queued_at) * 1000
+            if req.op == "write":
+                self._stats["commands"] += 1
+                self._stats["last_ms"] = round(req.latency_ms, 3)
+                self._stats["max_ms"] = round(max(self._stats["max_ms"], req.latency_ms), 3)
+                self._latencies.append(req.latency_ms)
+            req.done.set()
+
+    @staticmethod
+    def _switched(req: _Request) -> None:
+        # writer thread, right after the write went through
+        relay_id, state = req.switch
+        relay_switched_at[relay_id] = switched_at = time.monotonic()
+        if state == "on" and req.max_on_sec is not None:
+            relay_watchdog.arm(relay_id, switched_at + req.max_on_sec)
+
+    # public API (greenlets or real threads) ------------------------------------
+    def _submit(self, op: str, payload: Optional[bytes] = None, urgent: bool = False,
+                path: Optional[str] = None, timeout: float = COMMAND_TIMEOUT_SEC,
+                max_on_sec: Optional[float] = None) -> _Request:
+        self.start()
+        req = _Request(op, payload, path, max_on_sec)
+        with self._pending_lock:
+            if req.switch:
+                relay_id, state = req.switch
+                if state == "on":
+                    self._pending_on.setdefault(relay_id, []).append(req)
+                else:
+                    self._cancel_pending_on(relay_id)
+            self._queue.put((_URGENT if urgent else _NORMAL, next(self._seq), req))
+        if _threading.current_thread() is self._main_thread:
+            finished = tpool.execute(req.done.wait, timeout)   # don't block the hub
+        else:
+            finished = req.done.wait(timeout)
+        error = req.error if finished else TimeoutError(f"relay {op} timed out after {timeout}s")
+        if op != "close" and not req.cancelled:   # every write/open doubles as a health report
+            if error is None:
+                device_health.record_ok("relay")
+            else:
+                device_health.record_failure("relay", error)
+        if error is not None:
+            raise error
+        return req
+
+    def _cancel_pending_on(self, relay_id: int) -> None:
+        # caller holds _pending_lock
+        for req in self._pending_on.pop(relay_id, ()):
+            req.cancelled = True
+            req.error = RelayCommandCancelled(f"relay {relay_id} on superseded by off")
+            req.done.set()
+
+    def send(self, command: bytes, urgent: bool = False,
+             max_on_sec: Optional[float] = None) -> float:
+        """
+        Write one command; returns its latency in ms. Raises on failure.
+        For an "on", max_on_sec arms the watchdog as soon as it is written.
+        """
+        return self._submit("write", command, urgent, path=self.device_path(),
+                            max_on_sec=max_on_sec).latency_ms
+
+    def send_cached(self, command: bytes) -> float:
+        """Urgent write to the port/path already known; no settings or file I/O."""
+        return self._submit("write", command, urgent=True, path=self._path).latency_ms
+
+    def probe(self) -> bool:
+        """True if the port is (or can be) open; reuses the open port."""
+        try:
+            self._submit("open", path=self.device_path())
+            return True
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        self._submit("close")
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._latencies)
+        return {
+            **self._stats,
+            "device": self._ser_path or self._path,
+            "open": self._ser is not None,
+            "avg_ms": round(sum(samples) / len(samples), 3) if samples else None,
+            "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 3) if samples else None,
+        }
+
+
+relay_driver = RelayDriver()
+
+
+class RelayWatchdog:
+    """Forces relays off at their deadline from a real OS thread."""
+
+    RETRY_SEC = 0.1
+
+    def __init__(self, driver: RelayDriver) -> None:
+        self._driver = driver
+        self._cond = _threading.Condition(_threading.Lock())
+        self._deadlines: Dict[int, float] = {}
+        self._forced: Dict[int, float] = {}   # relay -> monotonic off time
+        self._thread = None
+        self.trips = 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = _threading.Thread(target=self._watch, name="relay-watchdog", daemon=True)
+            self._thread.start()
+
+    def arm(self, relay_id: int, deadline: float) -> None:
+        """Relay `relay_id` must be off by `deadline` (time.monotonic())."""
+        with self._cond:
+            self._ensure_thread()
+            self._deadlines[relay_id] = deadline
+            self._forced.pop(relay_id, None)
+            self._cond.notify()
+
+    def release(self, relay_id: int) -> Optional[float]:
+        """
+        Drop the deadline. Returns the monotonic time the watchdog (or a
+        trip) already switched the relay off, or None if the caller still
+        has to switch it off itself.
+        """
+        with self._cond:
+            self._deadlines.pop(relay_id, None)
+            return self._forced.pop(relay_id, None)
+
+    def trip(self, relay_ids=None) -> None:
+        """Force relays off now (default: every relay); no settings/file I/O."""
+        with self._cond:
+            ids = list(relay_ids if relay_ids is not None else RELAY_OFF_COMMANDS)
+            for relay_id in ids:
+                self._deadlines.pop(relay_id, None)
+        for relay_id in ids:
+            self._force_off(relay_id, "emergency stop")
+
+    def _force_off(self, relay_id: int, why: str) -> bool:
+        try:
+            self._driver.send_cached(RELAY_OFF_COMMANDS[relay_id])
+        except Exception as e:
+            print(f"[RelayWatchdog] {why}: relay {relay_id} off FAILED: {e}", flush=True)
+            return False
+        off_at = relay_switched_at.get(relay_id, time.monotonic())   # set by the writer
+        relay_status[relay_id] = "off"
+        with self._cond:
+            self._forced[relay_id] = off_at
+        self.trips += 1
+        print(f"[RelayWatchdog] {why}: relay {relay_id} forced OFF", flush=True)
+        return True
+
+    def _watch(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [r for r, d in self._deadlines.items() if d <= now]
+                if not due:
+                    wait = min(self._deadlines.values(), default=now + 60) - now
+                    self._cond.wait(max(wait, 0.0))
+                    continue
+            for relay_id in due:
+                if self._force_off(relay_id, "deadline reached"):
+                    with self._cond:
+                        self._deadlines.pop(relay_id, None)
+                else:
+                    with self._cond:   # keep trying until the write goes through
+                        if relay_id in self._deadlines:
+                            self._deadlines[relay_id] = time.monotonic() + self.RETRY_SEC
+
+
+relay_watchdog = RelayWatchdog(relay_driver)
+
 
 def get_relay_device_path():
-    with open(SETTINGS_FILE, "r") as f:
-        settings = json.load(f)
+    return relay_driver.device_path()
 
-    relay_device = settings.get("usb_roles", {}).get("relay")  # 'relay' is the dosing relay role
-    if not relay_device:
-        raise RuntimeError("No dosing relay device configured in settings.")
-    return relay_device
+def get_driver_stats():
+    return relay_driver.get_stats()
 
 def reinitialize_relay_service():
     try:
-        device_path = get_relay_device_path()
-        with serial.Serial(device_path, baudrate=9600, timeout=1) as ser:
-            # Turn off both relays for a quick test
-            ser.write(RELAY_OFF_COMMANDS[1])
-            ser.write(RELAY_OFF_COMMANDS[2])
+        relay_driver.invalidate()
+        device_health.reset("relay")   # the off commands below report the new device
+        relay_driver.close()
+        # Turn off both relays for a quick test
+        relay_driver.send(RELAY_OFF_COMMANDS[1], urgent=True)
+        relay_driver.send(RELAY_OFF_COMMANDS[2], urgent=True)
         print("Dosing Relay service reinitialized successfully.")
-        clear_error("PUMP_RELAY_OFFLINE")
     except Exception as e:
         print(f"Error reinitializing dosing relay service: {e}")
-        set_error("PUMP_RELAY_OFFLINE")
 
-def turn_on_relay(relay_id):
-    try:
-        device_path = get_relay_device_path()
-        with serial.Serial(device_path, baudrate=9600, timeout=1) as ser:
-            ser.write(RELAY_ON_COMMANDS[relay_id])
+def _set_relay(relay_id, state, command, urgent=False, max_on_sec=None):
+    # the writer thread records relay_switched_at and arms the watchdog
+    relay_driver.send(command, urgent=urgent, max_on_sec=max_on_sec)
 
-        old_state = relay_status[relay_id]
-        relay_status[relay_id] = "on"
-        print(f"Dosing Relay {relay_id} turned ON.")
+    old_state = relay_status[relay_id]
+    relay_status[relay_id] = state
+    print(f"Dosing Relay {relay_id} turned {state.upper()}.")
 
-        if old_state != "on":
-            from status_namespace import emit_status_update
-            emit_status_update()
+    if old_state != state:
+        from status_namespace import emit_status_update
+        emit_status_update()
 
-        clear_error("PUMP_RELAY_OFFLINE")
+def turn_on_relay(relay_id, max_on_sec=None):
+    """
+    With max_on_sec the watchdog switches the relay off after that long.
+    Raises RelayCommandCancelled if an "off" for the relay overtook it.
+    """
+    try:
+        _set_relay(relay_id, "on", RELAY_ON_COMMANDS[relay_id], max_on_sec=max_on_sec)
+    except RelayCommandCancelled:
+        print(f"Dosing relay {relay_id} ON cancelled: an OFF overtook it.")
+        raise
     except Exception as e:
         print(f"Error turning on dosing relay {relay_id}: {e}")
-        set_error("PUMP_RELAY_OFFLINE")
 
 
 def turn_off_relay(relay_id):
     try:
-        device_path = get_relay_device_path()
-        with serial.Serial(device_path, baudrate=9600, timeout=1) as ser:
-            ser.write(RELAY_OFF_COMMANDS[relay_id])
-
-        old_state = relay_status[relay_id]
-        relay_status[relay_id] = "off"
-        print(f"Dosing Relay {relay_id} turned OFF.")
-
-        if old_state != "off":
-            from status_namespace import emit_status_update
-            emit_status_update()
-
-        clear_error("PUMP_RELAY_OFFLINE")
+        # "off" jumps the write queue
+        _set_relay(relay_id, "off", RELAY_OFF_COMMANDS[relay_id], urgent=True)
     except Exception as e:
         print(f"Error turning off dosing relay {relay_id}: {e}")
-        set_error("PUMP_RELAY_OFFLINE")
+
+def emergency_stop():
+    """Fast path: every relay off via the already-open port, no settings/file I/O."""
+    relay_watchdog.trip()
 
 def get_relay_status(relay_id):
     return relay_status.get(relay_id, "unknown")
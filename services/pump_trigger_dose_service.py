@@ -7,19 +7,32 @@ Pump-triggered auto-dosing service
   configurable delay.
 • Cancels the schedule if the pump turns OFF first.
 • Ensures only one dose per calendar day.
+• Event-driven: reacts to every published ScreenLogic change of the pump,
+  spa or pool state (in order, so short flips are not missed) and to
+  settings saves; the delayed dose is one "pump_trigger_dose" job on
+  services.scheduler set for the exact due time and cancelled by the first
+  disqualifying event.
+• Changing delay_after_on moves a pending dose to pump-on time + the new
+  delay; changing pump_circuit starts over with the new pump's state.
+• Settings are also re-read every SETTINGS_RESYNC_SEC, so edits that
+  bypass save_settings() (hand-edited settings.json) are picked up too.
 """
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 
-import eventlet
+from eventlet.queue import LightQueue
 
-from utils.settings_utils import load_settings
+from utils.settings_utils import add_settings_listener, load_settings
 from services.dosage_service import perform_auto_dose
 from services.auto_dose_state import auto_dose_state, save as save_auto_dose_state
 from services.notification_service import _send_telegram_and_discord
+from services.scheduler import scheduler
 from services.ph_service import get_latest_ph_reading
-from services.screenlogic_service import get_latest_screenlogic_data
+from services.screenlogic_service import (
+    POOL_CIRCUIT_ID, SPA_CIRCUIT_ID, add_snapshot_listener, get_circuit_state,
+    get_pump_state, get_screenlogic_snapshot,
+)
 from status_namespace import is_debug_enabled
 
 
@@ -28,103 +41,194 @@ def _log(msg: str) -> None:
         print(f"[PumpTriggerDose] {datetime.now():%Y-%m-%d %H:%M:%S}  {msg}", flush=True)
 
 
-def pump_trigger_dose_loop() -> None:
-    """Background green-thread started via eventlet.spawn()."""
-    last_pump_state: Optional[int] = None        # 0 / 1 / None
-    scheduled_time: Optional[datetime] = None    # when to dose
-
-    _log("Pump-trigger auto-dosing loop started")
-
-    while True:
-        try:
-            settings = load_settings()
-            if not settings.get("auto_dosing_enabled", False):
-                scheduled_time = None
-                last_pump_state = None
-                eventlet.sleep(5)
-                continue
-
-            pump_id     = int(settings.get("pump_circuit", 0))
-            delay_min   = float(settings.get("delay_after_on", 15))
-
-            data       = get_latest_screenlogic_data()
-            pump_key   = f"pump.{pump_id}.state.value"
-            pump_state = data.get(pump_key)        # 0 / 1 / None
-            # EasyTouch circuit IDs (match home page constants)
-            spa_state  = data.get("circuit.500.value")
-            pool_state = data.get("circuit.505.value")
-
-            now = datetime.now()
-
-            # Derive last-dosed-date from the persisted auto_dose_state so a
-            # service restart can't undo the one-dose-per-day gate.
-            last_dose_time = auto_dose_state.get("last_dose_time")
-            last_dosed_date = (
-                last_dose_time.date() if isinstance(last_dose_time, datetime) else None
+# When the pending dose fires (None = nothing scheduled). Read by the
+# adaptive ScreenLogic poller to poll fast just before it is due.
+_scheduled_time: Optional[datetime] = None
+TIMER_JOB = "pump_trigger_dose"
+RESYNC_JOB = "pump_trigger_settings"
+SETTINGS_RESYNC_SEC = 30
+
+
+def get_scheduled_dose_time() -> Optional[datetime]:
+    """Time the pending pump-triggered dose is due, or None."""
+    return _scheduled_time
+
+
+class PumpTriggerScheduler:
+    """
+    All state changes happen in one green-thread that drains an event
+    queue: ("snapshot", snap), ("settings", settings) or ("timer", None).
+    """
+
+    def __init__(self) -> None:
+        self._events: LightQueue = LightQueue()
+        self._settings: Dict[str, Any] = {}
+        self._last_pump_state: Optional[int] = None     # 0 / 1 / None
+        self._pump_on_at: Optional[datetime] = None     # OFF → ON seen at
+        self._started = False
+
+    # event sources (any greenlet) ---------------------------------------------
+    def _watched_keys(self):
+        pump_id = int(self._settings.get("pump_circuit", 0))
+        return (f"pump.{pump_id}.state.value",
+                f"circuit.{SPA_CIRCUIT_ID}.value",
+                f"circuit.{POOL_CIRCUIT_ID}.value")
+
+    def on_snapshot(self, snapshot, diff) -> None:
+        keys = self._watched_keys()
+        if any(k in diff[part] for part in ("added", "changed", "removed") for k in keys):
+            self._events.put(("snapshot", snapshot))
+
+    def on_settings(self, settings) -> None:
+        self._events.put(("settings", settings))
+
+    def _resync_settings(self) -> None:
+        settings = load_settings()
+        if settings != self._settings:
+            self.on_settings(settings)
+
+    # timer ---------------------------------------------------------------------
+    def _arm(self, when: datetime) -> None:
+        global _scheduled_time
+        self._cancel()
+        _scheduled_time = when
+        delay = max(0.0, (when - datetime.now()).total_seconds())
+        scheduler.add_once(TIMER_JOB, lambda: self._events.put(("timer", None)), delay)
+
+    def _cancel(self) -> None:
+        global _scheduled_time
+        _scheduled_time = None
+        scheduler.cancel(TIMER_JOB)
+
+    # consumer -------------------------------------------------------------------
+    def run(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        self._settings = load_settings()
+        add_settings_listener(self.on_settings)
+        add_snapshot_listener(self.on_snapshot)
+        scheduler.add_periodic(RESYNC_JOB, self._resync_settings, SETTINGS_RESYNC_SEC,
+                               jitter_sec=1, timeout_sec=10)
+        _log("Pump-trigger auto-dosing scheduler started")
+        self._handle(get_screenlogic_snapshot())   # cold start: pump may already be on
+        while True:
+            kind, value = self._events.get()
+            try:
+                if kind == "settings":
+                    self._apply_settings(value)
+                    self._handle(get_screenlogic_snapshot())
+                elif kind == "snapshot":
+                    self._handle(value)
+                else:
+                    self._handle(get_screenlogic_snapshot(), timer=True)
+            except Exception as exc:
+                _log(f"ERROR - {exc}")
+
+    def _apply_settings(self, settings: Dict[str, Any]) -> None:
+        old, self._settings = self._settings, settings
+        if int(settings.get("pump_circuit", 0)) != int(old.get("pump_circuit", 0)):
+            # the old pump's state says nothing about the new one
+            _log("pump_circuit changed - re-deriving dose schedule")
+            self._cancel()
+            self._last_pump_state = None
+            self._pump_on_at = None
+        elif (float(settings.get("delay_after_on", 15)) != float(old.get("delay_after_on", 15))
+                and _scheduled_time and self._pump_on_at):
+            self._arm(self._pump_on_at + timedelta(minutes=float(settings.get("delay_after_on", 15))))
+            _log(f"delay_after_on changed - dose moved to {_scheduled_time:%H:%M:%S}")
+
+    def _handle(self, snap, timer: bool = False) -> None:
+        settings = self._settings
+        if not settings.get("auto_dosing_enabled", False):
+            self._cancel()
+            self._last_pump_state = None
+            self._pump_on_at = None
+            return
+
+        pump_id   = int(settings.get("pump_circuit", 0))
+        delay_min = float(settings.get("delay_after_on", 15))
+
+        pump_state = get_pump_state(pump_id, snap)   # 0 / 1 / None
+        spa_state  = get_circuit_state(SPA_CIRCUIT_ID, snap)
+        pool_state = get_circuit_state(POOL_CIRCUIT_ID, snap)
+        now = datetime.now()
+
+        # if ScreenLogic hasn't reported a valid value yet
+        if pump_state not in (0, 1):
+            return
+
+        # OFF → ON transition OR cold-start with pump already running.
+        # The date check below still prevents double-dosing after restart.
+        # Don't schedule if spa is on - acid would go to the spa, not the pool.
+        if pump_state == 1 and self._last_pump_state in (0, None):
+            self._pump_on_at = now
+            if spa_state == 1:
+                _log("Pump ON but spa is also on - skipping dose schedule")
+            else:
+                self._arm(now + timedelta(minutes=delay_min))
+                _log(f"Pump ON (prev={self._last_pump_state}) - dose scheduled for {_scheduled_time:%H:%M:%S}")
+        self._last_pump_state = pump_state
+
+        # Pump turned OFF before delay expired - cancel
+        if pump_state == 0 and _scheduled_time:
+            _log("Pump OFF before scheduled dose - cancelling")
+            self._cancel()
+
+        # Spa turned on during the delay - cancel (water now routed to spa)
+        if spa_state == 1 and _scheduled_time:
+            _log("Spa ON before scheduled dose - cancelling (acid would go to spa)")
+            self._cancel()
+
+        # Derive last-dosed-date from the persisted auto_dose_state so a
+        # service restart can't undo the one-dose-per-day gate.
+        last_dose_time = auto_dose_state.get("last_dose_time")
+        last_dosed_date = (
+            last_dose_time.date() if isinstance(last_dose_time, datetime) else None
+        )
+
+        # Time to dose? Require pool ON and spa OFF. A dose that came due
+        # while the pool circuit was off fires on the next qualifying change.
+        if not (_scheduled_time and now >= _scheduled_time):
+            return
+        if pump_state != 1 or spa_state != 0 or pool_state != 1:
+            if timer:
+                _log("Dose due but pool not ready - waiting for pool ON / spa OFF")
+            return
+        if last_dosed_date == now.date():
+            _log("Already dosed today - dropping scheduled dose")
+            self._cancel()
+            return
+
+        self._cancel()   # one-shot
+        dose_type, dose_ml = perform_auto_dose(settings)
+        if dose_ml > 0:
+            auto_dose_state.update(
+                {
+                    "last_dose_time": now,
+                    "last_dose_type": dose_type,
+                    "last_dose_amount": dose_ml,
+                }
             )
+            save_auto_dose_state()
+            _log(f"Dosed {dose_ml:.2f} ml ({dose_type})")
+            try:
+                ph_now = get_latest_ph_reading()
+                ph_text = f"{ph_now:.2f}" if ph_now is not None else "n/a"
+                _send_telegram_and_discord(
+                    f"Auto-dose: {dose_ml:.0f} ml pH {dose_type} "
+                    f"(current pH {ph_text}) at {now:%Y-%m-%d %H:%M}",
+                    "info",
+                )
+            except Exception as nex:
+                _log(f"dose-notify failed: {nex}")
+        else:
+            _log("No dose required")
 
-            # if ScreenLogic hasn't reported a valid value yet
-            if pump_state not in (0, 1):
-                eventlet.sleep(5)
-                continue
-
-            # OFF → ON transition OR cold-start with pump already running.
-            # The date check below still prevents double-dosing after restart.
-            # Don't schedule if spa is on - acid would go to the spa, not the pool.
-            if pump_state == 1 and last_pump_state in (0, None):
-                if spa_state == 1:
-                    _log(f"Pump ON but spa is also on - skipping dose schedule")
-                else:
-                    scheduled_time = now + timedelta(minutes=delay_min)
-                    _log(f"Pump ON (prev={last_pump_state}) - dose scheduled for {scheduled_time:%H:%M:%S}")
-
-            # Pump turned OFF before delay expired - cancel
-            if pump_state == 0 and scheduled_time:
-                _log("Pump OFF before scheduled dose - cancelling")
-                scheduled_time = None
-
-            # Spa turned on during the delay - cancel (water now routed to spa)
-            if spa_state == 1 and scheduled_time:
-                _log("Spa ON before scheduled dose - cancelling (acid would go to spa)")
-                scheduled_time = None
-
-            # Time to dose? Require pool ON and spa OFF.
-            if (
-                scheduled_time
-                and now >= scheduled_time
-                and pump_state == 1
-                and spa_state == 0
-                and pool_state == 1
-                and last_dosed_date != now.date()
-            ):
-                dose_type, dose_ml = perform_auto_dose(settings)
-                if dose_ml > 0:
-                    auto_dose_state.update(
-                        {
-                            "last_dose_time": now,
-                            "last_dose_type": dose_type,
-                            "last_dose_amount": dose_ml,
-                        }
-                    )
-                    save_auto_dose_state()
-                    _log(f"Dosed {dose_ml:.2f} ml ({dose_type})")
-                    try:
-                        ph_now = get_latest_ph_reading()
-                        ph_text = f"{ph_now:.2f}" if ph_now is not None else "n/a"
-                        _send_telegram_and_discord(
-                            f"Auto-dose: {dose_ml:.0f} ml pH {dose_type} "
-                            f"(current pH {ph_text}) at {now:%Y-%m-%d %H:%M}"
-                        )
-                    except Exception as nex:
-                        _log(f"dose-notify failed: {nex}")
-                else:
-                    _log("No dose required")
 
-                scheduled_time = None   # one-shot complete
+pump_trigger_scheduler = PumpTriggerScheduler()
 
-            last_pump_state = pump_state
-            eventlet.sleep(5)
 
-        except Exception as exc:
-            _log(f"ERROR - {exc}")
-            eventlet.sleep(5)
\ No newline at end of file
+def pump_trigger_dose_loop() -> None:
+    """Background green-thread started via eventlet.spawn()."""
+    pump_trigger_scheduler.run()
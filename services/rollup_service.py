@@ -0,0 +1,270 @@
+# File: services/rollup_service.py
+"""
+Multi-resolution rollups
+------------------------
+• Keeps 1-minute, 1-hour and 1-day aggregates (min/max/sum/count/last) per
+  series, updated incrementally as each reading arrives.
+• Open buckets live in memory and are upserted into the rollups table of
+  the event store every FLUSH_INTERVAL_SEC (services.scheduler); closed
+  buckets are final.
+• query() picks the coarsest resolution that still yields the requested
+  number of points, so long-range charts read a few thousand rows.
+• Bucket starts are "local epoch" seconds (naive local time), matching the
+  naive local ISO timestamps used by the event log.
+• Retention: the flush job prunes buckets older than
+  settings["history"]["retention_days"][<resolution>] at most every
+  PRUNE_INTERVAL_SEC. 1-minute buckets are kept 14 days by default; hour
+  and day buckets are kept forever unless a limit is set.
+"""
+
+import calendar
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import event_store
+from utils.settings_utils import load_settings
+
+# name -> bucket width (seconds), finest first
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+FLUSH_INTERVAL_SEC = 30
+PRUNE_INTERVAL_SEC = 3600
+DEFAULT_RETENTION_DAYS = {"1m": 14}   # resolution -> days; missing/None = keep
+
+# Flattened ScreenLogic keys rolled up when settings["history"] doesn't say.
+DEFAULT_SCREENLOGIC_KEYS = [
+    "body.0.last_temperature.value",
+    "body.1.last_temperature.value",
+    "controller.sensor.air_temperature.value",
+    "controller.sensor.salt_ppm.value",
+    "pump.0.rpm_now.value",
+    "pump.0.watts_now.value",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    series      TEXT    NOT NULL,
+    resolution  INTEGER NOT NULL,
+    bucket      INTEGER NOT NULL,
+    min         REAL,
+    max         REAL,
+    sum         REAL,
+    count       INTEGER,
+    last        REAL,
+    PRIMARY KEY (series, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_local_epoch(when: datetime) -> int:
+    return calendar.timegm(when.timetuple())
+
+
+def from_local_epoch(seconds: int) -> datetime:
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+class _Bucket:
+    __slots__ = ("start", "min", "max", "sum", "count", "last")
+
+    def __init__(self, start: int, row: Optional[tuple] = None) -> None:
+        self.start = start
+        if row:
+            self.min, self.max, self.sum, self.count, self.last = row
+        else:
+            self.min = self.max = self.last = None
+            self.sum = 0.0
+            self.count = 0
+
+    def add(self, value: float) -> None:
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+
+class RollupEngine:
+    def __init__(self) -> None:
+        self._schema_ready = False
+        # (series, resolution_sec) -> open bucket
+        self._open: Dict[Tuple[str, int], _Bucket] = {}
+        # buckets changed since the last flush
+        self._dirty: Dict[Tuple[str, int, int], _Bucket] = {}
+        self._last_prune = 0.0
+
+    def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            event_store.execute_script(_SCHEMA)
+            self._schema_ready = True
+
+    def _load(self, series: str, res: int, start: int) -> _Bucket:
+        # Merge with anything persisted before a restart so an hour/day
+        # bucket isn't overwritten with only the post-restart samples.
+        rows = event_store.fetch_all(
+            "SELECT min, max, sum, count, last FROM rollups "
+            "WHERE series = ? AND resolution = ? AND bucket = ?",
+            (series, res, start),
+        )
+        return _Bucket(start, rows[0] if rows else None)
+
+    def record(self, series: str, value: Any, when: Optional[datetime] = None) -> None:
+        """Fold one reading into every resolution for `series`."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        self._ensure_schema()
+        ts = to_local_epoch(when or datetime.now())
+        for res in RESOLUTIONS.values():
+            start = ts - ts % res
+            key = (series, res)
+            bucket = self._open.get(key)
+            if bucket is None or bucket.start != start:
+                bucket = self._load(series, res, start)
+                self._open[key] = bucket
+            bucket.add(float(value))
+            self._dirty[(series, res, start)] = bucket
+
+    def flush(self) -> int:
+        """Persist every bucket touched since the last flush (and prune, hourly)."""
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL_SEC:
+            self._last_prune = time.monotonic()
+            self.prune()
+        if not self._dirty:
+            return 0
+        self._ensure_schema()
+        dirty, self._dirty = self._dirty, {}
+        event_store.execute_many(
+            "INSERT OR REPLACE INTO rollups "
+            "(series, resolution, bucket, min, max, sum, count, last) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (s, res, b.start, b.min, b.max, b.sum, b.count, b.last)
+                for (s, res, _), b in dirty.items()
+            ],
+        )
+        return len(dirty)
+
+    def prune(self, now: Optional[datetime] = None) -> None:
+        """Delete buckets past their resolution's retention_days."""
+        retention = {**DEFAULT_RETENTION_DAYS,
+                     **(load_settings().get("history", {}).get("retention_days") or {})}
+        now_epoch = to_local_epoch(now or datetime.now())
+        series = self.series()
+        for name, days in retention.items():
+            if name not in RESOLUTIONS or not days:
+                continue
+            cutoff = now_epoch - int(float(days) * 86400)
+            # one DELETE per series so each uses the primary-key prefix
+            event_store.execute_many(
+                "DELETE FROM rollups WHERE series = ? AND resolution = ? AND bucket < ?",
+                [(s, RESOLUTIONS[name], cutoff) for s in series],
+            )
+
+    def series(self) -> List[str]:
+        self._ensure_schema()
+        rows = event_store.fetch_all(
+            "SELECT DISTINCT series FROM rollups WHERE resolution = ?",
+            (RESOLUTIONS["1d"],),
+        )
+        return sorted(r[0] for r in rows)
+
+    @staticmethod
+    def pick_resolution(since: datetime, until: datetime, points: int) -> str:
+        """Coarsest resolution giving at least `points` buckets over the range."""
+        span = max((until - since).total_seconds(), 0)
+        for name, res in sorted(RESOLUTIONS.items(), key=lambda kv: -kv[1]):
+            if span / res >= points:
+                return name
+        return next(iter(RESOLUTIONS))
+
+    def query(
+        self,
+        series: str,
+        since: datetime,
+        until: datetime,
+        points: int = 500,
+        resolution: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return columnar aggregates for `series` between since and until.
+        Open buckets are flushed first so the newest data is included.
+        """
+        self.flush()
+        name = resolution or self.pick_resolution(since, until, points)
+        res = RESOLUTIONS[name]
+        lo = to_local_epoch(since)
+        hi = to_local_epoch(until)
+        rows = event_store.fetch_all(
+            "SELECT bucket, min, max, sum, count, last FROM rollups "
+            "WHERE series = ? AND resolution = ? AND bucket >= ? AND bucket <= ? "
+            "ORDER BY bucket",
+            (series, res, lo - lo % res, hi),
+        )
+        return {
+            "series": series,
+            "resolution": name,
+            "t": [from_local_epoch(r[0]).isoformat() for r in rows],
+            "min": [r[1] for r in rows],
+            "max": [r[2] for r in rows],
+            "mean": [(r[3] / r[4]) if r[4] else None for r in rows],
+            "count": [r[4] for r in rows],
+            "last": [r[5] for r in rows],
+        }
+
+    def iter_rows(
+        self,
+        series: str,
+        resolution: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after_bucket: Optional[int] = None,
+    ):
+        """
+        Stream (bucket_start, min, max, mean, count, last) rows oldest-first
+        from a private connection; `after_bucket` resumes an export.
+        """
+        self.flush()
+        res = RESOLUTIONS[resolution]
+        clauses, params = ["series = ?", "resolution = ?"], [series, res]
+        if since is not None:
+            lo = to_local_epoch(since)
+            clauses.append("bucket >= ?")
+            params.append(lo - lo % res)
+        if until is not None:
+            clauses.append("bucket <= ?")
+            params.append(to_local_epoch(until))
+        if after_bucket is not None:
+            clauses.append("bucket > ?")
+            params.append(int(after_bucket))
+        sql = (
+            "SELECT bucket, min, max, sum, count, last FROM rollups "
+            f"WHERE {' AND '.join(clauses)} ORDER BY bucket"
+        )
+        for bucket, lo_v, hi_v, total, count, last in event_store.iter_query(sql, params):
+            yield bucket, lo_v, hi_v, (total / count) if count else None, count, last
+
+
+rollups = RollupEngine()
+
+
+def record_reading(series: str, value: Any, when: Optional[datetime] = None) -> None:
+    try:
+        rollups.record(series, value, when)
+    except Exception as e:
+        print(f"[Rollup] record({series}) failed: {e}", flush=True)
+
+
+def get_screenlogic_keys() -> List[str]:
+    keys = load_settings().get("history", {}).get("screenlogic_keys")
+    return list(keys) if isinstance(keys, list) else DEFAULT_SCREENLOGIC_KEYS
+
+
+def record_screenlogic(snapshot: Dict[str, Any]) -> None:
+    """Roll up the configured subset of a flattened ScreenLogic snapshot."""
+    now = datetime.now()
+    for key in get_screenlogic_keys():
+        if key in snapshot:
+            record_reading(key, snapshot[key], now)
+
@@ -14,10 +14,8 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 
-import eventlet
-
 from utils.settings_utils import load_settings
-from services.screenlogic_service import get_latest_screenlogic_data
+from services.screenlogic_service import get_salt_ppm
 from services.notification_service import _send_telegram_and_discord
 
 
@@ -58,47 +56,36 @@ def _maybe_alert(key: str, message: str, now: datetime) -> bool:
         return False
     _last_alert[key] = now
     _save()
-    _send_telegram_and_discord(message)
+    _send_telegram_and_discord(message, "warning")
     return True
 
 
-def salt_monitor_loop() -> None:
-    _load()
-    print("[SaltMonitor] loop started", flush=True)
+def check_salt_level() -> None:
+    """One check (run every _POLL_INTERVAL_SEC by services.scheduler)."""
+    settings = load_settings()
+    salt_range = settings.get("salt_range", {})
+    min_salt = salt_range.get("min")
+    max_salt = salt_range.get("max")
+    if min_salt is None and max_salt is None:
+        return
 
-    while True:
-        try:
-            settings = load_settings()
-            salt_range = settings.get("salt_range", {})
-            min_salt = salt_range.get("min")
-            max_salt = salt_range.get("max")
-
-            if min_salt is None and max_salt is None:
-                eventlet.sleep(_POLL_INTERVAL_SEC)
-                continue
-
-            data = get_latest_screenlogic_data()
-            salt = data.get("controller.sensor.salt_ppm.value")
-
-            if not isinstance(salt, (int, float)) or salt <= 0:
-                eventlet.sleep(_POLL_INTERVAL_SEC)
-                continue
-
-            now = datetime.now()
-            if max_salt is not None and salt > max_salt:
-                _maybe_alert(
-                    "salt_too_high",
-                    f"Salt {salt} ppm is ABOVE max threshold ({max_salt} ppm).",
-                    now,
-                )
-            elif min_salt is not None and salt < min_salt:
-                _maybe_alert(
-                    "salt_too_low",
-                    f"Salt {salt} ppm is BELOW min threshold ({min_salt} ppm).",
-                    now,
-                )
-
-        except Exception as exc:
-            print(f"[SaltMonitor] error: {exc}", flush=True)
-
-        eventlet.sleep(_POLL_INTERVAL_SEC)
+    salt = get_salt_ppm()
+    if salt is None:
+        return
+
+    now = datetime.now()
+    if max_salt is not None and salt > max_salt:
+        _maybe_alert(
+            "salt_too_high",
+            f"Salt {salt} ppm is ABOVE max threshold ({max_salt} ppm).",
+            now,
+        )
+    elif min_salt is not None and salt < min_salt:
+        _maybe_alert(
+            "salt_too_low",
+            f"Salt {salt} ppm is BELOW min threshold ({min_salt} ppm).",
+            now,
+        )
+
+
+_load()
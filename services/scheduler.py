@@ -0,0 +1,226 @@
+# File: services/scheduler.py
+"""
+Background job scheduler
+------------------------
+• One dispatcher green-thread keeps a heap of due times and runs the
+  periodic and one-shot jobs registered with it (pH/status broadcasts,
+  hardware checks, salt monitor, rollup flush, log maintenance, the
+  pump-trigger dose timer, ...) instead of each having its own
+  `while True: ...; eventlet.sleep(N)` loop.
+• Periodic jobs run at a fixed rate with optional jitter; a run that is
+  still busy when the next one is due is skipped (no overlap); missed
+  slots are dropped, not replayed.
+• Each run executes in its own green-thread under an optional timeout
+  (eventlet.Timeout, so it only fires at a cooperative yield point).
+• The dispatcher never waits for a pool worker: with all POOL_SIZE busy,
+  a periodic run is dropped and a one-shot (timers such as the dose or
+  digest flush) runs on a green-thread of its own; both count an overrun.
+• Per-job lag (start - due), runtime, failures, timeouts and skips are
+  kept for GET /api/scheduler.
+"""
+
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import eventlet
+from eventlet.event import Event
+from eventlet.greenpool import GreenPool
+
+POOL_SIZE = 32
+IDLE_WAIT_SEC = 60
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable[[], Any], interval: Optional[float],
+                 jitter: float, timeout: Optional[float]) -> None:
+        self.name = name
+        self.fn = fn
+        self.interval = interval          # None = one-shot
+        self.jitter = jitter
+        self.timeout = timeout
+        self.base = 0.0                   # un-jittered slot (periodic)
+        self.due = 0.0
+        self.running = False
+        self.cancelled = False
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "skipped": 0,
+            "overruns": 0,
+            "last_run": None,
+            "last_error": None,
+            "last_lag_ms": None,
+            "max_lag_ms": 0.0,
+            "total_lag_ms": 0.0,
+            "last_runtime_ms": None,
+            "max_runtime_ms": 0.0,
+            "total_runtime_ms": 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        s = dict(self.stats)
+        runs = s["runs"]
+        s["avg_lag_ms"] = round(s.pop("total_lag_ms") / runs, 3) if runs else None
+        s["avg_runtime_ms"] = round(s["total_runtime_ms"] / runs, 3) if runs else None
+        s["total_runtime_ms"] = round(s["total_runtime_ms"], 1)
+        return {
+            "name": self.name,
+            "interval_sec": self.interval,
+            "jitter_sec": self.jitter,
+            "timeout_sec": self.timeout,
+            "running": self.running,
+            "next_run_in_sec": round(max(0.0, self.due - time.monotonic()), 3),
+            **s,
+        }
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._pool = GreenPool(POOL_SIZE)
+        self._wakeup = Event()
+        self._dispatcher = None
+
+    # registration ---------------------------------------------------------------
+    def add_periodic(self, name: str, fn: Callable[[], Any], interval_sec: float,
+                     jitter_sec: float = 0.0, timeout_sec: Optional[float] = None,
+                     first_run_sec: Optional[float] = None) -> Job:
+        """Run fn() every interval_sec (first after first_run_sec, default one interval)."""
+        job = Job(name, fn, float(interval_sec), float(jitter_sec), timeout_sec)
+        job.base = time.monotonic() + (interval_sec if first_run_sec is None else first_run_sec)
+        return self._add(job, job.base + random.uniform(0, job.jitter))
+
+    def add_once(self, name: str, fn: Callable[[], Any], delay_sec: float,
+                 timeout_sec: Optional[float] = None) -> Job:
+        """Run fn() once after delay_sec; replaces a pending job of the same name."""
+        job = Job(name, fn, None, 0.0, timeout_sec)
+        return self._add(job, time.monotonic() + max(0.0, delay_sec))
+
+    def cancel(self, name: str) -> bool:
+        job = self._jobs.pop(name, None)
+        if job is None:
+            return False
+        job.cancelled = True
+        return True
+
+    def get_job(self, name: str) -> Optional[Job]:
+        """The pending/registered job called `name`, or None."""
+        return self._jobs.get(name)
+
+    def run_now(self, name: str) -> bool:
+        """Move a job's next run to now (ignored while it is running)."""
+        job = self._jobs.get(name)
+        if job is None or job.running:
+            return False
+        self._push(job, time.monotonic())
+        return True
+
+    def _add(self, job: Job, due: float) -> Job:
+        self.cancel(job.name)
+        self._jobs[job.name] = job
+        self._push(job, due)
+        self.start()
+        return job
+
+    def _push(self, job: Job, due: float) -> None:
+        job.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), job))
+        if not self._wakeup.ready():
+            self._wakeup.send()
+
+    # dispatcher -------------------------------------------------------------------
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = eventlet.spawn(self._dispatch)
+
+    def _dispatch(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, job = heapq.heappop(self._heap)
+                if job.cancelled or due != job.due:
+                    continue   # cancelled, or superseded by run_now()
+                self._fire(job, due, now)
+            wait = self._heap[0][0] - time.monotonic() if self._heap else IDLE_WAIT_SEC
+            if wait > 0:
+                with eventlet.Timeout(wait, False):
+                    self._wakeup.wait()
+            self._wakeup = Event()
+
+    def _fire(self, job: Job, due: float, now: float) -> None:
+        if job.interval is None:
+            if self._jobs.get(job.name) is job:
+                del self._jobs[job.name]
+        elif due < job.base:
+            self._push(job, job.base + random.uniform(0, job.jitter))   # run_now(): keep slot
+        else:
+            # next fixed-rate slot after now; missed slots are dropped
+            job.base += job.interval
+            if job.base <= now:
+                job.base += ((now - job.base) // job.interval + 1) * job.interval
+            self._push(job, job.base + random.uniform(0, job.jitter))
+        if job.running:
+            job.stats["skipped"] += 1
+            return
+        if self._pool.free() == 0:
+            # every worker is busy (hung jobs?); spawn_n would block the dispatcher
+            job.stats["overruns"] += 1
+            if job.interval is not None:
+                print(f"[Scheduler] pool full: {job.name} skips this slot", flush=True)
+                return
+            print(f"[Scheduler] pool full: {job.name} runs outside the pool", flush=True)
+            job.running = True
+            eventlet.spawn_n(self._run, job, due)   # one-shots are never lost
+            return
+        job.running = True
+        self._pool.spawn_n(self._run, job, due)
+
+    def _run(self, job: Job, due: float) -> None:
+        stats = job.stats
+        start = time.monotonic()
+        lag_ms = (start - due) * 1000
+        try:
+            if job.timeout:
+                with eventlet.Timeout(job.timeout):
+                    job.fn()
+            else:
+                job.fn()
+        except eventlet.Timeout:
+            stats["timeouts"] += 1
+            stats["last_error"] = f"timed out after {job.timeout}s"
+            print(f"[Scheduler] {job.name} timed out after {job.timeout}s", flush=True)
+        except Exception as e:
+            stats["failures"] += 1
+            stats["last_error"] = str(e) or type(e).__name__
+            print(f"[Scheduler] {job.name} failed: {e}", flush=True)
+        finally:
+            runtime_ms = (time.monotonic() - start) * 1000
+            job.running = False
+            stats["runs"] += 1
+            stats["last_run"] = datetime.now().isoformat()
+            stats["last_lag_ms"] = round(lag_ms, 3)
+            stats["max_lag_ms"] = round(max(stats["max_lag_ms"], lag_ms), 3)
+            stats["total_lag_ms"] += lag_ms
+            stats["last_runtime_ms"] = round(runtime_ms, 3)
+            stats["max_runtime_ms"] = round(max(stats["max_runtime_ms"], runtime_ms), 3)
+            stats["total_runtime_ms"] += runtime_ms
+
+    # introspection ----------------------------------------------------------------
+    def get_stats(self) -> Dict[str, Any]:
+        jobs = sorted(self._jobs.values(), key=lambda j: j.name)
+        return {
+            "jobs": [job.to_dict() for job in jobs],
+            "pool_running": self._pool.running(),
+            "pool_free": self._pool.free(),
+        }
+
+
+# singleton used by app.start_threads and the services
+scheduler = Scheduler()
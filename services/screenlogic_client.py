@@ -0,0 +1,283 @@
+# File: services/screenlogic_client.py
+"""
+Persistent ScreenLogic client
+-----------------------------
+• One long-lived ScreenLogicGateway connection owned by a dedicated
+  asyncio event loop running on a real OS thread.
+• Eventlet code talks to it through submit()/call(): the coroutine runs on
+  the client loop and the calling greenlet waits on a thread-safe result,
+  so the hub is never blocked and no per-call loop/handshake is needed.
+• Reconnects on demand with exponential backoff; a dropped connection is
+  detected on the next request.
+• Doorbell lets callbacks running on the client loop wake a greenlet
+  without parking a tpool thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import eventlet
+from eventlet import patcher, tpool
+from eventlet.hubs import trampoline
+from screenlogicpy import ScreenLogicGateway
+
+_threading = patcher.original("threading")
+_os = patcher.original("os")
+
+CONNECT_TIMEOUT_SEC = 20
+REQUEST_TIMEOUT_SEC = 30
+BACKOFF_MIN_SEC = 2
+BACKOFF_MAX_SEC = 300
+
+
+class Pending:
+    """Result of a call submitted to the client loop; safe to wait on from greenlets."""
+
+    def __init__(self) -> None:
+        self._done = _threading.Event()
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _set(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        self._result, self._error = result, error
+        self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self) -> None:
+        if self._task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def result(self, timeout: Optional[float] = REQUEST_TIMEOUT_SEC) -> Any:
+        """Wait (in a tpool thread, so only this greenlet blocks) and return the result."""
+        if not self._done.is_set():
+            if not tpool.execute(self._done.wait, timeout):
+                self.cancel()
+                raise TimeoutError(f"ScreenLogic request timed out after {timeout}s")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Doorbell:
+    """Self-pipe: ring() from any OS thread wakes a greenlet blocked in wait()."""
+
+    def __init__(self) -> None:
+        self._r, self._w = _os.pipe()
+        _os.set_blocking(self._r, False)
+        _os.set_blocking(self._w, False)
+
+    def ring(self) -> None:
+        try:
+            _os.write(self._w, b"\0")
+        except BlockingIOError:
+            pass  # plenty of rings already pending
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block this greenlet until rung; False on timeout. Coalesces rings."""
+        try:
+            trampoline(self._r, read=True, timeout=timeout)
+        except eventlet.Timeout:
+            return False
+        try:
+            while _os.read(self._r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+
+class ScreenLogicClient:
+    def __init__(self, gateway_factory: Callable[[], Any] = ScreenLogicGateway) -> None:
+        self._gateway_factory = gateway_factory
+        self._start_lock = _threading.Lock()
+        self._thread: Optional[Any] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._gateway: Optional[Any] = None
+        self._host: str = ""
+        self._backoff = BACKOFF_MIN_SEC
+        self._next_attempt = 0.0
+        # coroutine functions run (on the client loop) after every (re)connect
+        self._on_connect: list = []
+        self._stats: Dict[str, Any] = {
+            "connects": 0,
+            "connect_failures": 0,
+            "requests": 0,
+            "request_errors": 0,
+            "last_request_ms": None,
+            "last_error": None,
+        }
+
+    # thread / loop ------------------------------------------------------------
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = _threading.Event()
+            self._thread = _threading.Thread(
+                target=self._thread_main, args=(ready,),
+                name="screenlogic-client", daemon=True,
+            )
+            self._thread.start()
+            ready.wait(5)
+
+    def _thread_main(self, ready) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._connect_lock = asyncio.Lock()
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    # configuration ------------------------------------------------------------
+    def configure(self, host: str) -> None:
+        """Point the client at `host`; a change forces a reconnect on the next call."""
+        if host != self._host:
+            self._host = host
+            self._backoff = BACKOFF_MIN_SEC
+            self._next_attempt = 0.0
+
+    def set_gateway_factory(self, factory: Callable[[], Any]) -> None:
+        """Swap the gateway implementation (e.g. the local stand-in); drops the connection."""
+        if factory is not self._gateway_factory:
+            self._gateway_factory = factory
+            self._backoff = BACKOFF_MIN_SEC
+            self._next_attempt = 0.0
+            self.disconnect()
+
+    def add_connect_hook(self, hook: Callable[[Any], Awaitable[None]]) -> None:
+        """Register `async hook(gateway)` to run after every successful connect."""
+        self._on_connect.append(hook)
+
+    @property
+    def connected(self) -> bool:
+        gw = self._gateway
+        return bool(gw is not None and gw.is_connected)
+
+    # connection management (client loop only) ---------------------------------
+    async def _drop(self) -> None:
+        gw, self._gateway = self._gateway, None
+        if gw is not None:
+            try:
+                await gw.async_disconnect(True)
+            except Exception:
+                pass
+
+    async def _ensure_connected(self) -> Any:
+        async with self._connect_lock:
+            gw = self._gateway
+            if gw is not None and gw.is_connected and gw.ip == self._host:
+                return gw
+            await self._drop()
+            if not self._host:
+                raise ConnectionError("ScreenLogic host/IP not configured")
+            now = time.monotonic()
+            if now < self._next_attempt:
+                raise ConnectionError(
+                    f"ScreenLogic reconnect backoff ({self._next_attempt - now:.0f}s left)")
+            gw = self._gateway_factory()
+            try:
+                ok = await asyncio.wait_for(gw.async_connect(self._host), CONNECT_TIMEOUT_SEC)
+                if not ok:
+                    raise ConnectionError(f"ScreenLogic login to {self._host} failed")
+            except BaseException:
+                if gw.is_connected:
+                    try:
+                        await gw.async_disconnect(True)
+                    except Exception:
+                        pass
+                self._stats["connect_failures"] += 1
+                self._next_attempt = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, BACKOFF_MAX_SEC)
+                raise
+            self._gateway = gw
+            self._backoff = BACKOFF_MIN_SEC
+            self._next_attempt = 0.0
+            self._stats["connects"] += 1
+            print(f"[ScreenLogic] connected to {self._host}", flush=True)
+            for hook in self._on_connect:
+                try:
+                    await hook(gw)
+                except Exception as e:
+                    print(f"[ScreenLogic] connect hook failed: {e}", flush=True)
+            return gw
+
+    async def _run(self, pending: Pending, fn, args) -> None:
+        pending._task = asyncio.current_task()
+        start = time.monotonic()
+        try:
+            gw = await self._ensure_connected()
+            result = await fn(gw, *args)
+        except BaseException as e:
+            self._stats["request_errors"] += 1
+            self._stats["last_error"] = str(e) or type(e).__name__
+            gw = self._gateway
+            if gw is not None and not gw.is_connected:
+                await self._drop()
+            pending._set(error=e if isinstance(e, Exception) else ConnectionError(str(e)))
+        else:
+            pending._set(result=result)
+        finally:
+            self._stats["requests"] += 1
+            self._stats["last_request_ms"] = round((time.monotonic() - start) * 1000, 1)
+
+    async def gateway(self) -> Any:
+        """Connected gateway for coroutines already running on the client loop."""
+        return await self._ensure_connected()
+
+    # public API (any thread / greenlet) ---------------------------------------
+    def call_soon(self, callback: Callable[..., Any], *args: Any) -> None:
+        """Run a plain callable on the client loop thread."""
+        self.start()
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Pending:
+        """
+        Schedule `await fn(gateway, *args)` on the client loop and return a
+        Pending immediately. Calls are independent tasks, so several may be
+        in flight on the one connection.
+        """
+        self.start()
+        pending = Pending()
+        pending._loop = self._loop
+        self._loop.call_soon_threadsafe(
+            lambda: self._loop.create_task(self._run(pending, fn, args)))
+        return pending
+
+    def call(self, fn: Callable[..., Awaitable[Any]], *args: Any,
+             timeout: float = REQUEST_TIMEOUT_SEC) -> Any:
+        """submit() and wait for the result."""
+        return self.submit(fn, *args).result(timeout)
+
+    def poll(self, transform: Callable[[dict], Any], timeout: float = REQUEST_TIMEOUT_SEC) -> Any:
+        """Refresh all data and return transform(data_tree), computed on the client loop."""
+        async def _update(gw):
+            await gw.async_update()
+            return transform(gw.get_data())
+        return self.call(_update, timeout=timeout)
+
+    def disconnect(self) -> None:
+        if self._loop is not None and self._gateway is not None:
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._drop()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "host": self._host,
+            "connected": self.connected,
+            "backoff_sec": self._backoff,
+        }
+
+
+# singleton shared by the poller and the control API
+screenlogic_client = ScreenLogicClient()
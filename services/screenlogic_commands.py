@@ -0,0 +1,222 @@
+# File: services/screenlogic_commands.py
+"""
+ScreenLogic command channel
+---------------------------
+• Control commands (circuit on/off/toggle, heat mode + set-point) are queued
+  onto the poller's persistent connection instead of opening a new one.
+• One worker on the client loop drains the queue in order: every command
+  queued so far is sent back-to-back (pipelined), then a single status
+  refresh is taken for the whole batch.
+• submit() returns a Pending future; its result is
+  {"command": ..., "state": {<flat key>: <refreshed value>, ...}}.
+• submit_scene() queues an ordered list of commands as one unit. Commands
+  are grouped into stages where no two touch the same circuit/body; each
+  stage is sent concurrently (replies are matched by message id), so a
+  multi-step change takes roughly one round trip per stage.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.screenlogic_client import Pending, screenlogic_client
+
+COMMAND_TIMEOUT_SEC = 15
+MAX_SCENE_OPERATIONS = 32
+HEAT_MODES = (0, 1, 2, 3)
+SETPOINT_RANGE = (50, 104)
+
+
+def parse_command(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a control payload and return a normalised command.
+    Raises KeyError(<field>) for a missing/invalid field and ValueError for
+    an unknown target (same contract the control endpoint always had).
+    """
+    target = data.get("target")
+    if target == "circuit":
+        cid = int(data.get("id", -1))
+        if cid < 0:
+            raise KeyError("id")
+        action = data.get("action", "toggle")
+        if action not in ("on", "off", "toggle"):
+            raise KeyError("action")
+        return {"target": "circuit", "id": cid, "action": action}
+
+    if target == "heat":
+        body = int(data.get("body", -1))
+        mode = int(data.get("mode", 0))
+        setpt = int(data.get("setpoint", 0))
+        if body not in (0, 1):
+            raise KeyError("body")
+        if mode not in HEAT_MODES:
+            raise KeyError("mode")
+        if not (SETPOINT_RANGE[0] <= setpt <= SETPOINT_RANGE[1]):
+            raise KeyError("setpoint")
+        return {"target": "heat", "body": body, "mode": mode, "setpoint": setpt}
+
+    raise ValueError(f"unsupported target {target!r}")
+
+
+def state_keys(command: Dict[str, Any]) -> List[str]:
+    """Flattened keys that reflect the outcome of `command`."""
+    if command["target"] == "circuit":
+        return [f"circuit.{command['id']}.value"]
+    body = command["body"]
+    return [f"body.{body}.heat_mode.value", f"body.{body}.heat_setpoint.value",
+            f"body.{body}.heat_state.value"]
+
+
+def resource(command: Dict[str, Any]) -> Tuple[str, int]:
+    """The piece of equipment a command changes; same resource = ordered."""
+    if command["target"] == "circuit":
+        return ("circuit", command["id"])
+    return ("body", command["body"])
+
+
+def plan_stages(commands: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Split commands (by index) into consecutive stages with no shared
+    resource, preserving the order of commands on the same equipment.
+    """
+    stages: List[List[int]] = []
+    used: set = set()
+    for i, command in enumerate(commands):
+        res = resource(command)
+        if not stages or res in used:
+            stages.append([])
+            used = set()
+        stages[-1].append(i)
+        used.add(res)
+    return stages
+
+
+async def apply_command(gw: Any, command: Dict[str, Any],
+                        assumed: Optional[Dict[int, int]] = None) -> None:
+    """
+    Send one command over the connected gateway (client loop only).
+    `assumed` carries circuit states set earlier in the same batch, since
+    the gateway's cached values only change on the next status refresh.
+    """
+    if assumed is None:
+        assumed = {}
+    if command["target"] == "circuit":
+        cid = command["id"]
+        current = assumed.get(cid, gw.get_value("circuit", cid, "value") or 0)
+        new_state = {"on": 1, "off": 0}.get(command["action"], 1 - current)
+        if not await gw.async_set_circuit(cid, new_state):
+            raise RuntimeError(f"gateway rejected circuit {cid} -> {new_state}")
+        assumed[cid] = new_state
+        return
+    body = command["body"]
+    if not await gw.async_set_heat_mode(body, command["mode"]):
+        raise RuntimeError(f"gateway rejected heat mode for body {body}")
+    if not await gw.async_set_heat_temp(body, command["setpoint"]):
+        raise RuntimeError(f"gateway rejected set-point for body {body}")
+
+
+class CommandChannel:
+    def __init__(self, client=screenlogic_client) -> None:
+        self._client = client
+        self._queue: collections.deque = collections.deque()
+        self._draining = False
+        # refresh hook: async fn(gateway) -> flat snapshot mapping
+        self._refresh: Optional[Callable[[Any], Any]] = None
+
+    def set_refresh_hook(self, hook: Callable[[Any], Any]) -> None:
+        """Let the poller publish (and return) the snapshot after each batch."""
+        self._refresh = hook
+
+    def submit(self, command: Dict[str, Any]) -> Pending:
+        """Queue a parsed command; returns immediately with a Pending future."""
+        return self._enqueue([command], scene=False)
+
+    def submit_scene(self, commands: List[Dict[str, Any]]) -> Pending:
+        """Queue parsed commands as one scene; see module docstring."""
+        if not commands:
+            raise ValueError("scene has no operations")
+        if len(commands) > MAX_SCENE_OPERATIONS:
+            raise ValueError(f"scene has more than {MAX_SCENE_OPERATIONS} operations")
+        return self._enqueue(list(commands), scene=True)
+
+    def execute(self, command: Dict[str, Any], timeout: float = COMMAND_TIMEOUT_SEC) -> Dict[str, Any]:
+        return self.submit(command).result(timeout)
+
+    def execute_scene(self, commands: List[Dict[str, Any]],
+                      timeout: float = COMMAND_TIMEOUT_SEC) -> Dict[str, Any]:
+        return self.submit_scene(commands).result(timeout)
+
+    def _enqueue(self, commands: List[Dict[str, Any]], scene: bool) -> Pending:
+        pending = Pending()
+        self._queue.append((commands, scene, pending))
+        self._client.call_soon(self._kick)
+        return pending
+
+    # client loop only -------------------------------------------------------
+    def _kick(self) -> None:
+        if not self._draining:
+            self._draining = True
+            asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self) -> None:
+        try:
+            while self._queue:
+                batch = []
+                while self._queue:
+                    batch.append(self._queue.popleft())
+                await self._run_batch(batch)
+        finally:
+            self._draining = False
+
+    async def _run_batch(self, batch) -> None:
+        try:
+            gw = await self._client.gateway()
+        except Exception as exc:
+            for _, _, pending in batch:
+                pending._set(error=exc)
+            return
+
+        # Every command queued so far, in submission order.
+        commands = [cmd for cmds, _, _ in batch for cmd in cmds]
+        errors: List[Optional[Exception]] = [None] * len(commands)
+        assumed: Dict[int, int] = {}
+        for stage in plan_stages(commands):
+            outcomes = await asyncio.gather(
+                *(apply_command(gw, commands[i], assumed) for i in stage),
+                return_exceptions=True,
+            )
+            for i, outcome in zip(stage, outcomes):
+                if isinstance(outcome, BaseException):
+                    errors[i] = outcome if isinstance(outcome, Exception) else RuntimeError(str(outcome))
+
+        state: Any = {}
+        try:
+            await gw.async_get_status()
+            state = await self._refresh(gw) if self._refresh else {}
+        except Exception as exc:
+            print(f"[ScreenLogic] refresh after command failed: {exc}", flush=True)
+
+        offset = 0
+        for cmds, scene, pending in batch:
+            results = []
+            for command, error in zip(cmds, errors[offset:offset + len(cmds)]):
+                results.append({
+                    "command": command,
+                    "ok": error is None,
+                    "error": str(error) if error is not None else None,
+                    "state": {k: state.get(k) for k in state_keys(command)},
+                })
+            offset += len(cmds)
+            if scene:
+                pending._set(result={"results": results, "snapshot": dict(state)})
+            elif results[0]["ok"]:
+                pending._set(result={"command": results[0]["command"],
+                                     "state": results[0]["state"]})
+            else:
+                pending._set(error=errors[offset - 1])
+
+
+# singleton used by api/screenlogic_control
+command_channel = CommandChannel()
@@ -0,0 +1,279 @@
+# File: services/screenlogic_fake.py
+"""
+ScreenLogic gateway stand-in
+----------------------------
+• FakeScreenLogicGateway implements the subset of ScreenLogicGateway the
+  client, poller and command channel use, so it plugs in behind
+  services.screenlogic_client with no pool equipment attached.
+• The simulated pool (fake_pool) holds a data tree shaped like the real
+  gateway's, plays a scripted timeline of changes (pump/spa transitions,
+  salt drift, offline windows), adds per-request latency and random
+  failures, fires push callbacks and records every control command.
+
+Settings (all optional):
+    "screenlogic": {
+        "fake": {
+            "enabled": false,
+            "latency_ms": 20,
+            "failure_rate": 0.0,          # chance a request fails
+            "scenario": [                 # or "scenario_file": "<path>.json"
+                {"at_sec": 0,   "set": {"pump.0.state.value": 0}},
+                {"at_sec": 60,  "set": {"pump.0.state.value": 1, "circuit.505.value": 1}},
+                {"at_sec": 120, "offline_sec": 30}
+            ],
+            "loop_sec": null              # replay the scenario every N seconds
+        }
+    }
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import copy
+import json
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from screenlogicpy.const.common import ScreenLogicCommunicationError
+from screenlogicpy.const.msg import CODE
+
+MAX_RECORDED_COMMANDS = 500
+
+_DEFAULT_TREE: Dict[str, Any] = {
+    "controller": {
+        "sensor": {
+            "state": {"name": "Controller State", "value": 1},
+            "air_temperature": {"name": "Air Temperature", "value": 75},
+            "salt_ppm": {"name": "Salt", "value": 3200},
+        },
+    },
+    "circuit": {
+        500: {"name": "Spa", "value": 0},
+        505: {"name": "Pool", "value": 0},
+    },
+    "body": {
+        0: {"name": "Pool",
+            "last_temperature": {"value": 80},
+            "heat_setpoint": {"value": 82},
+            "heat_mode": {"value": 0},
+            "heat_state": {"value": 0}},
+        1: {"name": "Spa",
+            "last_temperature": {"value": 82},
+            "heat_setpoint": {"value": 100},
+            "heat_mode": {"value": 0},
+            "heat_state": {"value": 0}},
+    },
+    "pump": {
+        0: {"name": "Pool Pump",
+            "state": {"value": 0},
+            "rpm_now": {"value": 0},
+            "watts_now": {"value": 0}},
+    },
+}
+
+_CHEMISTRY_PREFIXES = ("controller.sensor.salt_ppm", "chemistry.", "scg.")
+
+
+def _load_scenario(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    steps = cfg.get("scenario")
+    path = cfg.get("scenario_file")
+    if path:
+        with open(path, "r") as f:
+            steps = json.load(f)
+    return sorted(steps or [], key=lambda s: float(s.get("at_sec", 0)))
+
+
+class FakePool:
+    """Simulated equipment shared by every FakeScreenLogicGateway session."""
+
+    def __init__(self) -> None:
+        self._config: Optional[Dict[str, Any]] = None
+        self.tree: Dict[str, Any] = copy.deepcopy(_DEFAULT_TREE)
+        self.latency_sec = 0.02
+        self.failure_rate = 0.0
+        self.offline_until = 0.0
+        self.commands: collections.deque = collections.deque(maxlen=MAX_RECORDED_COMMANDS)
+        self.requests = 0
+        self._scenario: List[Dict[str, Any]] = []
+        self._loop_sec: Optional[float] = None
+        self._timeline: Optional[asyncio.Task] = None
+        self._subscribers: Dict[int, set] = {}
+
+    # configuration (any thread) ---------------------------------------------
+    def configure(self, cfg: Dict[str, Any]) -> None:
+        """Apply settings; a changed config resets the pool and its timeline."""
+        if cfg == self._config:
+            return
+        self._config = copy.deepcopy(cfg)
+        self.tree = copy.deepcopy(_DEFAULT_TREE)
+        self.latency_sec = float(cfg.get("latency_ms", 20)) / 1000.0
+        self.failure_rate = float(cfg.get("failure_rate", 0.0))
+        self.offline_until = 0.0
+        self._scenario = _load_scenario(cfg)
+        self._loop_sec = cfg.get("loop_sec")
+        if self._timeline is not None:
+            self._timeline.get_loop().call_soon_threadsafe(self._timeline.cancel)
+            self._timeline = None
+
+    @property
+    def offline(self) -> bool:
+        return time.monotonic() < self.offline_until
+
+    # data tree ---------------------------------------------------------------
+    def set_value(self, key: str, value: Any) -> None:
+        """Set a flattened key (e.g. "pump.0.state.value") in the tree."""
+        node = self.tree
+        parts = key.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(int(part) if part.isdigit() else part, {})
+        last = parts[-1]
+        node[int(last) if last.isdigit() else last] = value
+
+    def apply(self, changes: Dict[str, Any]) -> None:
+        """Change keys and notify subscribers the way the gateway would."""
+        for key, value in changes.items():
+            self.set_value(key, value)
+        codes = {
+            CODE.CHEMISTRY_CHANGED if key.startswith(_CHEMISTRY_PREFIXES) else CODE.STATUS_CHANGED
+            for key in changes
+        }
+        for code in codes:
+            for callback in list(self._subscribers.get(code, ())):
+                callback()
+
+    def record(self, command: str, **args: Any) -> None:
+        self.commands.append({"time": datetime.now().isoformat(), "command": command, **args})
+
+    def subscribe(self, callback: Callable[[], None], code: int) -> Callable[[], None]:
+        listeners = self._subscribers.setdefault(code, set())
+        listeners.add(callback)
+        return lambda: listeners.discard(callback)
+
+    # timeline (client loop) ----------------------------------------------------
+    def ensure_timeline(self) -> None:
+        if self._scenario and (self._timeline is None or self._timeline.done()):
+            self._timeline = asyncio.get_running_loop().create_task(self._play())
+
+    async def _play(self) -> None:
+        while True:
+            start = time.monotonic()
+            for step in self._scenario:
+                delay = start + float(step.get("at_sec", 0)) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if step.get("offline_sec"):
+                    self.offline_until = time.monotonic() + float(step["offline_sec"])
+                if step.get("set"):
+                    self.apply(step["set"])
+            if not self._loop_sec:
+                return
+            remaining = start + float(self._loop_sec) - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "offline": self.offline,
+            "requests": self.requests,
+            "latency_ms": round(self.latency_sec * 1000, 1),
+            "failure_rate": self.failure_rate,
+            "commands": list(self.commands),
+        }
+
+
+fake_pool = FakePool()
+
+
+class FakeScreenLogicGateway:
+    """Drop-in for ScreenLogicGateway backed by fake_pool."""
+
+    def __init__(self, pool: FakePool = fake_pool) -> None:
+        self._pool = pool
+        self._ip: Optional[str] = None
+        self._connected = False
+
+    @property
+    def ip(self) -> Optional[str]:
+        return self._ip
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected and not self._pool.offline
+
+    async def _request(self) -> None:
+        pool = self._pool
+        pool.requests += 1
+        if pool.latency_sec:
+            await asyncio.sleep(pool.latency_sec)
+        if pool.offline or not self._connected:
+            self._connected = False
+            raise ScreenLogicCommunicationError("fake gateway offline")
+        if pool.failure_rate and random.random() < pool.failure_rate:
+            raise ScreenLogicCommunicationError("fake gateway: injected failure")
+
+    # connection ----------------------------------------------------------------
+    async def async_connect(self, ip: Optional[str] = None, **_kwargs: Any) -> bool:
+        if self._pool.offline:
+            raise ScreenLogicCommunicationError("fake gateway offline")
+        self._ip = ip if ip is not None else self._ip
+        self._connected = True
+        await self._request()
+        self._pool.ensure_timeline()
+        return True
+
+    async def async_disconnect(self, force: bool = False) -> None:
+        self._connected = False
+
+    # data ----------------------------------------------------------------------
+    async def async_update(self) -> None:
+        for _ in range(5):   # status, pumps, chemistry, scg, datetime
+            await self._request()
+
+    async def async_get_status(self) -> None:
+        await self._request()
+
+    async def async_get_pumps(self) -> None:
+        await self._request()
+
+    async def async_get_chemistry(self) -> None:
+        await self._request()
+
+    async def async_get_scg(self) -> None:
+        await self._request()
+
+    def get_data(self, *keypath: Any, strict: bool = False) -> Any:
+        node: Any = self._pool.tree
+        for key in keypath:
+            node = node.get(key) if isinstance(node, dict) else None
+        return node
+
+    def get_value(self, *keypath: Any, strict: bool = False) -> Any:
+        node = self.get_data(*keypath)
+        return node.get("value") if isinstance(node, dict) else node
+
+    # control -------------------------------------------------------------------
+    async def async_set_circuit(self, circuitID: int, circuitState: int) -> bool:
+        await self._request()
+        self._pool.record("set_circuit", circuit=circuitID, state=circuitState)
+        self._pool.apply({f"circuit.{circuitID}.value": int(circuitState)})
+        return True
+
+    async def async_set_heat_mode(self, body: int, mode: int) -> bool:
+        await self._request()
+        self._pool.record("set_heat_mode", body=body, mode=mode)
+        self._pool.apply({f"body.{body}.heat_mode.value": int(mode)})
+        return True
+
+    async def async_set_heat_temp(self, body: int, temp: int) -> bool:
+        await self._request()
+        self._pool.record("set_heat_temp", body=body, temp=temp)
+        self._pool.apply({f"body.{body}.heat_setpoint.value": int(temp)})
+        return True
+
+    # push ----------------------------------------------------------------------
+    async def async_subscribe_client(self, callback: Callable[..., Any], code: int) -> Callable:
+        await self._request()
+        return self._pool.subscribe(callback, code)
@@ -0,0 +1,212 @@
+# File: services/screenlogic_schedule.py
+"""
+Adaptive ScreenLogic poll scheduling
+------------------------------------
+• Polls fast (min_interval_sec) around expected transitions:
+    - a dispense is running,
+    - the pump-trigger dose is due within ±fast_window_sec,
+    - the pump is off and a pump start time is within fast_window_sec.
+  Start times come from screenlogic.adaptive.pump_start_times ("HH:MM")
+  and, when learn_pump_starts_days > 0, from OFF→ON transitions the
+  historian recorded on previous days.
+• An equipment change (pump state, circuit, heat state) resets the interval
+  to poll_interval; every unchanged poll multiplies it by backoff_factor up
+  to max_interval_sec. While the pump runs the interval never exceeds
+  poll_interval, so an ON→OFF change is seen within one poll.
+• The poller sleeps in min_interval_sec steps and re-evaluates, so a dose
+  scheduled while backed off is picked up within one step.
+• get_state() (current interval + reason) is exposed in the status payload
+  and at /api/screenlogic/client.
+
+Settings (all optional):
+    "screenlogic": {
+        "adaptive": {
+            "enabled": true,
+            "min_interval_sec": 2,
+            "max_interval_sec": 120,
+            "backoff_factor": 2.0,
+            "fast_window_sec": 120,
+            "pump_start_times": [],       # e.g. ["08:00", "18:30"]
+            "learn_pump_starts_days": 7
+        }
+    }
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.historian_service import historian
+
+DEFAULT_POLL_INTERVAL_SEC = 5
+LEARN_REFRESH_SEC = 3600
+# flattened key prefixes that count as an equipment transition
+_EQUIPMENT_PREFIXES = ("pump.", "circuit.", "body.")
+_EQUIPMENT_SUFFIXES = (".state.value", "heat_state.value", "heat_mode.value")
+
+
+def _is_equipment_key(key: str) -> bool:
+    if key.startswith("circuit.") and key.endswith(".value"):
+        return True
+    return key.startswith(_EQUIPMENT_PREFIXES) and key.endswith(_EQUIPMENT_SUFFIXES)
+
+
+def _parse_hhmm(value: str) -> Optional[int]:
+    try:
+        hh, mm = str(value).split(":", 1)
+        minute = int(hh) * 60 + int(mm)
+    except (ValueError, TypeError):
+        return None
+    return minute if 0 <= minute < 24 * 60 else None
+
+
+def _minutes_apart(a: int, b: int) -> int:
+    """Distance between two minutes-of-day, wrapping at midnight."""
+    d = abs(a - b) % (24 * 60)
+    return min(d, 24 * 60 - d)
+
+
+class AdaptivePollScheduler:
+    def __init__(self) -> None:
+        self._cfg: Dict[str, Any] = {}
+        self._base = float(DEFAULT_POLL_INTERVAL_SEC)
+        self._interval = float(DEFAULT_POLL_INTERVAL_SEC)   # backoff state
+        self._current = float(DEFAULT_POLL_INTERVAL_SEC)    # last decision
+        self._reason = "startup"
+        self._backoff_reason = "startup"
+        self._learned: List[int] = []
+        self._learned_at = 0.0
+        self._pump_id = 0
+
+    # configuration ------------------------------------------------------------
+    def configure(self, cfg: Dict[str, Any], pump_id: int = 0) -> None:
+        """Take the screenlogic settings block (called once per poll)."""
+        self._cfg = cfg.get("adaptive") or {}
+        self._base = float(cfg.get("poll_interval", DEFAULT_POLL_INTERVAL_SEC)
+                           or DEFAULT_POLL_INTERVAL_SEC)
+        if pump_id != self._pump_id:
+            self._pump_id = pump_id
+            self._learned_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._cfg.get("enabled", True))
+
+    def _limits(self) -> Tuple[float, float]:
+        lo = float(self._cfg.get("min_interval_sec", 2))
+        hi = float(self._cfg.get("max_interval_sec", 120))
+        return lo, max(lo, hi)
+
+    # pump start windows --------------------------------------------------------
+    def _learn_pump_starts(self) -> List[int]:
+        days = int(self._cfg.get("learn_pump_starts_days", 7) or 0)
+        if days <= 0:
+            return []
+        if time.monotonic() - self._learned_at < LEARN_REFRESH_SEC and self._learned_at:
+            return self._learned
+        self._learned_at = time.monotonic()
+        key = f"pump.{self._pump_id}.state.value"
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        try:
+            points = historian.query(key, since=since)
+        except Exception as exc:
+            print(f"[ScreenLogic] pump start history unavailable: {exc}", flush=True)
+            return self._learned
+        starts = set()
+        prev = None
+        for ts, value in zip(points["t"], points["value"]):
+            if value == 1 and prev == 0:
+                t = datetime.fromisoformat(ts)
+                starts.add((t.hour * 60 + t.minute) // 5 * 5)   # 5-minute slots
+            prev = value
+        self._learned = sorted(starts)
+        return self._learned
+
+    def pump_start_minutes(self) -> List[int]:
+        configured = [m for m in map(_parse_hhmm, self._cfg.get("pump_start_times") or [])
+                      if m is not None]
+        return sorted(set(configured) | set(self._learn_pump_starts()))
+
+    # decision ------------------------------------------------------------------
+    def _fast_reason(self, snapshot, now: datetime) -> Optional[str]:
+        from services.dosing_state import state as dosing_state
+        from services.pump_trigger_dose_service import get_scheduled_dose_time
+        from services.screenlogic_service import get_pump_state
+
+        window = float(self._cfg.get("fast_window_sec", 120))
+        if dosing_state.active_dosing_task is not None:
+            return "dispense active"
+        due = get_scheduled_dose_time()
+        if due is not None and abs((due - now).total_seconds()) <= window:
+            return "dose due"
+        if get_pump_state(self._pump_id, snapshot) != 1:
+            minute = now.hour * 60 + now.minute
+            window_min = max(1, int(window // 60))
+            if any(_minutes_apart(minute, m) <= window_min for m in self.pump_start_minutes()):
+                return "pump start window"
+        return None
+
+    def observe(self, diff: Optional[Dict[str, Any]], backoff: bool = True) -> None:
+        """
+        Feed a published diff. An equipment change resets the interval; with
+        `backoff` (full polls only) anything else lengthens it.
+        """
+        _, hi = self._limits()
+        changed = diff is not None and any(
+            _is_equipment_key(k)
+            for part in ("added", "changed", "removed")
+            for k in diff.get(part, ())
+        )
+        if changed:
+            self._interval = self._base
+            self._backoff_reason = "equipment changed"
+        elif backoff:
+            factor = max(1.0, float(self._cfg.get("backoff_factor", 2.0)))
+            self._interval = min(max(self._interval, self._base) * factor, max(hi, self._base))
+            self._backoff_reason = "idle"
+
+    def next_interval(self, snapshot=None, now: Optional[datetime] = None) -> float:
+        """Seconds to wait after the last poll, given the current state."""
+        if not self.enabled:
+            self._current, self._reason = self._base, "fixed"
+            return self._current
+        from services.screenlogic_service import get_pump_state
+
+        reason = self._fast_reason(snapshot, now or datetime.now())
+        if reason is not None:
+            self._current, self._reason = self._limits()[0], reason
+        elif get_pump_state(self._pump_id, snapshot) == 1:
+            # pump OFF must be seen promptly (fresh-water gate, dose cancel):
+            # no backoff while it runs
+            self._interval = min(self._interval, self._base)
+            self._current, self._reason = self._interval, "pump running"
+        else:
+            self._current, self._reason = self._interval, self._backoff_reason
+        return self._current
+
+    def step(self) -> float:
+        """How long the poller sleeps between re-evaluations."""
+        return self._limits()[0] if self.enabled else self._base
+
+    def reset(self) -> None:
+        """Drop back to poll_interval (e.g. after an error or reconnect)."""
+        self._interval = self._current = self._base
+        self._reason = self._backoff_reason = "reset"
+
+    def get_state(self) -> Dict[str, Any]:
+        lo, hi = self._limits()
+        return {
+            "adaptive": self.enabled,
+            "interval_sec": round(self._current, 1),
+            "reason": self._reason,
+            "min_interval_sec": lo,
+            "max_interval_sec": hi,
+            "pump_start_times": [f"{m // 60:02d}:{m % 60:02d}"
+                                 for m in self.pump_start_minutes()],
+        }
+
+
+# singleton used by services.screenlogic_service
+poll_scheduler = AdaptivePollScheduler()
@@ -1,33 +1,77 @@
 """ScreenLogic polling service – *full* data export
    -------------------------------------------------
    • Runs on a background thread.
-   • Retrieves the gateway’s complete data tree.
-   • Flattens every scalar field (int / float / str / bool).
-   • Exposes last snapshot via get_latest_screenlogic_data().
+   • Retrieves the gateway’s complete data tree over the persistent
+     connection held by services.screenlogic_client.
+   • Flattens every scalar field (int / float / str / bool) and diffs it
+     against the previous poll; only changed keys go out to websocket
+     clients (screenlogic_diff), and an unchanged poll publishes nothing.
+   • Publishes each snapshot as an immutable (version, read-only mapping)
+     pair; get_latest_screenlogic_data() and the typed accessors
+     (get_pump_state, get_circuit_state, get_salt_ppm) read it copy-free.
+   • screenlogic.mode = "push" subscribes to gateway status/chemistry
+     notifications and publishes each change immediately; a full refresh
+     still runs every full_refresh_sec (default 300) for consistency.
+   • Poll timing is adaptive (services.screenlogic_schedule): fast around
+     pump starts, a due dose or an active dispense, exponential backoff
+     while the equipment is idle.
+   • screenlogic.fake.enabled swaps in the local gateway stand-in
+     (services.screenlogic_fake) for benchmarks and equipment-free runs.
+   • Control commands share the same connection via
+     services.screenlogic_commands; their refreshed state is published
+     through the same diff path as push updates.
 """
 
 from __future__ import annotations
 
 import asyncio
+import functools
+import collections
 import logging
+import sys
 import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
 
 import eventlet  # Added for consistency
 eventlet.monkey_patch()  # Ensure patched
 
+from eventlet import patcher
 from screenlogicpy import ScreenLogicGateway
+from screenlogicpy.const.msg import CODE
 from utils.settings_utils import load_settings
 from services.notification_service import set_status, clear_status
 from services.error_service import set_error, clear_error
-
-from eventlet import tpool  # For blocking async in threads
+from services.rollup_service import record_screenlogic
+from services.historian_service import record_telemetry
+from services.screenlogic_client import Doorbell, screenlogic_client
+from services.screenlogic_commands import command_channel
+from services.screenlogic_fake import FakeScreenLogicGateway, fake_pool
+from services.screenlogic_schedule import poll_scheduler
 
 _log = logging.getLogger(__name__)
+_threading = patcher.original("threading")
+
+
+
+class ScreenLogicSnapshot(NamedTuple):
+    """A published snapshot: diff version plus a read-only flat mapping."""
+    version: int
+    data: Mapping[str, Any]
+
+
+# Most-recent snapshot. Replaced (never mutated) in a single assignment, so
+# readers always see one consistent version without copying.
+_snapshot = ScreenLogicSnapshot(0, MappingProxyType({}))
 
-# Most-recent flattened payload
-_latest_data: Dict[str, Any] = {}
+# callback(snapshot, diff) run (in the publishing greenlet) for every
+# published change; see add_snapshot_listener().
+_snapshot_listeners: List[Any] = []
+
+# EasyTouch circuit IDs (match home page constants)
+SPA_CIRCUIT_ID = 500
+POOL_CIRCUIT_ID = 505
 
 # Flap suppression: don't notify until poll has been failing continuously
 # for OFFLINE_NOTIFY_THRESHOLD_SEC. Cached data is still cleared immediately.
@@ -40,114 +84,282 @@ _pump_on_since: Optional[datetime] = None
 
 
 # ───────────────────────── helper: flatten any ScreenLogic tree ─────────────
-def _flatten(node: Any, path: List[str], out: Dict[str, Any]) -> None:
+_MISSING = object()
+_SCALARS = (int, float, str, bool)
+
+
+class ScreenLogicFlattener:
     """
-    Recursively walk `node` (dict / list / scalar) and append any scalar values
-    to `out` using a '.'-joined path.
+    Flattens the gateway tree into { dotted.path : scalar } and diffs it
+    against the previous result. Path strings are built once per
+    (parent, key) and interned, so a poll where nothing changed only walks
+    the tree and returns the previous snapshot object unchanged.
     """
-    # scalars we keep
-    if isinstance(node, (int, float, str, bool)) or node is None:
-        out[".".join(path)] = node
-        return
 
-    # dict → recurse into items
-    if isinstance(node, dict):
-        for k, v in node.items():
-            _flatten(v, path + [str(k)], out)
-        return
-
-    # list → recurse with index
-    if isinstance(node, list):
-        for idx, itm in enumerate(node):
-            _flatten(itm, path + [str(idx)], out)
-        return
+    def __init__(self) -> None:
+        self._lock = _threading.Lock()
+        self._paths: Dict[Tuple[str, Any], str] = {}
+        self._current: Dict[str, Any] = {}
+        self.version = 0
+
+    def _path(self, parent: str, key: Any) -> str:
+        path = self._paths.get((parent, key))
+        if path is None:
+            path = sys.intern(f"{parent}.{key}" if parent else str(key))
+            self._paths[(parent, key)] = path
+        return path
+
+    def _walk(self, node: Any, parent: str, visit) -> None:
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            path = self._path(parent, key)
+            if isinstance(value, (dict, list)):
+                self._walk(value, path, visit)
+            elif value is None or isinstance(value, _SCALARS):
+                visit(path, value)
+
+    def update(self, data_tree: dict) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Return (snapshot, diff). diff is None when nothing changed, else
+        {"base", "version", "added", "changed", "removed"}.
+        """
+        with self._lock:
+            prev = self._current
+            added: Dict[str, Any] = {}
+            changed: Dict[str, Any] = {}
+            seen = [0]
+
+            def visit(path: str, value: Any) -> None:
+                seen[0] += 1
+                old = prev.get(path, _MISSING)
+                if old is _MISSING:
+                    added[path] = value
+                elif old != value or type(old) is not type(value):
+                    changed[path] = value
+
+            if isinstance(data_tree, (dict, list)):
+                self._walk(data_tree, "", visit)
+
+            removed: List[str] = []
+            if seen[0] - len(added) < len(prev):
+                present = set()
+                self._walk(data_tree, "", lambda path, _v: present.add(path))
+                removed = [k for k in prev if k not in present]
+
+            if not (added or changed or removed):
+                return prev, None
+
+            snapshot = dict(prev)
+            snapshot.update(added)
+            snapshot.update(changed)
+            for key in removed:
+                del snapshot[key]
+            return snapshot, self._commit(snapshot, added, changed, removed)
+
+    def reset(self) -> Optional[Dict[str, Any]]:
+        """Forget everything (gateway offline); returns the all-removed diff."""
+        with self._lock:
+            if not self._current:
+                return None
+            return self._commit({}, {}, {}, list(self._current))
+
+    def _commit(self, snapshot, added, changed, removed) -> Dict[str, Any]:
+        base = self.version
+        self.version += 1
+        self._current = snapshot
+        return {"base": base, "version": self.version,
+                "added": added, "changed": changed, "removed": removed}
 
 
 def flatten_screenlogic(data_tree: dict) -> Dict[str, Any]:
     """Return a flat { dotted.path : scalar } dict for *all* values."""
-    flat: Dict[str, Any] = {}
-    _flatten(data_tree, [], flat)
-    return flat
+    return ScreenLogicFlattener().update(data_tree)[0]
 
 
 # ───────────────────────── ScreenLogic service class ────────────────────────
+# Push notifications we subscribe to in "push" mode. A status change can be a
+# pump starting, so pump data is re-read before the snapshot is published.
+PUSH_CODES = (CODE.STATUS_CHANGED, CODE.CHEMISTRY_CHANGED)
+DEFAULT_FULL_REFRESH_SEC = 300
+
+
 class ScreenLogicService:
     def __init__(self) -> None:
         self._stop = eventlet.Event()  # Use eventlet Event for consistency
+        # push mode: latest snapshot built on the client loop + wake-up bell
+        self._flattener = ScreenLogicFlattener()
+        self._doorbell = Doorbell()
+        self._pushed: collections.deque = collections.deque()
+        self._subscribed_gw: Any = None
+        self._unsubscribe: List[Any] = []
+        self._host = ""
 
     # start / stop -----------------------------------------------------------
     def start(self) -> None:
+        command_channel.set_refresh_hook(self._refresh_after_command)
         eventlet.spawn(self._run)  # Use eventlet.spawn like other services
+        eventlet.spawn(self._push_listener)
         _log.info("[ScreenLogic] service greenlet started")
 
     def stop(self) -> None:
         self._stop.send()
+        screenlogic_client.disconnect()
+
+    # push mode (callbacks run on the client loop thread) ---------------------
+    def _on_push(self, gw: Any, code: int) -> None:
+        asyncio.get_running_loop().create_task(self._refresh_after_push(gw, code))
+
+    async def _refresh_after_push(self, gw: Any, code: int) -> None:
+        try:
+            if code == CODE.STATUS_CHANGED:
+                await gw.async_get_pumps()
+            self._hand_off(gw)
+        except Exception as exc:
+            _log.warning("[ScreenLogic] push refresh failed: %s", exc)
+
+    def _hand_off(self, gw: Any) -> Dict[str, Any]:
+        """Diff the gateway's data and queue it for the publisher greenlet."""
+        snapshot, diff = self._flattener.update(gw.get_data())
+        self._pushed.append((snapshot, diff))
+        self._doorbell.ring()
+        return snapshot
+
+    async def _refresh_after_command(self, gw: Any) -> Dict[str, Any]:
+        return self._hand_off(gw)
+
+    async def _subscribe(self, gw: Any) -> None:
+        if self._subscribed_gw is gw:
+            return
+        await self._unsubscribe_all(None)
+        for code in PUSH_CODES:
+            remove = await gw.async_subscribe_client(
+                functools.partial(self._on_push, gw, code), code)
+            if remove is not None:
+                self._unsubscribe.append(remove)
+        self._subscribed_gw = gw
+        print(f"[ScreenLogic] push mode: subscribed to {len(PUSH_CODES)} message codes", flush=True)
+
+    async def _unsubscribe_all(self, _gw: Any) -> None:
+        callbacks, self._unsubscribe = self._unsubscribe, []
+        self._subscribed_gw = None
+        for remove in callbacks:
+            try:
+                remove()
+            except Exception:
+                pass
+
+    def _push_listener(self) -> None:
+        """Publish snapshots handed off by the client loop (push, commands) at once."""
+        while not self._stop.ready():
+            if not self._doorbell.wait(timeout=30):
+                continue
+            while self._pushed:
+                snapshot, diff = self._pushed.popleft()
+                try:
+                    poll_scheduler.observe(diff, backoff=False)
+                    self._publish(snapshot, diff, self._host)
+                except Exception as exc:
+                    _log.warning("[ScreenLogic] push publish failed: %s", exc)
+
+    # publish ------------------------------------------------------------------
+    def _publish(self, snapshot: Dict[str, Any], diff: Optional[Dict[str, Any]],
+                 host: str) -> None:
+        global _first_failure_time, _pump_on_since, _snapshot
+        if diff is not None:
+            if diff["version"] <= _snapshot.version:
+                return  # a newer push/poll result was already published
+            # the flattener never mutates a committed dict, so wrap it as-is
+            _snapshot = ScreenLogicSnapshot(diff["version"], MappingProxyType(snapshot))
+
+        # Track pump-on transitions for downstream consumers.
+        if snapshot.get("pump.0.state.value") == 1:
+            if _pump_on_since is None:
+                _pump_on_since = datetime.now()
+        else:
+            _pump_on_since = None
+
+        record_screenlogic(snapshot)
+        record_telemetry(snapshot)
+
+        _log.debug("[ScreenLogic] update (%d fields)", len(snapshot))
+        set_status("screenlogic", "connection", "ok",
+                   f"Connected to {host} ({len(snapshot)} fields)")
+        clear_error("SCREENLOGIC_OFFLINE")
+        _first_failure_time = None
+
+        # only changed keys go out to websocket clients
+        if diff is not None:
+            from status_namespace import emit_screenlogic_diff
+            emit_screenlogic_diff(diff)
+            for callback in list(_snapshot_listeners):
+                try:
+                    callback(_snapshot, diff)
+                except Exception as exc:
+                    _log.warning("[ScreenLogic] snapshot listener failed: %s", exc)
 
     # main loop --------------------------------------------------------------
     def _run(self) -> None:
-        global _first_failure_time, _pump_on_since
+        global _first_failure_time, _pump_on_since, _snapshot
+        last_refresh = 0.0
         while not self._stop.ready():
-            cfg = load_settings().get("screenlogic", {})
+            settings = load_settings()
+            cfg = settings.get("screenlogic", {})
             interval = int(cfg.get("poll_interval", 5)) or 5
+            poll_scheduler.configure(cfg, int(settings.get("pump_circuit", 0)))
+            push = cfg.get("mode", "poll") == "push"
+            full_refresh = float(cfg.get("full_refresh_sec", DEFAULT_FULL_REFRESH_SEC))
 
             try:
                 if not cfg.get("enabled"):
+                    screenlogic_client.disconnect()
                     eventlet.sleep(10)
                     continue
 
-                host = str(cfg.get("host", "")).strip()
+                host = configure_gateway(cfg)
                 if not host:
                     _log.warning("[ScreenLogic] enabled but no host/IP in settings")
                     eventlet.sleep(interval)
                     continue
+                self._host = host
+
+                # In push mode the gateway tells us about changes; a full
+                # refresh only runs every full_refresh_sec, or right away if
+                # the connection (and with it the subscription) was lost.
+                subscribed = (self._subscribed_gw is not None
+                              and self._subscribed_gw.is_connected)
+                if push and subscribed and time.monotonic() - last_refresh < full_refresh:
+                    eventlet.sleep(interval)
+                    continue
+
+                # Only the data request goes over the wire; the connection
+                # (and its login) is reused across polls.
+                snapshot, diff = screenlogic_client.poll(self._flattener.update)
+                last_refresh = time.monotonic()
+                if push:
+                    screenlogic_client.call(self._subscribe)
+                elif self._subscribed_gw is not None:
+                    screenlogic_client.call(self._unsubscribe_all)
 
-                def sync_poll() -> Dict[str, Any]:
-                    # Run async poll in a sync wrapper for tpool
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        gw = ScreenLogicGateway()
-                        loop.run_until_complete(gw.async_connect(host))
-                        loop.run_until_complete(gw.async_update())
-                        flat = flatten_screenlogic(gw.get_data())
-                        loop.run_until_complete(gw.async_disconnect())
-                        return flat
-                    finally:
-                        loop.close()
-
-                # Run the async poll in a real thread to avoid eventlet conflicts
-                snapshot = tpool.execute(sync_poll)
-
-                _latest_data.clear()
-                _latest_data.update(snapshot)
-
-                # Track pump-on transitions for downstream consumers.
-                if snapshot.get("pump.0.state.value") == 1:
-                    if _pump_on_since is None:
-                        _pump_on_since = datetime.now()
-                else:
-                    _pump_on_since = None
-
-                _log.debug("[ScreenLogic] update (%d fields)", len(snapshot))
-                set_status("screenlogic", "connection", "ok",
-                           f"Connected to {host} ({len(snapshot)} fields)")
-                clear_error("SCREENLOGIC_OFFLINE")
-                _first_failure_time = None
-
-                # broadcast to websocket clients
-                from status_namespace import emit_status_update
-                emit_status_update(force_emit=True)
+                self._publish(snapshot, diff, host)
+                poll_scheduler.observe(diff)
+                self._wait_for_next_poll(last_refresh)
+                continue
 
             except Exception as exc:
                 _log.warning("[ScreenLogic] poll failed: %s", exc)
+                poll_scheduler.reset()
                 now = datetime.now()
                 if _first_failure_time is None:
                     _first_failure_time = now
                 offline_sec = (now - _first_failure_time).total_seconds()
                 # Always invalidate cached data so downstream consumers don't
                 # trust stale state during the outage.
-                _latest_data.clear()
                 _pump_on_since = None
+                diff = self._flattener.reset()
+                if diff is not None:
+                    _snapshot = ScreenLogicSnapshot(diff["version"], MappingProxyType({}))
+                    from status_namespace import emit_screenlogic_diff
+                    emit_screenlogic_diff(diff)
                 # Only notify once the outage has lasted past the flap threshold.
                 if offline_sec >= OFFLINE_NOTIFY_THRESHOLD_SEC:
                     set_status("screenlogic", "connection", "error",
@@ -156,11 +368,86 @@ class ScreenLogicService:
 
             eventlet.sleep(interval)
 
+    def _wait_for_next_poll(self, polled_at: float) -> None:
+        """Sleep until the adaptive interval since `polled_at` has elapsed,
+        re-checking every min_interval_sec in case a dose/dispense starts."""
+        while not self._stop.ready():
+            remaining = poll_scheduler.next_interval() - (time.monotonic() - polled_at)
+            if remaining <= 0:
+                return
+            eventlet.sleep(min(remaining, poll_scheduler.step()))
+
 
 # ───────────────────────── public API ───────────────────────────────────────
-def get_latest_screenlogic_data() -> Dict[str, Any]:
-    """Return a *copy* of the most recent flattened snapshot."""
-    return _latest_data.copy()
+def configure_gateway(cfg: Dict[str, Any]) -> str:
+    """
+    Point the shared client at the real gateway or, with screenlogic.fake
+    enabled, at the local stand-in. Returns the host ("" if none is set).
+    """
+    fake_cfg = cfg.get("fake") or {}
+    host = str(cfg.get("host", "")).strip()
+    if fake_cfg.get("enabled"):
+        fake_pool.configure(fake_cfg)
+        screenlogic_client.set_gateway_factory(FakeScreenLogicGateway)
+        host = host or "fake"
+    else:
+        screenlogic_client.set_gateway_factory(ScreenLogicGateway)
+    if host:
+        screenlogic_client.configure(host)
+    return host
+
+
+def add_snapshot_listener(callback) -> None:
+    """
+    Register callback(snapshot, diff), called for every published change
+    (poll, push or command refresh) in publish order. Keep it quick.
+    """
+    _snapshot_listeners.append(callback)
+
+
+def get_poll_schedule() -> Dict[str, Any]:
+    """Current poll interval, why it was chosen, and the min/max bounds."""
+    return poll_scheduler.get_state()
+
+
+def get_screenlogic_snapshot() -> ScreenLogicSnapshot:
+    """Current (version, read-only data) pair; read it once per decision."""
+    return _snapshot
+
+
+def get_latest_screenlogic_data() -> Mapping[str, Any]:
+    """Read-only view of the most recent flattened snapshot (no copy)."""
+    return _snapshot.data
+
+
+def get_latest_screenlogic_version() -> int:
+    """Diff version of the snapshot returned by get_latest_screenlogic_data()."""
+    return _snapshot.version
+
+
+def _int_value(snapshot: Optional[ScreenLogicSnapshot], key: str) -> Optional[int]:
+    value = (snapshot or _snapshot).data.get(key)
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def get_pump_state(pump_id: int = 0,
+                   snapshot: Optional[ScreenLogicSnapshot] = None) -> Optional[int]:
+    """pump.<id>.state.value as 0/1, or None when unknown."""
+    return _int_value(snapshot, f"pump.{pump_id}.state.value")
+
+
+def get_circuit_state(circuit_id: int,
+                      snapshot: Optional[ScreenLogicSnapshot] = None) -> Optional[int]:
+    """circuit.<id>.value as 0/1 (e.g. SPA_CIRCUIT_ID / POOL_CIRCUIT_ID), or None."""
+    return _int_value(snapshot, f"circuit.{circuit_id}.value")
+
+
+def get_salt_ppm(snapshot: Optional[ScreenLogicSnapshot] = None) -> Optional[float]:
+    """controller.sensor.salt_ppm.value, or None when missing / not positive."""
+    value = (snapshot or _snapshot).data.get("controller.sensor.salt_ppm.value")
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return value
+    return None
 
 
 def get_pump_on_seconds() -> float:
@@ -15,7 +15,8 @@ from services.ph_service import get_latest_ph_reading
 from utils.settings_utils import load_settings
 from services.auto_dose_state import auto_dose_state
 from services.notification_service import get_all_notifications
-from services.screenlogic_service import get_latest_screenlogic_data
+from services.screenlogic_service import get_poll_schedule, get_screenlogic_snapshot
+from services.error_service import get_current_errors
 
 _socketio = None
 
@@ -222,7 +223,22 @@ def get_cached_remote_states(remote_ip):
 
 
 
-def emit_status_update(force_emit=False):
+def emit_screenlogic_diff(diff):
+    """
+    Send only the ScreenLogic keys that changed. Clients apply it when
+    diff["base"] matches their version, otherwise they refetch
+    /api/screenlogic/snapshot.
+    """
+    if _socketio:
+        _socketio.emit("screenlogic_diff", diff, namespace="/status")
+
+
+def emit_status_update(force_emit=False, full=False):
+    """
+    Emit the status payload. The full ScreenLogic snapshot is only
+    included when `full` is set (client connect); afterwards clients stay
+    current through screenlogic_diff events.
+    """
     global LAST_EMITTED_STATUS
 
     try:
@@ -245,9 +261,14 @@ def emit_status_update(force_emit=False):
         status_payload = {
             "settings":     settings,
             "current_ph":   get_latest_ph_reading(),
-            "screenlogic":  get_latest_screenlogic_data(),
+            "screenlogic_poll": get_poll_schedule(),
+            "errors":       sorted(get_current_errors()),
             # ... any additional fields ...
         }
+        if full:
+            snap = get_screenlogic_snapshot()
+            status_payload["screenlogic_version"] = snap.version
+            status_payload["screenlogic"] = dict(snap.data)
 
         # (Optional) Compare to LAST_EMITTED_STATUS, skip if no changes, etc.
         if not force_emit and LAST_EMITTED_STATUS is not None:
@@ -275,7 +296,7 @@ class StatusNamespace(Namespace):
         log_with_timestamp(f"StatusNamespace: Client connected. auth={auth}")
         global LAST_EMITTED_STATUS
         LAST_EMITTED_STATUS = None  # Force first update when a client connects
-        emit_status_update(force_emit=True)
+        emit_status_update(force_emit=True, full=True)
 
     def on_disconnect(self):
         log_with_timestamp("StatusNamespace: Client disconnected.")
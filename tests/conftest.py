@@ -0,0 +1,116 @@
+# File: tests/conftest.py
+"""
+Shared fixtures
+---------------
+• Every test gets its own settings.json and event store under tmp_path.
+• `relay` swaps the relay driver's serial port for FakeSerial (records
+  writes, can hold the writer thread on a gate) and gives the test a fresh
+  RelayDriver / RelayWatchdog pair, so no USB relay board is needed.
+• status_namespace (needs the running Flask app) is replaced by a stub.
+"""
+
+import json
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def settings_file(tmp_path, monkeypatch):
+    from utils import settings_utils
+
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({}))
+    monkeypatch.setattr(settings_utils, "SETTINGS_FILE", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def status_stub(monkeypatch):
+    stub = types.ModuleType("status_namespace")
+    stub.emit_status_update = lambda: None
+    stub.is_debug_enabled = lambda *_: False
+    monkeypatch.setitem(sys.modules, "status_namespace", stub)
+    return stub
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    from services import event_store
+
+    monkeypatch.setattr(event_store, "DB_FILE", str(tmp_path / "events.db"))
+    monkeypatch.setattr(event_store, "_conn", None)
+    yield event_store
+    if event_store._conn is not None:
+        event_store._conn.close()
+
+
+class FakeSerial:
+    """Stands in for serial.Serial; every instance shares the test's log."""
+
+    writes = []
+    parked = []   # commands the writer is holding at the gate
+    gate = None   # a real threading.Event the writer waits on, if set
+
+    def __init__(self, path, baudrate=None, timeout=None, write_timeout=None):
+        self.path = path
+
+    def write(self, data):
+        if FakeSerial.gate is not None:
+            FakeSerial.parked.append(bytes(data))
+            FakeSerial.gate.wait(5)
+        FakeSerial.writes.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeHealth:
+    def __init__(self):
+        self.ok = 0
+        self.failures = []
+
+    def record_ok(self, role):
+        self.ok += 1
+
+    def record_failure(self, role, error=None):
+        self.failures.append(error)
+
+    def reset(self, role):
+        pass
+
+
+@pytest.fixture
+def relay(monkeypatch):
+    from services import pump_relay_service as prs
+
+    FakeSerial.writes = []
+    FakeSerial.parked = []
+    FakeSerial.gate = None
+    monkeypatch.setattr(prs.serial, "Serial", FakeSerial)
+
+    driver = prs.RelayDriver()
+    driver.device_path = lambda: "/dev/fake-relay"
+    driver._path = "/dev/fake-relay"
+    watchdog = prs.RelayWatchdog(driver)
+    health = FakeHealth()
+    monkeypatch.setattr(prs, "relay_driver", driver)
+    monkeypatch.setattr(prs, "relay_watchdog", watchdog)
+    monkeypatch.setattr(prs, "device_health", health)
+    for relay_id in prs.RELAY_OFF_COMMANDS:
+        monkeypatch.setitem(prs.relay_status, relay_id, "off")
+    prs.relay_switched_at.clear()
+
+    yield types.SimpleNamespace(prs=prs, driver=driver, watchdog=watchdog,
+                                health=health, serial=FakeSerial)
+    if FakeSerial.gate is not None:
+        FakeSerial.gate.set()   # never leave the writer thread parked
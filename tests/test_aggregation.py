@@ -0,0 +1,69 @@
+# File: tests/test_aggregation.py
+import pytest
+
+from services.aggregation_service import aggregate, parse_aggregates
+
+
+@pytest.fixture
+def doses(store):
+    events = [{"timestamp": f"2024-05-01T{h:02d}:00:00", "event_type": "dosing",
+               "dose_type": "down", "dose_amount_ml": float(h)} for h in range(1, 11)]
+    events += [{"timestamp": "2024-05-02T08:00:00", "event_type": "dosing",
+                "dose_type": "up", "dose_amount_ml": 3.0},
+               {"timestamp": "2024-05-02T09:00:00", "event_type": "dosing",
+                "dose_type": "down", "dose_amount_ml": 4.0}]
+    store.insert_events(events)
+    return store
+
+
+def test_nearest_rank_percentiles(doses):
+    data = aggregate(group_by="day", aggregates=["p50", "p90", "p95", "p100", "p0"],
+                     until="2024-05-01T23:59:59")
+
+    assert data["group"] == ["2024-05-01"]
+    # 1..10: nearest rank = ceil(p/100 * n), at least the first value
+    assert (data["p50"], data["p90"], data["p95"]) == ([5.0], [9.0], [10.0])
+    assert (data["p100"], data["p0"]) == ([10.0], [1.0])
+
+
+def test_percentiles_are_per_group(doses):
+    data = aggregate(group_by="day", aggregates=["p50", "count"])
+
+    assert data["group"] == ["2024-05-01", "2024-05-02"]
+    assert data["p50"] == [5.0, 3.0]
+    assert data["count"] == [10, 2]
+
+
+def test_totals_and_mean(doses):
+    data = aggregate(group_by="all", aggregates=["sum", "mean", "min", "max", "count"],
+                     dose_type="down")
+
+    assert data["sum"] == [59.0]
+    assert data["count"] == [11]
+    assert data["mean"] == [pytest.approx(59.0 / 11)]
+    assert (data["min"], data["max"]) == ([1.0], [10.0])
+
+
+def test_mean_of_integer_values_is_not_truncated(store):
+    store.insert_events([{"timestamp": f"2024-05-01T0{i}:00:00", "event_type": "dosing",
+                          "dose_amount_ml": ml} for i, ml in enumerate((5, 6))])
+
+    assert aggregate(group_by="all", aggregates=["mean"])["mean"] == [5.5]
+
+
+def test_hour_of_day_grouping(doses):
+    data = aggregate(group_by="hour_of_day", aggregates=["count"])
+
+    assert data["group"][:3] == [1, 2, 3]
+    assert data["count"][data["group"].index(8)] == 2
+
+
+def test_invalid_requests_are_rejected(doses):
+    with pytest.raises(ValueError):
+        parse_aggregates(["median"])
+    with pytest.raises(ValueError):
+        parse_aggregates([])
+    with pytest.raises(ValueError):
+        aggregate(group_by="fortnight")
+    with pytest.raises(ValueError):
+        aggregate(field="dose_amount_ml') OR 1=1 --")
@@ -0,0 +1,126 @@
+# File: tests/test_dosing_actuator.py
+import sys
+import types
+
+import eventlet
+import pytest
+
+SETTINGS = {
+    "pump_calibration": {"pump1": 1.0, "pump2": 1.0},   # 1 s per ml
+    "relay_ports": {"ph_up": 1, "ph_down": 2},
+}
+
+
+@pytest.fixture
+def actuator(relay, tmp_path, monkeypatch):
+    from services import dosing_actuator as da
+
+    monkeypatch.setattr(da, "relay_watchdog", relay.watchdog)
+    monkeypatch.setattr(da, "_INFLIGHT_FILE", str(tmp_path / "dosing_inflight.json"))
+    events = []
+    monkeypatch.setattr(da, "_emit", lambda event, payload: events.append(event))
+    dispensed = []
+    dosage_stub = types.ModuleType("services.dosage_service")
+    dosage_stub.manual_dispense = lambda kind, ml: dispensed.append((kind, ml))
+    monkeypatch.setitem(sys.modules, "services.dosage_service", dosage_stub)
+
+    act = da.DosingActuator()
+    act.start()
+    yield types.SimpleNamespace(act=act, da=da, events=events, dispensed=dispensed,
+                                relay=relay, prs=relay.prs)
+    act.stop()
+    act._worker.kill()
+
+
+def _wait_for_job(job, timeout=3.0):
+    with eventlet.Timeout(timeout):
+        while job.state in ("queued", "running"):
+            eventlet.sleep(0.02)
+
+
+def test_dose_runs_for_the_commanded_time(actuator):
+    job = actuator.act.submit("manual", "up", 0.2, settings=SETTINGS)
+    _wait_for_job(job)
+
+    assert job.state == "done"
+    assert job.actual_on_sec == pytest.approx(0.2, abs=0.15)
+    assert actuator.prs.get_relay_status(1) == "off"
+    assert actuator.relay.serial.writes[0] == actuator.prs.RELAY_ON_COMMANDS[1]
+    assert actuator.relay.serial.writes[-1] == actuator.prs.RELAY_OFF_COMMANDS[1]
+    assert actuator.dispensed == [("up", 0.2)]
+    assert actuator.events[0] == "dose_start" and actuator.events[-1] == "dose_complete"
+
+
+def test_stop_switches_the_relay_off_and_marks_the_job_stopped(actuator):
+    job = actuator.act.submit("manual", "down", 5, settings=SETTINGS)
+    with eventlet.Timeout(2):
+        while actuator.prs.get_relay_status(2) != "on":
+            eventlet.sleep(0.02)
+
+    assert actuator.act.stop() is job
+    _wait_for_job(job)
+
+    assert job.state == "stopped"
+    assert job.off_by == "stop"
+    assert job.actual_on_sec < 1
+    assert actuator.prs.get_relay_status(2) == "off"
+    assert actuator.dispensed == []
+    assert "dose_stopped" in actuator.events
+
+
+def test_stop_before_switch_on_never_turns_the_relay_on(actuator):
+    act, prs = actuator.act, actuator.prs
+
+    def emit(event, payload):
+        actuator.events.append(event)
+        if event == "dose_start":   # the window between taking the job and turn_on_relay
+            act.stop()
+    actuator.da._emit = emit
+
+    job = act.submit("manual", "up", 5, settings=SETTINGS)
+    _wait_for_job(job)
+
+    assert job.state == "stopped"
+    assert prs.RELAY_ON_COMMANDS[1] not in actuator.relay.serial.writes
+    assert prs.get_relay_status(1) == "off"
+
+
+def test_stop_drops_queued_jobs(actuator):
+    first = actuator.act.submit("manual", "up", 5, settings=SETTINGS)
+    second = actuator.act.submit("auto", "down", 5, settings=SETTINGS)
+
+    actuator.act.stop()   # before the worker has taken either
+
+    assert first.state == second.state == "cancelled"
+    eventlet.sleep(0.1)
+    assert actuator.prs.RELAY_ON_COMMANDS[1] not in actuator.relay.serial.writes
+
+
+def test_stop_without_a_job_still_switches_every_relay_off(actuator):
+    prs = actuator.prs
+    prs.turn_on_relay(1)   # e.g. left on by a manual /api/relay call
+
+    assert actuator.act.stop() is None
+    assert prs.get_relay_status(1) == "off"
+    assert set(actuator.relay.serial.writes[1:]) == {prs.RELAY_OFF_COMMANDS[1],
+                                                     prs.RELAY_OFF_COMMANDS[2]}
+
+
+def test_higher_priority_runs_first(actuator):
+    act = actuator.act
+    low = act.submit("auto", "up", 0.05, priority=0, settings=SETTINGS)
+    high = act.submit("manual", "down", 0.05, priority=10, settings=SETTINGS)
+    _wait_for_job(low)
+    _wait_for_job(high)
+
+    assert [kind for kind, _ in actuator.dispensed] == ["down", "up"]
+
+
+def test_plan_dispense_clamps_and_validates():
+    from services.dosing_actuator import plan_dispense
+
+    assert plan_dispense("up", 10, {**SETTINGS, "max_dosing_amount": 4}) == (4, 1, 4.0)
+    with pytest.raises(ValueError):
+        plan_dispense("sideways", 1, SETTINGS)
+    with pytest.raises(ValueError):
+        plan_dispense("down", 0, SETTINGS)
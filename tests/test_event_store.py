@@ -0,0 +1,66 @@
+# File: tests/test_event_store.py
+import pytest
+
+from services.event_store import normalize_timestamp
+
+
+def _dose(ts, ml, kind="down"):
+    return {"timestamp": ts, "event_type": "dosing", "dose_type": kind, "dose_amount_ml": ml}
+
+
+def test_normalize_timestamp_canonical_form():
+    assert normalize_timestamp(None) is None
+    assert normalize_timestamp("") is None
+    assert normalize_timestamp("2024-05-01") == "2024-05-01T00:00:00"
+    assert normalize_timestamp("2024-05-01 08:30") == "2024-05-01T08:30:00"
+    assert normalize_timestamp("2024-05-01T08:30:00.250000") == "2024-05-01T08:30:00.250000"
+    with pytest.raises(ValueError):
+        normalize_timestamp("yesterday")
+
+
+def test_date_only_upper_bound_covers_the_whole_day():
+    assert normalize_timestamp("2024-05-01", end_of_day=True) == "2024-05-01T23:59:59.999999"
+    # an explicit time is taken as given
+    assert normalize_timestamp("2024-05-01T12:00", end_of_day=True) == "2024-05-01T12:00:00"
+
+
+def test_query_filters_by_type_and_range(store):
+    store.insert_events([
+        _dose("2024-04-30T23:59:59", 1.0),
+        _dose("2024-05-01T00:00:00", 2.0),
+        {"timestamp": "2024-05-01T09:00:00", "event_type": "ph", "ph": 7.4},
+        _dose("2024-05-01T23:59:59.500000", 3.0),
+        _dose("2024-05-02T00:00:00", 4.0),
+    ])
+
+    rows = store.query_events(
+        event_type="dosing",
+        since=normalize_timestamp("2024-05-01"),
+        until=normalize_timestamp("2024-05-01", end_of_day=True),
+    )
+    assert [r["dose_amount_ml"] for r in rows] == [2.0, 3.0]
+    assert len(store.query_events(since="2024-05-01T00:00:00")) == 4
+
+
+def test_newest_first_with_limit(store):
+    store.insert_events([_dose(f"2024-05-0{d}T10:00:00", float(d)) for d in range(1, 6)])
+
+    rows = store.query_events(event_type="dosing", limit=2, newest_first=True)
+    assert [r["dose_amount_ml"] for r in rows] == [5.0, 4.0]
+
+
+def test_insert_returns_count_and_delete_by_type(store):
+    assert store.insert_events([]) == 0
+    assert store.insert_events([_dose("2024-05-01T10:00:00", 1.0),
+                                {"timestamp": "2024-05-01T10:00:01", "event_type": "ph"}]) == 2
+
+    assert store.delete_events("dosing") == 1
+    assert [r["event_type"] for r in store.query_events()] == ["ph"]
+
+
+def test_iter_event_rows_resumes_after_a_cursor(store):
+    store.insert_events([_dose(f"2024-05-01T10:00:0{i}", float(i)) for i in range(5)])
+
+    first = list(store.iter_event_rows(event_type="dosing"))[:2]
+    rest = list(store.iter_event_rows(event_type="dosing", after=(first[-1][1], first[-1][0])))
+    assert [row[2]["dose_amount_ml"] for row in first + rest] == [0.0, 1.0, 2.0, 3.0, 4.0]
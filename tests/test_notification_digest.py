@@ -0,0 +1,131 @@
+# File: tests/test_notification_digest.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import notification_digest as nd
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add_once(self, name, fn, delay_sec, timeout_sec=None):
+        self.jobs[name] = (fn, delay_sec)
+
+    def get_job(self, name):
+        return self.jobs.get(name)
+
+    def cancel(self, name):
+        return self.jobs.pop(name, None) is not None
+
+
+@pytest.fixture
+def digest(monkeypatch):
+    cfg = {"enabled": True, "window_sec": 60, "max_chars": 1900}
+    monkeypatch.setattr(nd, "load_settings", lambda: {"system_name": "Pool",
+                                                       "notification_digest": cfg})
+    monkeypatch.setattr(nd, "_log", lambda msg: None)
+    sched = FakeScheduler()
+    monkeypatch.setattr(nd, "scheduler", sched)
+    d = nd.NotificationDigest()
+    sent = []
+    d._send = lambda text, settings: sent.append(text)
+    d.cfg, d.sent, d.sched = cfg, sent, sched
+    return d
+
+
+def test_lone_alert_is_sent_at_once(digest):
+    digest.submit("pH high", "warning")
+
+    assert digest.sent == ["pH high"]
+    assert digest.get_state()["buffered"] == 0
+    assert nd.FLUSH_JOB not in digest.sched.jobs
+
+
+def test_follow_ups_are_coalesced_into_one_digest(digest):
+    digest.submit("relay offline", "critical")
+    digest.submit("pH high", "warning")
+    digest.submit("auto-dose skipped", "info")
+    digest.submit("probe offline", "critical")   # second critical inside the window
+
+    assert digest.sent == ["relay offline"]
+    assert digest.get_state()["buffered"] == 3
+    digest.flush()
+
+    assert len(digest.sent) == 2
+    lines = digest.sent[1].split("\n")
+    assert lines[0].startswith("3 alerts since ")
+    assert "(1 critical, 1 warning, 1 info)" in lines[0]
+    assert [line.split()[0] for line in lines[1:]] == ["CRITICAL", "WARNING", "INFO"]
+    state = digest.get_state()
+    assert (state["digests"], state["coalesced"], state["buffered"]) == (1, 3, 0)
+
+
+def test_each_held_alert_extends_the_window(digest):
+    digest.submit("first", "warning")
+    digest.submit("second", "warning")
+    first_until = digest._window_until
+    digest._buffer[0]["at"] -= timedelta(seconds=30)   # pretend it was held earlier
+    digest.submit("third", "warning")
+
+    assert digest._window_until > first_until
+    _, delay = digest.sched.jobs[nd.FLUSH_JOB]
+    assert delay == pytest.approx(60, abs=1)
+
+
+def test_window_extension_is_capped(digest):
+    digest.submit("first", "warning")
+    digest.submit("second", "warning")
+    held_at = datetime.now() - timedelta(seconds=60 * nd.MAX_HOLD_WINDOWS)
+    digest._buffer[0]["at"] = held_at
+    digest.submit("third", "warning")
+
+    assert digest._window_until == held_at + timedelta(seconds=60 * nd.MAX_HOLD_WINDOWS)
+    _, delay = digest.sched.jobs[nd.FLUSH_JOB]
+    assert delay == 0
+
+
+def test_critical_after_a_quiet_window_is_sent_mid_storm(digest):
+    digest.submit("pH high", "warning")
+    digest.submit("pH still high", "warning")
+    digest.submit("relay offline", "critical")
+
+    assert digest.sent == ["pH high", "relay offline"]
+    assert digest.get_state()["buffered"] == 1
+
+
+def test_single_held_alert_is_sent_unchanged(digest):
+    digest.submit("first", "warning")
+    digest.submit("second", "info")
+    digest.flush()
+
+    assert digest.sent == ["first", "second"]
+    assert digest.get_state()["digests"] == 0
+
+
+def test_next_alert_after_a_flush_is_sent_at_once(digest):
+    digest.submit("first", "warning")
+    digest.submit("second", "warning")
+    digest.flush()
+    digest.submit("third", "warning")
+
+    assert digest.sent == ["first", "second", "third"]
+
+
+def test_disabled_digest_sends_everything(digest):
+    digest.cfg["enabled"] = False
+    for i in range(3):
+        digest.submit(f"alert {i}", "warning")
+
+    assert digest.sent == ["alert 0", "alert 1", "alert 2"]
+    assert digest.get_state()["sent_immediately"] == 3
+
+
+def test_fit_truncates_with_a_count():
+    lines = [f"line {i:02d}" for i in range(10)]
+    text = nd.NotificationDigest._fit("header", lines, 45)
+
+    assert len(text) <= 45
+    assert text.split("\n")[0] == "header"
+    assert text.endswith("... and 7 more")
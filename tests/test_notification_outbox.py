@@ -0,0 +1,162 @@
+# File: tests/test_notification_outbox.py
+import json
+import time
+
+import eventlet
+import pytest
+
+from services import notification_outbox as nob
+from services.notification_outbox import DeliveryError
+
+CONFIG = {"workers": 2, "max_attempts": 10, "retry_base_sec": 10,
+          "retry_max_sec": 60, "max_age_hours": 24}
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=None, text=""):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self._body = body
+        self.text = text
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no JSON")
+        return self._body
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(nob, "_STATE_FILE", str(tmp_path / "notification_outbox.json"))
+    monkeypatch.setattr(nob, "_log", lambda msg: None)
+    monkeypatch.setattr(nob, "load_settings", lambda: {"notification_outbox": CONFIG,
+                                                       "telegram_enabled": True})
+    box = nob.NotificationOutbox()
+    yield box
+    if box._dispatcher is not None:
+        box._dispatcher.kill()
+
+
+def _entry(box, attempts=0):
+    now = time.time()
+    entry = {"id": f"e{attempts}", "channel": "telegram", "text": "pH high",
+             "created": now, "attempts": attempts, "next_attempt": now, "last_error": None}
+    box._pending.append(entry)
+    box._in_flight.add(entry["id"])
+    return entry
+
+
+def _fail_with(monkeypatch, error):
+    def deliver(channel, text, cfg):
+        raise error
+    monkeypatch.setattr(nob, "_deliver", deliver)
+
+
+def test_check_response_classifies_errors():
+    nob._check_response(FakeResponse(200))
+    with pytest.raises(DeliveryError) as e:
+        nob._check_response(FakeResponse(429, headers={"Retry-After": "7"}))
+    assert e.value.retry_after == 7 and not e.value.permanent
+    with pytest.raises(DeliveryError) as e:
+        nob._check_response(FakeResponse(429, body={"parameters": {"retry_after": 12}}))
+    assert e.value.retry_after == 12
+    with pytest.raises(DeliveryError) as e:
+        nob._check_response(FakeResponse(404, text="chat not found"))
+    assert e.value.permanent
+    with pytest.raises(DeliveryError) as e:
+        nob._check_response(FakeResponse(502))
+    assert not e.value.permanent
+
+
+def test_transient_failure_is_retried_with_backoff(outbox, monkeypatch):
+    _fail_with(monkeypatch, DeliveryError("HTTP 502"))
+    entry = _entry(outbox)
+    before = time.time()
+    outbox._attempt(entry)
+
+    assert outbox._pending == [entry]
+    assert entry["attempts"] == 1 and entry["last_error"] == "HTTP 502"
+    assert 10 * 0.8 <= entry["next_attempt"] - before <= 10 * 1.2 + 1
+    assert outbox.get_status()["retries"] == 1
+    assert outbox._dirty
+
+
+@pytest.mark.parametrize("attempts, low, high", [(1, 16, 24), (2, 32, 48), (3, 48, 72)])
+def test_backoff_doubles_up_to_the_cap(outbox, monkeypatch, attempts, low, high):
+    # CONFIG: base 10 s, cap 60 s, +/-20% jitter applied after the cap
+    _fail_with(monkeypatch, DeliveryError("timeout"))
+    entry = _entry(outbox, attempts=attempts)
+    before = time.time()
+    outbox._attempt(entry)
+
+    assert low <= entry["next_attempt"] - before <= high + 1
+
+
+def test_retry_after_wins_over_a_shorter_backoff(outbox, monkeypatch):
+    _fail_with(monkeypatch, DeliveryError("HTTP 429", retry_after=300))
+    entry = _entry(outbox)
+    before = time.time()
+    outbox._attempt(entry)
+
+    assert entry["next_attempt"] - before >= 300
+
+
+def test_permanent_error_drops_the_message(outbox, monkeypatch):
+    _fail_with(monkeypatch, DeliveryError("HTTP 401", permanent=True))
+    outbox._attempt(_entry(outbox))
+
+    status = outbox.get_status()
+    assert status["pending"] == [] and status["dropped"] == 1
+    assert status["recent"][0]["outcome"] == "dropped"
+
+
+def test_gives_up_after_max_attempts(outbox, monkeypatch):
+    _fail_with(monkeypatch, DeliveryError("HTTP 502"))
+    outbox._attempt(_entry(outbox, attempts=CONFIG["max_attempts"] - 1))
+
+    assert outbox.get_status()["dropped"] == 1
+    assert outbox._pending == []
+
+
+def test_success_removes_the_entry(outbox, monkeypatch):
+    monkeypatch.setattr(nob, "_deliver", lambda channel, text, cfg: None)
+    outbox._attempt(_entry(outbox))
+
+    status = outbox.get_status()
+    assert status["pending"] == [] and status["delivered"] == 1
+    assert status["recent"][0]["attempts"] == 1
+
+
+def test_dispatcher_retries_then_delivers_and_saves(outbox, monkeypatch):
+    calls = []
+
+    def deliver(channel, text, cfg):
+        calls.append(text)
+        if len(calls) == 1:
+            raise DeliveryError("HTTP 502")
+    monkeypatch.setattr(nob, "_deliver", deliver)
+    monkeypatch.setitem(CONFIG, "retry_base_sec", 0.05)
+
+    assert outbox.enqueue("pH high") == 1   # telegram_enabled only
+    with eventlet.Timeout(3):
+        while outbox.get_status()["delivered"] < 1:
+            eventlet.sleep(0.02)
+    eventlet.sleep(0.1)   # let the dispatcher write the final state
+
+    assert calls == ["pH high", "pH high"]
+    status = outbox.get_status()
+    assert (status["enqueued"], status["retries"], status["delivered"]) == (1, 1, 1)
+    with open(nob._STATE_FILE) as f:
+        assert json.load(f) == []
+
+
+def test_pending_entries_survive_a_restart(outbox, monkeypatch):
+    _fail_with(monkeypatch, DeliveryError("HTTP 502"))
+    entry = _entry(outbox)
+    outbox._attempt(entry)
+    outbox._save()
+
+    restored = nob.NotificationOutbox()
+    restored._load()
+    assert [e["id"] for e in restored._pending] == [entry["id"]]
@@ -0,0 +1,94 @@
+# File: tests/test_relay_watchdog.py
+import time
+
+import pytest
+from eventlet import patcher
+
+_threading = patcher.original("threading")
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_on_arms_deadline_as_soon_as_it_is_written(relay):
+    prs = relay.prs
+    prs.turn_on_relay(1, max_on_sec=5)
+
+    assert relay.serial.writes == [prs.RELAY_ON_COMMANDS[1]]
+    assert prs.get_relay_status(1) == "on"
+    # armed by the writer thread from the write time, not when send() returned
+    assert relay.watchdog._deadlines[1] == pytest.approx(prs.relay_switched_at[1] + 5)
+    relay.watchdog.release(1)
+
+
+def test_deadline_forces_relay_off(relay):
+    prs = relay.prs
+    prs.turn_on_relay(1, max_on_sec=0.2)
+    on_at = prs.relay_switched_at[1]
+
+    assert _wait_for(lambda: prs.get_relay_status(1) == "off")
+    assert relay.serial.writes == [prs.RELAY_ON_COMMANDS[1], prs.RELAY_OFF_COMMANDS[1]]
+    off_at = relay.watchdog.release(1)
+    assert off_at is not None and off_at - on_at == pytest.approx(0.2, abs=0.15)
+    assert relay.watchdog.trips == 1
+
+
+def test_release_before_deadline_leaves_relay_to_caller(relay):
+    prs = relay.prs
+    prs.turn_on_relay(2, max_on_sec=0.2)
+
+    assert relay.watchdog.release(2) is None
+    time.sleep(0.35)
+    assert relay.serial.writes == [prs.RELAY_ON_COMMANDS[2]]
+    assert relay.watchdog.trips == 0
+
+
+def test_trip_forces_every_relay_off(relay):
+    prs = relay.prs
+    prs.turn_on_relay(1, max_on_sec=60)
+    prs.turn_on_relay(2, max_on_sec=60)
+
+    prs.emergency_stop()
+
+    assert set(relay.serial.writes[2:]) == {prs.RELAY_OFF_COMMANDS[1], prs.RELAY_OFF_COMMANDS[2]}
+    assert prs.get_relay_status(1) == prs.get_relay_status(2) == "off"
+    assert relay.watchdog._deadlines == {}
+    assert relay.watchdog.release(1) is not None
+    assert relay.watchdog.release(2) is not None
+
+
+def test_off_cancels_a_queued_on_for_the_same_relay(relay):
+    prs = relay.prs
+    relay.serial.gate = _threading.Event()
+    outcome = {}
+
+    def send(name, command, urgent=False):
+        try:
+            relay.driver.send(command, urgent=urgent)
+            outcome[name] = "written"
+        except prs.RelayCommandCancelled:
+            outcome[name] = "cancelled"
+
+    busy = _threading.Thread(target=send, args=("busy", prs.RELAY_OFF_COMMANDS[2]))
+    busy.start()
+    assert _wait_for(lambda: relay.serial.parked)   # writer holds "busy" at the gate
+    on = _threading.Thread(target=send, args=("on", prs.RELAY_ON_COMMANDS[1]))
+    on.start()
+    assert _wait_for(lambda: relay.driver._queue.qsize() == 1)
+    off = _threading.Thread(target=send, args=("off", prs.RELAY_OFF_COMMANDS[1], True))
+    off.start()
+    assert _wait_for(lambda: "on" in outcome)
+
+    relay.serial.gate.set()
+    for t in (busy, on, off):
+        t.join(5)
+
+    assert outcome == {"busy": "written", "on": "cancelled", "off": "written"}
+    assert relay.serial.writes == [prs.RELAY_OFF_COMMANDS[2], prs.RELAY_OFF_COMMANDS[1]]
+    assert relay.health.failures == []   # a cancelled "on" is not a device fault
@@ -0,0 +1,122 @@
+# File: utils/http_client.py
+"""
+Shared outbound HTTP client (Telegram, Discord webhooks)
+--------------------------------------------------------
+• One requests.Session for every outbound webhook, so bursts of alerts
+  reuse warm keep-alive connections instead of paying DNS + TCP + TLS per
+  message.
+• Per-host pool limit (http_client.per_host_connections): at most that
+  many connections per host; extra requests wait for a free one.
+• Default (connect, read) timeouts from settings; callers may override.
+• A stale pooled connection is retried once at connect time only, so a
+  POST is never sent twice.
+• Per-host latency (avg/p95/max), error counts and last status are kept
+  for GET /api/notifications/http.
+
+Settings (all optional):
+    "http_client": {
+        "connect_timeout_sec": 5,
+        "read_timeout_sec": 10,
+        "per_host_connections": 2
+    }
+"""
+
+import time
+from collections import deque
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.settings_utils import load_settings
+
+LATENCY_SAMPLES = 100
+_DEFAULTS = {
+    "connect_timeout_sec": 5,
+    "read_timeout_sec": 10,
+    "per_host_connections": 2,
+}
+
+
+class HttpClient:
+    def __init__(self) -> None:
+        self._session = None
+        self._pool_size = None
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _config() -> Dict[str, Any]:
+        return {**_DEFAULTS, **(load_settings().get("http_client") or {})}
+
+    def _get_session(self, pool_size: int) -> requests.Session:
+        if self._session is None or pool_size != self._pool_size:
+            old = self._session
+            adapter = HTTPAdapter(
+                pool_connections=8,          # hosts kept pooled
+                pool_maxsize=pool_size,      # connections per host
+                pool_block=True,
+                max_retries=Retry(total=1, connect=1, read=0, redirect=0, status=0, other=0),
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session, self._pool_size = session, pool_size
+            if old is not None:
+                old.close()
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        cfg = self._config()
+        kwargs.setdefault("timeout", (float(cfg["connect_timeout_sec"]),
+                                      float(cfg["read_timeout_sec"])))
+        session = self._get_session(max(1, int(cfg["per_host_connections"])))
+        host = urlsplit(url).netloc
+        start = time.monotonic()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except Exception as ex:
+            self._record(host, time.monotonic() - start, error=type(ex).__name__)
+            raise
+        self._record(host, time.monotonic() - start, status=resp.status_code)
+        return resp
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def _record(self, host: str, elapsed: float, status=None, error=None) -> None:
+        stats = self._hosts.setdefault(host, {
+            "requests": 0,
+            "errors": 0,
+            "last_status": None,
+            "last_error": None,
+            "samples": deque(maxlen=LATENCY_SAMPLES),
+        })
+        stats["requests"] += 1
+        stats["samples"].append(elapsed * 1000)
+        if error is not None:
+            stats["errors"] += 1
+            stats["last_error"] = error
+        else:
+            stats["last_status"] = status
+
+    def get_stats(self) -> Dict[str, Any]:
+        hosts = {}
+        for host, stats in self._hosts.items():
+            samples = sorted(stats["samples"])
+            hosts[host] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "last_status": stats["last_status"],
+                "last_error": stats["last_error"],
+                "last_ms": round(stats["samples"][-1], 1) if samples else None,
+                "avg_ms": round(sum(samples) / len(samples), 1) if samples else None,
+                "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 1) if samples else None,
+                "max_ms": round(samples[-1], 1) if samples else None,
+            }
+        return {"per_host_connections": self._pool_size, "hosts": hosts}
+
+
+# singleton shared by the notification outbox and the settings test routes
+http_client = HttpClient()
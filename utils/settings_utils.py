@@ -7,6 +7,9 @@ import threading
 # Create a single lock object shared by all load/save calls
 _settings_lock = threading.Lock()
 
+# Callbacks run with the new settings after every save_settings()
+_listeners = []
+
 # Path to the settings file
 SETTINGS_FILE = os.path.join(os.getcwd(), "data", "settings.json")
 
@@ -32,3 +35,15 @@ def save_settings(new_settings):
         os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
         with open(SETTINGS_FILE, "w") as f:
             json.dump(new_settings, f, indent=4)
+    for callback in list(_listeners):
+        try:
+            callback(new_settings)
+        except Exception as e:
+            print(f"[Settings] change listener failed: {e}", flush=True)
+
+def add_settings_listener(callback):
+    """
+    Register callback(new_settings), called after each save_settings() from
+    the saving thread/greenlet. Keep it quick (e.g. queue work).
+    """
+    _listeners.append(callback)